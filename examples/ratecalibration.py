@@ -0,0 +1,82 @@
+#!/usr/bin/python
+
+"""
+ratecalibration.py: measure how close TCLink shaping comes to the
+configured rate on this machine
+
+For each rate, we limit a link between two hosts to that rate (with
+TCIntf's high_rate parameters above 1 Gb/s), run a TCP flow across
+it, and report the achieved rate against the configured rate. We
+first run a flow over the unshaped link, since above some rate the
+machine (CPU, memory bandwidth) rather than the shaper is the limit,
+and a 10-100 Gb/s emulation is only as good as what this reports.
+
+usage: ratecalibration.py [-r rates] [-t seconds] [--tbf] [--pacing fq]
+"""
+
+from optparse import OptionParser
+
+from mininet.net import Mininet
+from mininet.link import TCLink
+from mininet.traffic import runFlows
+from mininet.util import quietRun
+from mininet.log import setLogLevel, info
+
+
+def calibrate( rates, seconds=5, use_tbf=False, pacing=None, tool=None ):
+    """Measure achieved vs configured rate for each rate
+       rates: list of configured rates in Mbit/s
+       seconds: duration of each flow
+       use_tbf: shape with tbf rather than htb
+       pacing: leaf qdisc (fq or fq_codel) or None
+       tool: traffic tool (default: iperf if installed, else builtin)
+       returns: list of ( configured rate or None, achieved Mbit/s )"""
+    if tool is None:
+        tool = 'iperf' if quietRun( 'which iperf' ) else 'builtin'
+    net = Mininet( controller=None, link=TCLink )
+    h1, h2 = net.addHost( 'h1' ), net.addHost( 'h2' )
+    link = net.addLink( h1, h2 )
+    net.build()
+    results = []
+    for rate in [ None ] + list( rates ):
+        info( '*** Measuring %s\n' % ( '%s Mbit/s' % rate if rate
+                                       else 'unshaped link' ) )
+        link.update( bw=rate, use_tbf=use_tbf, pacing=pacing )
+        flow = runFlows( [ ( h1, h2 ) ], tool=tool, seconds=seconds )[ 0 ]
+        bps = flow.serverBps if flow.serverBps is not None else flow.bps
+        results.append( ( rate, bps / 1e6 ) )
+    net.stop()
+    return results
+
+
+def dump( results ):
+    "Print achieved vs configured rates"
+    print
+    print '*** Rate calibration results'
+    print '%12s %12s %8s' % ( 'Mbit/s', 'achieved', 'ratio' )
+    for rate, achieved in results:
+        if rate is None:
+            print '%12s %12.1f %8s' % ( 'unshaped', achieved, '-' )
+        else:
+            print '%12.1f %12.1f %8.3f' % ( rate, achieved,
+                                           achieved / rate )
+
+
+if __name__ == '__main__':
+    parser = OptionParser( usage='%prog [options]' )
+    parser.add_option( '-r', '--rates',
+                       default='100,1000,10000,25000,40000,100000',
+                       help='comma-separated rates in Mbit/s [%default]' )
+    parser.add_option( '-t', '--time', type='float', default=5,
+                       help='seconds per measurement [%default]' )
+    parser.add_option( '--tbf', action='store_true', default=False,
+                       help='shape with tbf rather than htb' )
+    parser.add_option( '--pacing', default=None,
+                       help='leaf qdisc: fq or fq_codel' )
+    parser.add_option( '--tool', default=None,
+                       help='iperf or builtin [iperf if installed]' )
+    options, _args = parser.parse_args()
+    setLogLevel( 'info' )
+    dump( calibrate( [ float( r ) for r in options.rates.split( ',' ) ],
+                     seconds=options.time, use_tbf=options.tbf,
+                     pacing=options.pacing, tool=options.tool ) )
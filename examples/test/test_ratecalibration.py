@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+
+"""
+Test for ratecalibration.py
+
+results format:
+
+    *** Rate calibration results
+          Mbit/s     achieved    ratio
+        unshaped      19178.3        -
+            10.0          9.6    0.958
+           100.0         95.8    0.958
+"""
+
+import unittest
+import pexpect
+import sys
+
+class testRateCalibration( unittest.TestCase ):
+
+    @unittest.skipIf( '-quick' in sys.argv, 'long test' )
+    def testCalibration( self ):
+        "Verify that shaped links achieve close to their configured rates"
+        p = pexpect.spawn(
+            'python -m mininet.examples.ratecalibration -r 10,100 -t 2' )
+        p.expect( 'Rate calibration results', timeout=120 )
+        opts = [ '([\d\.]+) +([\d\.]+) +([\d\.]+)',
+                 pexpect.EOF ]
+        rates = []
+        while True:
+            index = p.expect( opts, timeout=120 )
+            if index == 0:
+                rates.append( float( p.match.group( 1 ) ) )
+                ratio = float( p.match.group( 3 ) )
+                self.assertTrue( .8 < ratio < 1.05 )
+            else:
+                break
+        self.assertEqual( rates, [ 10, 100 ] )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,345 @@
+"""
+capture.py: in-process packet capture for Mininet nodes
+
+Running tcpdump in a node's shell costs a process per interface and
+leaves us with pcap files that have to be parsed afterwards. Capture
+instead opens an AF_PACKET socket inside the node's network namespace
+(see netlink.nsSocket), attaches a BPF filter so that the kernel
+drops uninteresting packets, and receives packets through a
+memory-mapped TPACKET_V3 ring: the kernel fills whole blocks of
+packets, and we read them in place without a system call per packet.
+
+Capture.packets() is an iterator over captured packets, and
+Capture.save() (or startSave() for a background thread) writes them
+to a series of size-limited pcap files via PcapWriter.
+
+Filters may be tcpdump expressions, which are compiled with
+tcpdump -ddd, or already compiled programs: the text output of
+tcpdump -ddd, or a list of ( code, jt, jf, k ) tuples.
+
+Example:
+
+cap = h1.capture( bpf='icmp' )
+for ( sec, nsec ), length, data in cap.packets( timeout=1 ):
+    ...
+cap.close()
+"""
+
+import os
+import time
+import mmap
+import errno
+import select
+import socket
+import struct
+import ctypes
+from subprocess import Popen, PIPE
+from threading import Thread, Event
+
+from mininet.log import debug
+from mininet.netlink import nsSocket
+
+# From linux/if_ether.h, linux/if_packet.h and asm/socket.h
+ETH_P_ALL = 0x0003
+SOL_PACKET = 263
+PACKET_RX_RING = 5
+PACKET_STATISTICS = 6
+PACKET_VERSION = 10
+TPACKET_V3 = 2
+SO_ATTACH_FILTER = 26
+BPF_RET_K = 0x06
+TP_STATUS_KERNEL, TP_STATUS_USER = 0, 1
+
+TPACKET_REQ3 = struct.Struct( '=7I' )   # block size, block count,
+                                        # frame size, frame count,
+                                        # retire timeout (ms),
+                                        # priv size, features
+BLOCK_HDR = struct.Struct( '=III' )     # status, packet count,
+BLOCK_HDR_OFFSET = 8                    # offset to first packet
+PACKET_HDR = struct.Struct( '=IIIIIIH' )  # next offset, sec, nsec,
+                                          # snaplen, len, status, mac
+TPACKET_STATS_V3 = struct.Struct( '=III' )  # packets, drops, freezes
+
+
+class SockFilter( ctypes.Structure ):
+    "struct sock_filter: one BPF instruction"
+    _fields_ = [ ( 'code', ctypes.c_ushort ), ( 'jt', ctypes.c_ubyte ),
+                 ( 'jf', ctypes.c_ubyte ), ( 'k', ctypes.c_uint ) ]
+
+
+def compileFilter( bpf, snaplen=65535 ):
+    """Return BPF program as a list of ( code, jt, jf, k )
+       bpf: tcpdump expression, tcpdump -ddd output, or list
+       snaplen: snapshot length for compiled expressions"""
+    if not isinstance( bpf, basestring ):
+        return [ tuple( insn ) for insn in bpf ]
+    lines = bpf.strip().split( '\n' )
+    if not all( line.replace( ' ', '' ).isdigit() for line in lines ):
+        try:
+            proc = Popen( [ 'tcpdump', '-ddd', '-s', str( snaplen ), bpf ],
+                          stdout=PIPE, stderr=PIPE )
+        except OSError:
+            raise Exception( 'capture: tcpdump is needed to compile %r' %
+                             bpf )
+        out, err = proc.communicate()
+        if proc.returncode:
+            raise Exception( 'capture: bad filter %r: %s' % ( bpf, err ) )
+        lines = out.strip().split( '\n' )
+    # tcpdump -ddd: instruction count, then code jt jf k per line
+    return [ tuple( int( field ) for field in line.split() )
+             for line in lines[ 1: ] ]
+
+def attachFilter( sock, program ):
+    """Attach a BPF program to a socket
+       program: list of ( code, jt, jf, k )"""
+    insns = ( SockFilter * len( program ) )( *program )
+    # struct sock_fprog: unsigned short len; struct sock_filter *filter
+    fprog = struct.pack( 'HL', len( program ), ctypes.addressof( insns ) )
+    sock.setsockopt( socket.SOL_SOCKET, SO_ATTACH_FILTER, fprog )
+
+
+class Capture( object ):
+    "Packet capture on an interface, via a TPACKET_V3 ring"
+
+    def __init__( self, node, intf=None, bpf=None, snaplen=65535,
+                  ringMB=16, blockKB=1024, timeoutMs=100 ):
+        """node: node whose namespace we capture in
+           intf: interface or name (all interfaces in the namespace)
+           bpf: filter (see compileFilter()), or None for everything
+           snaplen: max bytes to capture per packet
+           ringMB: ring buffer size in MB
+           blockKB: ring block size in KB
+           timeoutMs: ms before the kernel hands over a partial block"""
+        self.node, self.snaplen = node, snaplen
+        self.intf = str( intf ) if intf else None
+        self.sock = nsSocket( node.nsPath(), socket.AF_PACKET,
+                              socket.SOCK_RAW, socket.htons( ETH_P_ALL ) )
+        self.ring, self.saver = None, None
+        # Packets of the current block already returned by packets()
+        self.skip = 0
+        try:
+            # A filter's return value is how much of a packet to keep,
+            # so we need one even to capture everything
+            attachFilter( self.sock, compileFilter( bpf, snaplen ) if bpf
+                          else [ ( BPF_RET_K, 0, 0, snaplen ) ] )
+            if self.intf:
+                self.sock.bind( ( self.intf, ETH_P_ALL ) )
+            self.sock.setsockopt( SOL_PACKET, PACKET_VERSION, TPACKET_V3 )
+            self.blockSize = blockKB << 10
+            self.blockCount = max( ( ringMB << 20 ) // self.blockSize, 1 )
+            # Frames are a V1/V2 concept, but the kernel checks them
+            frameSize = 1 << 11
+            self.sock.setsockopt( SOL_PACKET, PACKET_RX_RING,
+                                  TPACKET_REQ3.pack(
+                                      self.blockSize, self.blockCount,
+                                      frameSize, self.blockSize //
+                                      frameSize * self.blockCount,
+                                      timeoutMs, 0, 0 ) )
+            self.ring = mmap.mmap( self.sock.fileno(),
+                                   self.blockSize * self.blockCount,
+                                   mmap.MAP_SHARED,
+                                   mmap.PROT_READ | mmap.PROT_WRITE )
+            # Packets which arrived before the filter, bind() and
+            # ring were set up are queued on the socket; discard them
+            # so that they don't make poll() return at once for ever
+            self.sock.setblocking( False )
+            while True:
+                self.sock.recv( 1 )
+        except socket.error as e:
+            if e.errno != errno.EAGAIN:
+                self.close()
+                raise
+        except:
+            self.close()
+            raise
+        self.block = 0
+        self.poller = select.poll()
+        self.poller.register( self.sock.fileno(), select.POLLIN )
+
+    def blocks( self, timeout=None ):
+        """Generator: wait for and return blocks handed to us by the
+           kernel, as ( offset, packet count, offset of first
+           packet within block ); a block belongs to the
+           kernel again as soon as we ask for the next one
+           timeout: seconds to wait for the first block, or None"""
+        ring = self.ring
+        while True:
+            offset = self.block * self.blockSize
+            status, count, first = BLOCK_HDR.unpack_from(
+                ring, offset + BLOCK_HDR_OFFSET )
+            if not status & TP_STATUS_USER:
+                if timeout is not None and timeout <= 0:
+                    return
+                start = time.time()
+                self.poller.poll( -1 if timeout is None
+                                  else int( timeout * 1000 ) )
+                if timeout is not None:
+                    timeout -= time.time() - start
+                continue
+            yield offset, count, first
+            # Give the block back to the kernel
+            struct.pack_into( '=I', ring, offset + BLOCK_HDR_OFFSET,
+                              TP_STATUS_KERNEL )
+            self.block = ( self.block + 1 ) % self.blockCount
+
+    def packets( self, timeout=None, count=None ):
+        """Generator: captured packets, as ( ( sec, nsec ), length,
+           data ), where ( sec, nsec ) is the kernel's timestamp (as
+           integers, since a float loses nanoseconds) and data is the
+           captured (up to snaplen) part of the packet
+           timeout: seconds to wait for more packets, or None for ever
+           count: number of packets to return, or None"""
+        ring = self.ring
+        for offset, npackets, first in self.blocks( timeout ):
+            pos = offset + first
+            for i in range( npackets ):
+                ( nextOffset, sec, nsec, caplen, length, _status,
+                  mac ) = PACKET_HDR.unpack_from( ring, pos )
+                pos += nextOffset
+                # If we stopped part way through this block, resume
+                if i < self.skip:
+                    continue
+                self.skip += 1
+                yield ( ( sec, nsec ), length,
+                        ring[ pos - nextOffset + mac:
+                              pos - nextOffset + mac + caplen ] )
+                if count is not None:
+                    count -= 1
+                    if count <= 0:
+                        return
+            self.skip = 0
+
+    def stats( self ):
+        """Return (and reset) kernel statistics:
+           ( packets received, packets dropped )"""
+        packets, drops, _freezes = TPACKET_STATS_V3.unpack(
+            self.sock.getsockopt( SOL_PACKET, PACKET_STATISTICS,
+                                  TPACKET_STATS_V3.size ) )
+        return packets, drops
+
+    def save( self, writer, duration=None, count=None, stop=None ):
+        """Write captured packets to a PcapWriter
+           writer: PcapWriter
+           duration: seconds to capture for, or None
+           count: number of packets to save, or None
+           stop: threading.Event to stop at, or None
+           returns: number of packets written"""
+        end = time.time() + duration if duration else None
+        written = 0
+        while not ( stop and stop.is_set() ):
+            timeout = .1 if stop else None
+            if end:
+                timeout = min( end - time.time(), timeout or 1e9 )
+                if timeout <= 0:
+                    break
+            for packet in self.packets( timeout=timeout ):
+                writer.write( *packet )
+                written += 1
+                if count and written >= count:
+                    return written
+                if ( stop and stop.is_set() ) or ( end and
+                                                   time.time() > end ):
+                    break
+        return written
+
+    def startSave( self, path, maxMB=None, maxFiles=None ):
+        """Start saving packets to pcap files in the background
+           path: pcap file; rotated files are path.1, path.2...
+           maxMB: max size of each file in MB, or None
+           maxFiles: number of files to keep, or None for all"""
+        writer = PcapWriter( path, self.snaplen,
+                             maxBytes=maxMB << 20 if maxMB else None,
+                             maxFiles=maxFiles )
+        stop = Event()
+        thread = Thread( target=self.save,
+                         kwargs={ 'writer': writer, 'stop': stop } )
+        thread.daemon = True
+        thread.start()
+        self.saver = thread, stop, writer
+
+    def stopSave( self ):
+        "Stop saving packets started by startSave()"
+        if self.saver:
+            thread, stop, writer = self.saver
+            stop.set()
+            thread.join()
+            writer.close()
+            self.saver = None
+
+    def close( self ):
+        "Stop capturing"
+        self.stopSave()
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+        self.sock.close()
+
+    def __str__( self ):
+        return '%s:%s' % ( self.node, self.intf or 'any' )
+
+
+class PcapWriter( object ):
+    """Write packets to pcap files (with nanosecond timestamps),
+       starting a new file when the current one reaches maxBytes"""
+
+    LINKTYPE_ETHERNET = 1
+    HEADER = struct.Struct( '=IHHiIII' )
+    RECORD = struct.Struct( '=IIII' )
+    MAGIC_NSEC = 0xa1b23c4d
+
+    def __init__( self, path, snaplen=65535, maxBytes=None, maxFiles=None ):
+        """path: pcap file; older files are path.1, path.2, ...
+           snaplen: snapshot length to record in headers
+           maxBytes: size at which to rotate files, or None
+           maxFiles: number of files to keep (including path), or None"""
+        self.path, self.snaplen = path, snaplen
+        self.maxBytes, self.maxFiles = maxBytes, maxFiles
+        self.rotations = 0
+        self.file = None
+        self.open()
+
+    def open( self ):
+        "Start a new file"
+        self.file = open( self.path, 'wb' )
+        self.file.write( self.HEADER.pack( self.MAGIC_NSEC, 2, 4, 0, 0,
+                                           self.snaplen,
+                                           self.LINKTYPE_ETHERNET ) )
+        self.size = self.HEADER.size
+
+    def rotate( self ):
+        "Move path to path.1, path.1 to path.2, etc. and start a new file"
+        self.file.close()
+        self.rotations += 1
+        last = self.rotations
+        if self.maxFiles:
+            last = min( last, self.maxFiles - 1 )
+            if last < 1:
+                os.unlink( self.path )
+        for i in range( last, 0, -1 ):
+            src = self.path + ( '.%d' % ( i - 1 ) if i > 1 else '' )
+            try:
+                os.rename( src, '%s.%d' % ( self.path, i ) )
+            except OSError as e:
+                if e.errno != errno.ENOENT:
+                    raise
+        debug( '*** capture: rotated %s\n' % self.path )
+        self.open()
+
+    def write( self, timestamp, length, data ):
+        """Write a packet
+           timestamp: ( seconds, nanoseconds ) since the epoch, as
+             from Capture.packets()
+           length: original length of packet
+           data: captured bytes"""
+        if self.maxBytes and self.size + len( data ) > self.maxBytes:
+            self.rotate()
+        sec, nsec = timestamp
+        self.file.write( self.RECORD.pack( sec, nsec, len( data ), length ) )
+        self.file.write( data )
+        self.size += self.RECORD.size + len( data )
+
+    def close( self ):
+        "Close the current file"
+        if self.file:
+            self.file.close()
+            self.file = None
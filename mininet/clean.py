@@ -13,6 +13,7 @@
 from subprocess import ( Popen, PIPE, check_output as co,
                          CalledProcessError )
 import time
+import os
 
 from mininet.log import info
 from mininet.term import cleanUpScreens
@@ -117,6 +118,16 @@ def cleanup( cls):
             info( "*** Removing tap9 - assuming it's from cluster edition\n" )
             sh( 'ip link del tap9' )
 
+        info( "*** Removing stale LightHost namespaces\n" )
+        # Namespaces are named mn-<pid>-<host>; leave those whose
+        # Mininet process is still running
+        for ns in sh( "ip netns list | egrep -o '^mn-[0-9]+-[^ ]+'" ).split():
+            pid = ns.split( '-' )[ 1 ]
+            if os.path.exists( '/proc/' + pid ):
+                continue
+            sh( 'ip netns pids %s | xargs -r kill -9' % ns )
+            sh( 'ip netns del %s' % ns )
+
         info( "*** Killing stale mininet node processes\n" )
         killprocs( 'mininet:' )
 
@@ -117,7 +117,9 @@ def __init__( self, *args, **kwargs ):
         params = { 'host': RemoteHost,
                    'switch': RemoteOVSSwitch,
                    'link': RemoteLink,
-                   'precheck': True }
+                   'precheck': True,
+                   # Remote nodes and tunnels are set up one at a time
+                   'workers': 1 }
         params.update( kwargs )
         servers = params.pop( 'servers', [ 'localhost' ] )
         servers = [ s if s else 'localhost' for s in servers ]
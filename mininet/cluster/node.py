@@ -35,6 +35,9 @@ class RemoteMixin( object ):
                 '-o', 'BatchMode=yes',
                 '-o', 'ForwardAgent=yes', '-tt' ]
 
+    # Remote namespaces can't be configured with our netlink sockets
+    useNetlink = False
+
     def __init__( self, name, server='localhost', user=None, serverIP=None,
                   controlPath=False, splitInit=False, **kwargs):
         """Instantiate a remote node
@@ -169,6 +172,11 @@ def _popen( self, cmd, sudo=True, tt=True, **params):
         popen = super( RemoteMixin, self )._popen( cmd, **params )
         return popen
 
+    def _spawnShell( self, cmd, tty ):
+        "Override: use _popen() so that we can run via ssh"
+        return self._popen( cmd, stdin=tty, stdout=tty, stderr=tty,
+                            close_fds=False )
+
     def popen( self, *args, **kwargs ):
         "Override: disable -tt"
         return super( RemoteMixin, self).popen( *args, tt=False, **kwargs )
@@ -0,0 +1,257 @@
+"""
+delay.py: one-way delay measurement for Mininet
+
+Since all of our nodes share one kernel and therefore one clock, we
+can measure true one-way delays, rather than halving ping's round trip
+times. This lets us check asymmetric link delays (e.g. a TCLink with
+different delay or jitter in each direction) or see queueing delay
+build up in one direction under load.
+
+measureDelays() opens a UDP socket in each source's and destination's
+namespace (see netlink.nsSocket) and, from a single loop, sends
+timestamped probes for every ( src, dst ) pair at a fixed rate. The
+receive time is the kernel's timestamp for each packet (SIOCGSTAMPNS),
+so that our own scheduling delays don't count. Delays are recorded in
+a Histogram for each direction.
+
+Histogram is a log-linear histogram in the style of HdrHistogram:
+values below 2**subBits are counted exactly, and larger values in
+buckets whose width is a fixed fraction (2**-(subBits-1)) of their
+value, so that a few thousand counters cover nanoseconds to minutes.
+"""
+
+import time
+import errno
+import fcntl
+import select
+import socket
+import struct
+from array import array
+
+from mininet.log import debug
+from mininet.netlink import nsSocket
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class Histogram( object ):
+    "Log-linear histogram of non-negative integers (e.g. ns)"
+
+    def __init__( self, subBits=7, maxBits=40 ):
+        """subBits: sub-bucket bits; relative error is 2**-(subBits-1)
+           maxBits: largest value is 2**maxBits - 1; larger values
+             are counted as the largest value"""
+        self.subBits, self.maxBits = subBits, maxBits
+        self.maxValue = ( 1 << maxBits ) - 1
+        size = self.index( self.maxValue ) + 1
+        if numpy is not None:
+            self.counts = numpy.zeros( size, dtype=int )
+        else:
+            self.counts = array( 'l', [ 0 ] ) * size
+        self.total, self.sum = 0, 0
+        self.min, self.max = None, None
+
+    def index( self, value ):
+        "Return counter index for value"
+        sub = self.subBits
+        if value < 1 << sub:
+            return value
+        shift = value.bit_length() - sub
+        half = 1 << ( sub - 1 )
+        return ( 1 << sub ) + ( shift - 1 ) * half + ( value >> shift ) - half
+
+    def lowest( self, index ):
+        "Return the smallest value counted at index"
+        sub = self.subBits
+        if index < 1 << sub:
+            return index
+        half = 1 << ( sub - 1 )
+        shift, offset = divmod( index - ( 1 << sub ), half )
+        return ( half + offset ) << ( shift + 1 )
+
+    def record( self, value, count=1 ):
+        "Count value (clamped to 0..maxValue)"
+        value = min( max( int( value ), 0 ), self.maxValue )
+        self.counts[ self.index( value ) ] += count
+        self.total += count
+        self.sum += value * count
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge( self, other ):
+        "Add the counts from another Histogram with the same layout"
+        for i, count in enumerate( other.counts ):
+            if count:
+                self.counts[ i ] += count
+        self.total += other.total
+        self.sum += other.sum
+        for value in other.min, other.max:
+            if value is not None:
+                self.min = value if self.min is None else min( self.min,
+                                                               value )
+                self.max = value if self.max is None else max( self.max,
+                                                               value )
+
+    def mean( self ):
+        "Return the mean value, or None if empty"
+        return float( self.sum ) / self.total if self.total else None
+
+    def percentile( self, pct ):
+        """Return the value at percentile pct (0-100), to within the
+           histogram's precision, or None if empty"""
+        if not self.total:
+            return None
+        target = max( pct / 100.0 * self.total, 1 )
+        seen = 0
+        for i, count in enumerate( self.counts ):
+            seen += count
+            if seen >= target:
+                # Report the largest value the counter could hold
+                value = self.lowest( i + 1 ) - 1
+                return min( max( value, self.min ), self.max )
+        return self.max
+
+
+class DelayStats( object ):
+    "One-way delays (in ns) and losses for one direction"
+
+    def __init__( self, src, dst, **params ):
+        """src, dst: nodes
+           params: Histogram params"""
+        self.src, self.dst = src, dst
+        self.sent, self.received = 0, 0
+        self.histogram = Histogram( **params )
+
+    def loss( self ):
+        "Return fraction of probes lost"
+        return 1 - float( self.received ) / self.sent if self.sent else 0
+
+    def summary( self ):
+        """Return delays in ms:
+           ( min, p50, p99, max, mean ), or Nones if nothing arrived"""
+        h = self.histogram
+        values = ( h.min, h.percentile( 50 ), h.percentile( 99 ), h.max,
+                   h.mean() )
+        return tuple( v / 1e6 if v is not None else None for v in values )
+
+    def __str__( self ):
+        summary = self.summary()
+        if summary[ 0 ] is None:
+            delays = 'no probes received'
+        else:
+            delays = ( 'min/p50/p99/max/mean %.3f/%.3f/%.3f/%.3f/%.3f ms' %
+                       summary )
+        return '%s->%s: %d/%d received, %s' % (
+            self.src, self.dst, self.received, self.sent, delays )
+
+
+# Probe format: pair id, sequence number, send time (ns)
+PROBE = struct.Struct( '!IIq' )
+
+SIOCGSTAMPNS = 0x8907
+TIMESPEC = struct.Struct( '@ll' )
+
+def rxTimestamp( sock ):
+    "Return the kernel's receive time (ns) for sock's last packet"
+    stamp = fcntl.ioctl( sock.fileno(), SIOCGSTAMPNS, '\0' * TIMESPEC.size )
+    sec, nsec = TIMESPEC.unpack( stamp )
+    return sec * 1000000000 + nsec
+
+def udpSocket( node, port=None, rcvbuf=1 << 22 ):
+    "Return a non-blocking UDP socket in node's namespace"
+    sock = nsSocket( node.nsPath(), socket.AF_INET, socket.SOCK_DGRAM )
+    sock.setblocking( False )
+    if port is not None:
+        sock.setsockopt( socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf )
+        # Our first SIOCGSTAMPNS has the kernel start timestamping
+        # packets (and fails, since nothing has arrived yet)
+        try:
+            rxTimestamp( sock )
+        except IOError:
+            pass
+        sock.bind( ( '', port ) )
+    return sock
+
+def _receive( sock, stats, seen ):
+    "Record all probes waiting on sock"
+    while True:
+        try:
+            data = sock.recv( 2048 )
+        except socket.error as e:
+            if e.errno in ( errno.EAGAIN, errno.EINTR ):
+                return
+            raise
+        if len( data ) < PROBE.size:
+            continue
+        now = rxTimestamp( sock )
+        pair, seq, sent = PROBE.unpack_from( data )
+        if pair >= len( stats ) or ( pair, seq ) in seen:
+            continue
+        seen.add( ( pair, seq ) )
+        stats[ pair ].received += 1
+        stats[ pair ].histogram.record( now - sent )
+
+def measureDelays( pairs, rate=100, duration=5, port=5003, size=64,
+                   timeout=1, **params ):
+    """Measure one-way delays from each src to each dst
+       pairs: list of ( src, dst ) nodes; include ( dst, src ) for
+         the reverse direction
+       rate: probes per second for each pair
+       duration: seconds to send probes for
+       port: UDP port for probes
+       size: UDP payload size of each probe
+       timeout: seconds to wait for probes after the last is sent
+       params: Histogram params
+       returns: list of DelayStats, in the order of pairs"""
+    stats = [ DelayStats( src, dst, **params ) for src, dst in pairs ]
+    senders, receivers = {}, {}
+    payload = '\0' * max( size - PROBE.size, 0 )
+    try:
+        for src, dst in pairs:
+            if src not in senders:
+                senders[ src ] = udpSocket( src )
+            if dst not in receivers:
+                receivers[ dst ] = udpSocket( dst, port )
+        poller = select.poll()
+        for sock in receivers.itervalues():
+            poller.register( sock.fileno(), select.POLLIN )
+        fdSock = dict( ( sock.fileno(), sock )
+                       for sock in receivers.itervalues() )
+        seen = set()
+        dests = [ ( senders[ src ], ( dst.IP(), port ) )
+                  for src, dst in pairs ]
+        interval = 1.0 / rate
+        start = time.time()
+        count = int( duration * rate )
+        for seq in range( count ):
+            # Stay on schedule, receiving while we wait
+            while True:
+                delay = start + seq * interval - time.time()
+                for fd, _event in poller.poll( max( int( delay * 1000 ),
+                                                    0 ) ):
+                    _receive( fdSock[ fd ], stats, seen )
+                if delay <= 0:
+                    break
+            for pair, ( sock, dest ) in enumerate( dests ):
+                stats[ pair ].sent += 1
+                try:
+                    sock.sendto( PROBE.pack( pair, seq,
+                                             int( time.time() * 1e9 ) ) +
+                                 payload, dest )
+                except socket.error as e:
+                    debug( '*** delay probe %s: %s\n' % ( stats[ pair ],
+                                                          e ) )
+        end = time.time() + timeout
+        while len( seen ) < count * len( pairs ) and time.time() < end:
+            for fd, _event in poller.poll( int( ( end - time.time() )
+                                                * 1000 ) + 1 ):
+                _receive( fdSock[ fd ], stats, seen )
+    finally:
+        for sock in senders.values() + receivers.values():
+            sock.close()
+    return stats
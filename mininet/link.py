@@ -25,9 +25,11 @@
 """
 
 from mininet.log import info, error, debug
-from mininet.util import makeIntfPair
+from mininet.util import makeIntfPair, tcBatches, kernelHz
+from mininet.stats import intfCounters
 import mininet.node
 import re
+from subprocess import PIPE, STDOUT
 
 class Intf( object ):
 
@@ -67,24 +69,49 @@ def ifconfig( self, *args ):
         "Configure ourselves using ifconfig"
         return self.cmd( 'ifconfig', self.name, *args )
 
+    def netlink( self ):
+        "Return netlink socket for our node's namespace, or None"
+        return self.node.netlink()
+
+    def nlcmd( self, fn, *args ):
+        """Configure ourselves using a netlink method.
+           fn: RtNetlink method to call
+           returns: error string, or '' on success (like ifconfig)"""
+        try:
+            fn( *args )
+            return ''
+        except OSError as e:
+            return 'netlink %s %s: %s\n' % ( fn.__name__, self.name,
+                                             e.strerror )
+
     def setIP( self, ipstr, prefixLen=None ):
         """Set our IP address"""
         # This is a sign that we should perhaps rethink our prefix
         # mechanism and/or the way we specify IP addresses
         if '/' in ipstr:
             self.ip, self.prefixLen = ipstr.split( '/' )
-            return self.ifconfig( ipstr, 'up' )
+            args = ( ipstr, 'up' )
         else:
             if prefixLen is None:
                 raise Exception( 'No prefix length set for IP address %s'
                                  % ( ipstr, ) )
             self.ip, self.prefixLen = ipstr, prefixLen
-            return self.ifconfig( '%s/%s' % ( ipstr, prefixLen ) )
+            args = ( '%s/%s' % ( ipstr, prefixLen ), )
+        nl = self.netlink()
+        if nl:
+            return self.nlcmd( nl.setAddr, self.name, self.ip,
+                               self.prefixLen )
+        return self.ifconfig( *args )
 
     def setMAC( self, macstr ):
         """Set the MAC address for an interface.
            macstr: MAC address as string"""
         self.mac = macstr
+        nl = self.netlink()
+        if nl:
+            return ( self.nlcmd( nl.setLinkUp, self.name, False ) +
+                     self.nlcmd( nl.setMAC, self.name, macstr ) +
+                     self.nlcmd( nl.setLinkUp, self.name ) )
         return ( self.ifconfig( 'down' ) +
                  self.ifconfig( 'hw', 'ether', macstr ) +
                  self.ifconfig( 'up' ) )
@@ -92,8 +119,22 @@ def setMAC( self, macstr ):
     _ipMatchRegex = re.compile( r'\d+\.\d+\.\d+\.\d+' )
     _macMatchRegex = re.compile( r'..:..:..:..:..:..' )
 
+    def nlAddr( self ):
+        """Return IP address and MAC address via netlink.
+           returns: ip, mac (or None, None if the intf is missing)"""
+        nl = self.netlink()
+        try:
+            mac = nl.getLink( self.name )[ 'mac' ]
+            ips = nl.getAddrs( self.name )
+        except OSError:
+            return None, None
+        return ( ips[ 0 ][ 1 ] if ips else None ), mac
+
     def updateIP( self ):
         "Return updated IP address based on ifconfig"
+        if self.netlink():
+            self.ip, _mac = self.nlAddr()
+            return self.ip
         # use pexec instead of node.cmd so that we dont read
         # backgrounded output from the cli.
         ifconfig, _err, _exitCode = self.node.pexec(
@@ -104,6 +145,9 @@ def updateIP( self ):
 
     def updateMAC( self ):
         "Return updated MAC address based on ifconfig"
+        if self.netlink():
+            _ip, self.mac = self.nlAddr()
+            return self.mac
         ifconfig = self.ifconfig()
         macs = self._macMatchRegex.findall( ifconfig )
         self.mac = macs[ 0 ] if macs else None
@@ -115,6 +159,9 @@ def updateMAC( self ):
 
     def updateAddr( self ):
         "Return IP address and MAC address based on ifconfig."
+        if self.netlink():
+            self.ip, self.mac = self.nlAddr()
+            return self.ip, self.mac
         ifconfig = self.ifconfig()
         ips = self._ipMatchRegex.findall( ifconfig )
         macs = self._macMatchRegex.findall( ifconfig )
@@ -132,14 +179,23 @@ def MAC( self ):
 
     def isUp( self, setUp=False ):
         "Return whether interface is up"
+        nl = self.netlink()
         if setUp:
-            cmdOutput = self.ifconfig( 'up' )
+            if nl:
+                cmdOutput = self.nlcmd( nl.setLinkUp, self.name )
+            else:
+                cmdOutput = self.ifconfig( 'up' )
             # no output indicates success
             if cmdOutput:
                 error( "Error setting %s up: %s " % ( self.name, cmdOutput ) )
                 return False
             else:
                 return True
+        elif nl:
+            try:
+                return nl.isLinkUp( self.name )
+            except OSError:
+                return False
         else:
             return "UP" in self.ifconfig()
 
@@ -196,12 +252,19 @@ def config( self, mac=None, ip=None, ifconfig=None,
 
     def delete( self ):
         "Delete interface"
-        self.cmd( 'ip link del ' + self.name )
+        nl = self.netlink()
+        if not nl or self.nlcmd( nl.delLink, self.name ):
+            self.cmd( 'ip link del ' + self.name )
         # We used to do this, but it slows us down:
         # if self.node.inNamespace:
         # Link may have been dumped into root NS
         # quietRun( 'ip link del ' + self.name )
 
+    def stats( self ):
+        """Return our counters (rxBytes, txPackets, rxDropped...)
+           as a dict"""
+        return intfCounters( self )
+
     def status( self ):
         "Return intf status as a string"
         links, _err, _result = self.node.pexec( 'ip link show' )
@@ -217,24 +280,62 @@ def __str__( self ):
         return self.name
 
 
+TC_H_ROOT, TC_H_INGRESS = 0xFFFFFFFF, 0xFFFFFFF1
+
+def parseHandle( handle ):
+    "Convert a tc handle (e.g. 5:, 5:1, 10:) to a number"
+    major, _sep, minor = handle.partition( ':' )
+    return ( int( major or '0', 16 ) << 16 ) | int( minor or '0', 16 )
+
+
 class TCIntf( Intf ):
     """Interface customized by tc (traffic control) utility
        Allows specification of bandwidth limits (various methods)
        as well as delay, loss and max queue length"""
 
     # The parameters we use seem to work reasonably up to 1 Gb/sec
-    # For higher data rates, we will probably need to change them.
+    # For higher data rates, we use high_rate parameters (see
+    # highRateBurst()), which we allow up to bwHighMax
     bwParamMax = 1000
+    bwHighMax = 400000
+
+    # Largest htb quantum that htb doesn't warn about
+    quantumMax = 200000
+
+    def gsoMaxSize( self ):
+        "Return the largest GSO packet that we may be sent"
+        nl = self.netlink()
+        if nl:
+            try:
+                return nl.getLink( self.name )[ 'gsoMaxSize' ] or 65536
+            except OSError:
+                pass
+        return 65536
+
+    def highRateBurst( self, bw ):
+        """Return the burst (bytes) for a shaper at bw Mbit/s: what we
+           send at bw in a kernel timer tick, or twice our largest GSO
+           packet, whichever is more. A smaller burst leaves the link
+           idle between ticks, well below bw.
+           bw: bandwidth in Mbit/s"""
+        return int( max( bw * 1e6 / 8 / kernelHz(),
+                         2 * self.gsoMaxSize() ) )
 
     def bwCmds( self, bw=None, speedup=0, use_hfsc=False, use_tbf=False,
-                latency_ms=None, enable_ecn=False, enable_red=False ):
-        "Return tc commands to set bandwidth"
+                latency_ms=None, enable_ecn=False, enable_red=False,
+                high_rate=None ):
+        """Return tc commands to set bandwidth
+           high_rate: scale burst and quantum to bw? (default: if bw is
+             above bwParamMax)"""
 
         cmds, parent = [], ' root '
 
-        if bw and ( bw < 0 or bw > self.bwParamMax ):
+        if high_rate is None:
+            high_rate = bool( bw ) and bw > self.bwParamMax
+        bwMax = self.bwHighMax if high_rate else self.bwParamMax
+        if bw and ( bw < 0 or bw > bwMax ):
             error( 'Bandwidth limit', bw, 'is outside supported range 0..%d'
-                   % self.bwParamMax, '- ignoring\n' )
+                   % bwMax, '- ignoring\n' )
         elif bw is not None:
             # BL: this seems a bit brittle...
             if ( speedup > 0 and
@@ -249,11 +350,20 @@ def bwCmds( self, bw=None, speedup=0, use_hfsc=False, use_tbf=False,
                           '%s class add dev %s parent 5:0 classid 5:1 hfsc sc '
                           + 'rate %fMbit ul rate %fMbit' % ( bw, bw ) ]
             elif use_tbf:
+                burst = self.highRateBurst( bw ) if high_rate else 15000
                 if latency_ms is None:
-                    latency_ms = 15 * 8 / bw
+                    latency_ms = ( burst * 8 / ( bw * 1000.0 ) if high_rate
+                                   else 15 * 8 / bw )
                 cmds += [ '%s qdisc add dev %s root handle 5: tbf ' +
-                          'rate %fMbit burst 15000 latency %fms' %
-                          ( bw, latency_ms ) ]
+                          'rate %fMbit burst %d latency %fms' %
+                          ( bw, burst, latency_ms ) ]
+            elif high_rate:
+                burst = self.highRateBurst( bw )
+                cmds += [ '%s qdisc add dev %s root handle 5:0 htb default 1',
+                          '%s class add dev %s parent 5:0 classid 5:1 htb ' +
+                          'rate %fMbit burst %d cburst %d quantum %d' %
+                          ( bw, burst, burst,
+                            min( burst, self.quantumMax ) ) ]
             else:
                 cmds += [ '%s qdisc add dev %s root handle 5:0 htb default 1',
                           '%s class add dev %s parent 5:0 classid 5:1 htb ' +
@@ -309,37 +419,44 @@ def tc( self, cmd, tc='tc' ):
         debug(" *** executing command: %s\n" % c)
         return self.cmd( c )
 
-    def config( self, bw=None, delay=None, jitter=None, loss=None,
-                disable_gro=True, speedup=0, use_hfsc=False, use_tbf=False,
-                latency_ms=None, enable_ecn=False, enable_red=False,
-                max_queue_size=None, **params ):
-        "Configure the port and set its properties."
-
-        result = Intf.config( self, **params)
-
-        # Disable GRO
-        if disable_gro:
-            self.cmd( 'ethtool -K %s gro off' % self )
-
-        # Optimization: return if nothing else to configure
-        # Question: what happens if we want to reset things?
+    # Qdisc configurations waiting for runQueuedConfigs(), or None
+    configQueue = None
+
+    # Our tc parameters, and their defaults
+    tcDefaults = dict( bw=None, delay=None, jitter=None, loss=None,
+                       disable_gro=True, speedup=0, use_hfsc=False,
+                       use_tbf=False, latency_ms=None, enable_ecn=False,
+                       enable_red=False, max_queue_size=None,
+                       high_rate=None, pacing=None )
+
+    # Leaf qdiscs that pacing may add, for fair queueing and pacing
+    pacingQdiscs = ( 'fq', 'fq_codel' )
+
+    # What we last applied: ( tc params, qdisc tree, result ), or None
+    tcApplied = None
+
+    def tcCmds( self, bw=None, delay=None, jitter=None, loss=None,
+                speedup=0, use_hfsc=False, use_tbf=False, latency_ms=None,
+                enable_ecn=False, enable_red=False, max_queue_size=None,
+                high_rate=None, pacing=None, **_params ):
+        """Return tc commands (without the leading 'tc') to set up
+           our qdiscs, or [] if there is nothing to configure
+           returns: cmds, parent, description"""
         if ( bw is None and not delay and not loss
-             and max_queue_size is None ):
-            return
+             and max_queue_size is None and not pacing ):
+            return [], ' root ', ''
 
-        # Clear existing configuration
-        tcoutput = self.tc( '%s qdisc show dev %s' )
-        if "priomap" not in tcoutput:
-            cmds = [ '%s qdisc del dev %s root' ]
-        else:
-            cmds = []
+        # Clear existing configuration (batchConfig() leaves this out
+        # if there is none)
+        cmds = [ '%s qdisc del dev %s root' ]
 
         # Bandwidth limits via various methods
         bwcmds, parent = self.bwCmds( bw=bw, speedup=speedup,
                                       use_hfsc=use_hfsc, use_tbf=use_tbf,
                                       latency_ms=latency_ms,
                                       enable_ecn=enable_ecn,
-                                      enable_red=enable_red )
+                                      enable_red=enable_red,
+                                      high_rate=high_rate )
         cmds += bwcmds
 
         # Delay/jitter/loss/max_queue_size using netem
@@ -349,28 +466,310 @@ def config( self, bw=None, delay=None, jitter=None, loss=None,
                                             parent=parent )
         cmds += delaycmds
 
+        # Fair queueing (and, with fq, pacing) below everything else
+        if pacing and pacing not in self.pacingQdiscs:
+            error( 'Unknown pacing qdisc', pacing, '- ignoring\n' )
+        elif pacing:
+            cmds += [ '%s qdisc add dev %s' + parent + 'handle 20: ' +
+                      pacing ]
+
         # Ugly but functional: display configuration info
         stuff = ( ( [ '%.2fMbit' % bw ] if bw is not None else [] ) +
                   ( [ '%s delay' % delay ] if delay is not None else [] ) +
                   ( [ '%s jitter' % jitter ] if jitter is not None else [] ) +
                   ( ['%d%% loss' % loss ] if loss is not None else [] ) +
                   ( [ 'ECN' ] if enable_ecn else [ 'RED' ]
-                    if enable_red else [] ) )
-        info( '(' + ' '.join( stuff ) + ') ' )
-
-        # Execute all the commands in our node
-        debug("at map stage w/cmds: %s\n" % cmds)
-        tcoutputs = [ self.tc(cmd) for cmd in cmds ]
-        for output in tcoutputs:
-            if output != '':
-                error( "*** Error: %s" % output )
-        debug( "cmds:", cmds, '\n' )
-        debug( "outputs:", tcoutputs, '\n' )
-        result[ 'tcoutputs'] = tcoutputs
-        result[ 'parent' ] = parent
+                    if enable_red else [] ) +
+                  ( [ pacing ] if pacing else [] ) )
+
+        return ( [ ( cmd % ( '', self ) ).strip() for cmd in cmds ],
+                 parent, '(' + ' '.join( stuff ) + ') ' )
 
+    @staticmethod
+    def qdiscTree( cmds ):
+        """Return the qdiscs that cmds (from tcCmds()) add
+           returns: sorted tuple of ( parent, handle, kind )"""
+        tree = []
+        for cmd in cmds:
+            words = cmd.split()
+            if words[ :2 ] != [ 'qdisc', 'add' ] or 'handle' not in words:
+                continue
+            h = words.index( 'handle' )
+            parent = ( TC_H_ROOT if 'root' in words else
+                       parseHandle( words[ words.index( 'parent' ) + 1 ] ) )
+            tree.append( ( parent, parseHandle( words[ h + 1 ] ),
+                           words[ h + 2 ] ) )
+        return tuple( sorted( tree ) )
+
+    @staticmethod
+    def kernelTrees( intfs ):
+        """Read the qdisc trees of intfs from the kernel, with one
+           dump per namespace
+           returns: { intf: qdisc tree } for intfs we could read"""
+        byNs, trees = {}, {}
+        for intf in intfs:
+            nl = intf.netlink()
+            if nl:
+                byNs.setdefault( nl, [] ).append( intf )
+        for nl, nsIntfs in byNs.iteritems():
+            try:
+                names = { link[ 'index' ]: link[ 'name' ]
+                          for link in nl.links() }
+                qdiscs = nl.qdiscs()
+            except OSError as e:
+                debug( '*** kernelTrees: %s\n' % e )
+                continue
+            byName = {}
+            for q in qdiscs:
+                # Skip default (handle 0:) and ingress qdiscs
+                if not q[ 'handle' ] or q[ 'parent' ] == TC_H_INGRESS:
+                    continue
+                byName.setdefault( names.get( q[ 'index' ] ), [] ).append(
+                    ( q[ 'parent' ], q[ 'handle' ], q[ 'kind' ] ) )
+            for intf in nsIntfs:
+                trees[ intf ] = tuple( sorted( byName.get( intf.name,
+                                                           [] ) ) )
+        return trees
+
+    @classmethod
+    def batchConfig( cls, intfs, paramsList=None, changedOnly=False,
+                     background=False ):
+        """Configure the qdiscs of many TCIntfs at once: ethtool runs
+           in one shell round trip per node, and tc commands in one
+           tc -batch process per namespace.
+           intfs: list of TCIntfs
+           paramsList: list of tc parameters for each intf (default:
+             what we last applied, or else each intf's params)
+           changedOnly: skip intfs whose parameters are what we last
+             applied and whose qdiscs in the kernel still match
+           background: we may be running alongside the thread that
+             uses the nodes (e.g. in a TraceScheduler), so don't use
+             their shells or netlink sockets: ethtool runs in a new
+             process per node, and we go by what we last applied
+           returns: list of result dicts (tcoutputs, parent; empty if
+             there was nothing to configure), one per intf"""
+        if paramsList is None:
+            paramsList = [ intf.tcApplied[ 0 ] if intf.tcApplied
+                           else intf.params for intf in intfs ]
+        paramsList = [ { key: params.get( key, default )
+                         for key, default in cls.tcDefaults.iteritems() }
+                       for params in paramsList ]
+        plans = [ intf.tcCmds( **params )
+                  for intf, params in zip( intfs, paramsList ) ]
+        trees = [ cls.qdiscTree( cmds ) for cmds, _parent, _s in plans ]
+        skip = set()
+        if changedOnly:
+            same = [ i for i, intf in enumerate( intfs )
+                     if intf.tcApplied and
+                     intf.tcApplied[ :2 ] == ( paramsList[ i ],
+                                               trees[ i ] ) ]
+            kernel = cls.kernelTrees( [ intfs[ i ] for i in same ] )
+            skip = set( i for i in same
+                        if kernel.get( intfs[ i ] ) == trees[ i ] )
+        results = [ dict( intf.tcApplied[ 2 ], tcoutputs=[] )
+                    if i in skip else {}
+                    for i, intf in enumerate( intfs ) ]
+        # Deleting a root qdisc fails if it is the default one, so we
+        # only do it if the kernel (or if we can't read it, what we
+        # last applied) shows a qdisc of ours
+        clear = [ i for i, ( cmds, _parent, _s ) in enumerate( plans )
+                  if i not in skip and cmds ]
+        kernel = ( {} if background else
+                   cls.kernelTrees( [ intfs[ i ] for i in clear ] ) )
+        for i in clear:
+            intf, ( cmds, parent, stuff ) = intfs[ i ], plans[ i ]
+            applied = intf.tcApplied[ 1 ] if intf.tcApplied else ()
+            if not kernel.get( intf, applied ):
+                plans[ i ] = ( cmds[ 1: ], parent, stuff )
+        gro, batches = {}, {}
+        for i, ( intf, params ) in enumerate( zip( intfs, paramsList ) ):
+            if i in skip:
+                continue
+            intf.tcApplied = ( params, trees[ i ], results[ i ] )
+            node = intf.node
+            if params.get( 'disable_gro', True ):
+                gro.setdefault( node, [] ).append(
+                    'ethtool -K %s gro off' % intf )
+            cmds, parent, stuff = plans[ i ]
+            if not cmds:
+                continue
+            info( stuff )
+            results[ i ][ 'parent' ] = parent
+            # Nodes that share a namespace can share a tc process
+            key = node.nsPath() if node.netlink() else node
+            batch = batches.setdefault( key, ( node, [] ) )
+            batch[ 1 ].extend( ( i, cmd ) for cmd in cmds )
+        if background:
+            procs = [ node.popen( [ 'sh', '-c', '; '.join( cmds ) ],
+                                  stdout=PIPE, stderr=STDOUT )
+                      for node, cmds in gro.iteritems() ]
+            for proc in procs:
+                proc.communicate()
+        else:
+            for node, cmds in gro.iteritems():
+                node.cmdBatch( cmds )
+        batches = batches.values()
+        debug( "at map stage w/cmds: %s\n" % batches )
+        allOutputs = tcBatches( [ ( node, [ cmd for _i, cmd in cmds ] )
+                                  for node, cmds in batches ] )
+        for ( _node, cmds ), outputs in zip( batches, allOutputs ):
+            for ( i, _cmd ), output in zip( cmds, outputs ):
+                results[ i ].setdefault( 'tcoutputs', [] ).append( output )
+                if output:
+                    error( "*** Error: %s" % output )
+            debug( "outputs:", outputs, '\n' )
+        return results
+
+    @classmethod
+    def queueConfigs( cls ):
+        """Start queueing qdisc configuration from config(), so that
+           runQueuedConfigs() can apply it with batchConfig()"""
+        cls.configQueue = []
+
+    @classmethod
+    def runQueuedConfigs( cls ):
+        """Apply qdisc configuration queued since queueConfigs(),
+           filling in the result dicts returned by config()"""
+        queue, cls.configQueue = cls.configQueue, None
+        if not queue:
+            return
+        intfs, paramsList, results = zip( *queue )
+        for result, update in zip( results,
+                                   cls.batchConfig( intfs, paramsList ) ):
+            result.update( update )
+
+    def config( self, bw=None, delay=None, jitter=None, loss=None,
+                disable_gro=True, speedup=0, use_hfsc=False, use_tbf=False,
+                latency_ms=None, enable_ecn=False, enable_red=False,
+                max_queue_size=None, high_rate=None, pacing=None,
+                **params ):
+        "Configure the port and set its properties."
+
+        result = Intf.config( self, **params)
+
+        tcParams = dict( bw=bw, delay=delay, jitter=jitter, loss=loss,
+                         disable_gro=disable_gro, speedup=speedup,
+                         use_hfsc=use_hfsc, use_tbf=use_tbf,
+                         latency_ms=latency_ms, enable_ecn=enable_ecn,
+                         enable_red=enable_red,
+                         max_queue_size=max_queue_size,
+                         high_rate=high_rate, pacing=pacing )
+
+        # Leave it to runQueuedConfigs() if we're queueing
+        queue = TCIntf.configQueue
+        if queue is not None:
+            queue.append( ( self, tcParams, result ) )
+            return result
+
+        result.update( self.batchConfig( [ self ], [ tcParams ] )[ 0 ] )
         return result
 
+    def reapply( self ):
+        """Reapply our last qdisc configuration (or our params) if
+           the kernel's no longer matches it, e.g. after OVS has
+           replaced it
+           returns: result dict, as for batchConfig()"""
+        return self.batchConfig( [ self ], changedOnly=True )[ 0 ]
+
+    def changeCmds( self, cmds, tree ):
+        """Return tc commands that turn the qdiscs we last applied into
+           those that cmds (from tcCmds()) would build, by changing
+           qdiscs and classes in place and adding or deleting leaves -
+           or None if that can't be done without starting over
+           tree: qdiscTree( cmds )"""
+        old = set( self.tcApplied[ 1 ] ) if self.tcApplied else set()
+        new = set( tree )
+        if not old or not ( old <= new or new <= old ):
+            return None
+        if not new:
+            return [ 'qdisc del dev %s root' % self ]
+        handles = set( handle for _parent, handle, _kind in old )
+        oldCmds = set( self.tcCmds( **self.tcApplied[ 0 ] )[ 0 ] )
+        changes = []
+        for cmd in cmds:
+            words = cmd.split()
+            # Not every qdisc can be changed (e.g. htb), so we only
+            # change what is different
+            if words[ 1 ] != 'add' or cmd in oldCmds:
+                continue
+            if words[ 0 ] == 'class':
+                # Classes belong to the qdisc that is their parent
+                parent = words[ words.index( 'parent' ) + 1 ]
+                exists = parseHandle( parent ) in handles
+            else:
+                exists = self.qdiscTree( [ cmd ] )[ 0 ] in old
+            if exists:
+                words[ 1 ] = 'change'
+            changes.append( ' '.join( words ) )
+        # Deleting a qdisc deletes the qdiscs below it
+        removed = old - new
+        removedHandles = set( handle for _parent, handle, _kind in removed )
+        for parent, handle, _kind in sorted( removed ):
+            if parent & 0xFFFF0000 not in removedHandles:
+                changes.append( 'qdisc del dev %s parent %x:%x handle %x:' %
+                                ( self, parent >> 16, parent & 0xFFFF,
+                                  handle >> 16 ) )
+        return changes
+
+    @classmethod
+    def batchUpdate( cls, intfs, paramsList ):
+        """Change some of the tc parameters (bw, delay, loss, etc.) of
+           many TCIntfs, keeping the rest as we last applied them.
+           Where the qdiscs stay the same shape, they are changed in
+           place, so packets queued in them are not dropped, and the
+           changes for each node are sent to its TcShell in one go, so
+           that this may be called many times a second. Otherwise,
+           this is the same as batchConfig( background=True ), since
+           we may be called from a TraceScheduler's thread.
+           intfs: list of TCIntfs
+           paramsList: list of parameters to change for each intf
+           returns: list of result dicts, as for batchConfig()"""
+        results = [ None ] * len( intfs )
+        rebuild, plans, batches = [], {}, {}
+        for i, ( intf, changed ) in enumerate( zip( intfs, paramsList ) ):
+            current = ( intf.tcApplied[ 0 ] if intf.tcApplied
+                        else intf.params )
+            params = { key: changed.get( key, current.get( key, default ) )
+                       for key, default in cls.tcDefaults.iteritems() }
+            cmds, parent, _stuff = intf.tcCmds( **params )
+            tree = intf.qdiscTree( cmds )
+            changes = intf.changeCmds( cmds, tree )
+            if changes is None:
+                rebuild.append( ( i, params ) )
+                continue
+            plans[ i ] = ( params, tree, parent if cmds else None )
+            batch = batches.setdefault( intf.node, [] )
+            batch.extend( ( i, cmd ) for cmd in changes )
+        for node, cmds in batches.iteritems():
+            debug( '*** %s update: %s\n' % ( node, cmds ) )
+            outputs = node.tcShell().run( [ cmd for _i, cmd in cmds ] )
+            for ( i, _cmd ), output in zip( cmds, outputs ):
+                results[ i ] = results[ i ] or dict( tcoutputs=[] )
+                results[ i ][ 'tcoutputs' ].append( output )
+        for i, ( params, tree, parent ) in plans.iteritems():
+            intf, result = intfs[ i ], results[ i ] or dict( tcoutputs=[] )
+            if any( result[ 'tcoutputs' ] ):
+                error( '*** Error: %s update: %s' %
+                       ( intf, ''.join( result[ 'tcoutputs' ] ) ) )
+                rebuild.append( ( i, params ) )
+                continue
+            if parent:
+                result[ 'parent' ] = parent
+            results[ i ] = result
+            intf.tcApplied = ( params, tree, result )
+        if rebuild:
+            indices, params = zip( *rebuild )
+            configs = cls.batchConfig( [ intfs[ i ] for i in indices ],
+                                       params, background=True )
+            for i, result in zip( indices, configs ):
+                results[ i ] = result
+        return results
+
+    def update( self, **params ):
+        """Change some of our tc parameters (bw, delay, loss, etc.),
+           in place where possible (see batchUpdate())
+           returns: result dict, as for batchConfig()"""
+        return self.batchUpdate( [ self ], [ params ] )[ 0 ]
 
 class Link( object ):
 
@@ -381,7 +780,7 @@ class Link( object ):
     def __init__( self, node1, node2, port1=None, port2=None,
                   intfName1=None, intfName2=None, addr1=None, addr2=None,
                   intf=Intf, cls1=None, cls2=None, params1=None,
-                  params2=None, fast=True ):
+                  params2=None, fast=True, premade=None ):
         """Create veth link to another node, making two new interfaces.
            node1: first node
            node2: second node
@@ -392,7 +791,9 @@ def __init__( self, node1, node2, port1=None, port2=None,
            intfName1: node1 interface name (optional)
            intfName2: node2  interface name (optional)
            params1: parameters for interface 1
-           params2: parameters for interface 2"""
+           params2: parameters for interface 2
+           premade: set of veth pairs already made by makeIntfPairs()
+             (see makeIntfPair())"""
         # This is a bit awkward; it seems that having everything in
         # params is more orthogonal, but being able to specify
         # in-line arguments is more convenient! So we support both.
@@ -420,8 +821,11 @@ def __init__( self, node1, node2, port1=None, port2=None,
         if fast:
             params1.setdefault( 'moveIntfFn', self._ignore )
             params2.setdefault( 'moveIntfFn', self._ignore )
+            # Mininet only passes premade to classes which don't override
+            # makeIntfPair(), so overrides needn't accept it
+            extra = { 'premade': premade } if premade is not None else {}
             self.makeIntfPair( intfName1, intfName2, addr1, addr2,
-                               node1, node2, deleteIntfs=False )
+                               node1, node2, deleteIntfs=False, **extra )
         else:
             self.makeIntfPair( intfName1, intfName2, addr1, addr2 )
 
@@ -437,6 +841,8 @@ def __init__( self, node1, node2, port1=None, port2=None,
 
         # All we are is dust in the wind, and our two interfaces
         self.intf1, self.intf2 = intf1, intf2
+        # Functions to call as fn( link, status ) on setStatus()
+        self.statusCallbacks = []
     # pylint: enable=too-many-branches
 
     @staticmethod
@@ -452,7 +858,8 @@ def intfName( self, node, n ):
 
     @classmethod
     def makeIntfPair( cls, intfname1, intfname2, addr1=None, addr2=None,
-                      node1=None, node2=None, deleteIntfs=True ):
+                      node1=None, node2=None, deleteIntfs=True,
+                      premade=None ):
         """Create pair of interfaces
            intfname1: name for interface 1
            intfname2: name for interface 2
@@ -460,12 +867,13 @@ def makeIntfPair( cls, intfname1, intfname2, addr1=None, addr2=None,
            addr2: MAC address for interface 2 (optional)
            node1: home node for interface 1 (optional)
            node2: home node for interface 2 (optional)
+           premade: pairs made by makeIntfPairs() (optional)
            (override this method [and possibly delete()]
            to change link type)"""
         # Leave this as a class method for now
         assert cls
         return makeIntfPair( intfname1, intfname2, addr1, addr2, node1, node2,
-                             deleteIntfs=deleteIntfs )
+                             deleteIntfs=deleteIntfs, premade=premade )
 
     def delete( self ):
         "Delete this link"
@@ -482,6 +890,21 @@ def status( self ):
         "Return link status as a string"
         return "(%s %s)" % ( self.intf1.status(), self.intf2.status() )
 
+    def stats( self ):
+        """Return counters for both interfaces
+           returns: ( intf1 counters, intf2 counters ) as dicts"""
+        return ( self.intf1.stats(), self.intf2.stats() )
+
+    def setStatus( self, status ):
+        """Bring both interfaces up or down
+           status: string {up, down}
+           returns: ifconfig output for intf1, intf2"""
+        results = ( self.intf1.ifconfig( status ),
+                    self.intf2.ifconfig( status ) )
+        for callback in self.statusCallbacks:
+            callback( self, status )
+        return results
+
     def __str__( self ):
         return '%s<->%s' % ( self.intf1, self.intf2 )
 
@@ -489,6 +912,10 @@ def __str__( self ):
 class OVSIntf( Intf ):
     "Patch interface on an OVSSwitch"
 
+    def netlink( self ):
+        "OVS patch ports aren't kernel devices, so we can't use netlink"
+        return None
+
     def ifconfig( self, *args ):
         cmd = ' '.join( args )
         if cmd == 'up':
@@ -524,11 +951,20 @@ class TCLink( Link ):
     "Link with symmetric TC interfaces configured via opts"
     def __init__( self, node1, node2, port1=None, port2=None,
                   intfName1=None, intfName2=None,
-                  addr1=None, addr2=None, **params ):
+                  addr1=None, addr2=None, fast=True, premade=None,
+                  **params ):
         Link.__init__( self, node1, node2, port1=port1, port2=port2,
                        intfName1=intfName1, intfName2=intfName2,
                        cls1=TCIntf,
                        cls2=TCIntf,
                        addr1=addr1, addr2=addr2,
                        params1=params,
-                       params2=params )
+                       params2=params,
+                       fast=fast, premade=premade )
+
+    def update( self, **params ):
+        """Change tc parameters (bw, delay, loss, etc.) of both of our
+           interfaces, in place where possible (see TCIntf.update())
+           returns: result dicts for intf1 and intf2"""
+        return tuple( TCIntf.batchUpdate( [ self.intf1, self.intf2 ],
+                                          [ params, params ] ) )
@@ -92,19 +92,29 @@
 import signal
 import random
 
-from time import sleep
-from itertools import chain, groupby
+from time import sleep, time
+from collections import OrderedDict
+from itertools import chain, groupby, izip
 from math import ceil
+from multiprocessing.pool import ThreadPool
 
 from mininet.cli import CLI
 from mininet.log import info, error, debug, output, warn
 from mininet.node import ( Node, Host, OVSKernelSwitch, DefaultController,
                            Controller )
 from mininet.nodelib import NAT
-from mininet.link import Link, Intf
+from mininet.link import Link, Intf, TCIntf
+from mininet.netlink import RtNetlink
+from mininet.reach import reachMatrix, ReachCache
+from mininet.delay import measureDelays
+from mininet.stats import IntfSampler, QdiscSampler, CgroupSampler
+from mininet.timing import timed
+from mininet.trace import TraceScheduler
+from mininet.traffic import ( makePairs, runFlows, formatFlows,
+                              makeSchedule, runSchedule, formatRecords )
 from mininet.util import ( quietRun, fixLimits, numCores, ensureRoot,
                            macColonHex, ipStr, ipParse, netParse, ipAdd,
-                           waitListening )
+                           waitListening, makeIntfPairs )
 from mininet.term import cleanUpScreens, makeTerms
 from mininet.clean import cleanup
 
@@ -119,7 +129,7 @@ def __init__( self, topo=None, switch=OVSKernelSwitch, host=Host,
                   build=True, xterms=False, cleanup=False, ipBase='10.0.0.0/8',
                   inNamespace=False,
                   autoSetMacs=False, autoStaticArp=False, autoPinCpus=False,
-                  listenPort=None, waitConnected=False ):
+                  listenPort=None, waitConnected=False, workers=None ):
         """Create Mininet object.
            topo: Topo (topology) object or None
            switch: default Switch class
@@ -136,7 +146,9 @@ def __init__( self, topo=None, switch=OVSKernelSwitch, host=Host,
            autoStaticArp: set all-pairs static MAC addrs?
            autoPinCpus: pin hosts to (real) cores (requires CPULimitedHost)?
            listenPort: base listening port to open; will be incremented for
-               each additional switch in the net if inNamespace=False"""
+               each additional switch in the net if inNamespace=False
+           workers: number of threads for configuring hosts and links
+               concurrently (default: one per core, up to 16)"""
         self.topo = topo
         self.switch = switch
         self.host = host
@@ -156,6 +168,8 @@ def __init__( self, topo=None, switch=OVSKernelSwitch, host=Host,
         self.nextCore = 0  # next core for pinning hosts to CPUs
         self.listenPort = listenPort
         self.waitConn = waitConnected
+        self.workers = ( workers if workers is not None
+                         else min( self.numCores, 16 ) )
 
         self.hosts = []
         self.switches = []
@@ -163,6 +177,11 @@ def __init__( self, topo=None, switch=OVSKernelSwitch, host=Host,
         self.links = []
 
         self.nameToNode = {}  # name to Node (Host/Switch) objects
+        self.reachCache = ReachCache( self )  # for verifyReachability()
+        self.sampler = None  # IntfSampler for linkStats()
+        self.qdiscSampler = None  # QdiscSampler for qdisc telemetry
+        self.cgroupSampler = None  # CgroupSampler for host CPU use
+        self.traceScheduler = None  # TraceScheduler for TraceLinks
 
         self.terms = []  # list of spawned xterm processes
 
@@ -172,6 +191,7 @@ def __init__( self, topo=None, switch=OVSKernelSwitch, host=Host,
         if topo and build:
             self.build()
 
+    @timed( 'Mininet.waitConnected' )
     def waitConnected( self, timeout=None, delay=.5 ):
         """wait for each switch to connect to a controller,
            up to 5 seconds
@@ -202,6 +222,7 @@ def waitConnected( self, timeout=None, delay=.5 ):
                 remaining.remove( switch )
         return not remaining
 
+    @timed( 'Mininet.addHost' )
     def addHost( self, name, cls=None, **params ):
         """Add host.
            name: name of host to add
@@ -227,6 +248,7 @@ def addHost( self, name, cls=None, **params ):
         self.nameToNode[ name ] = h
         return h
 
+    @timed( 'Mininet.addSwitch' )
     def addSwitch( self, name, cls=None, **params ):
         """Add switch.
            name: name of switch to add
@@ -339,6 +361,7 @@ def randMac():
         return macColonHex( random.randint(1, 2**48 - 1) & 0xfeffffffffff |
                             0x020000000000 )
 
+    @timed( 'Mininet.addLink' )
     def addLink( self, node1, node2, port1=None, port2=None,
                  cls=None, **params ):
         """"Add a link from node1 to node2
@@ -364,12 +387,113 @@ def addLink( self, node1, node2, port1=None, port2=None,
         cls = self.link if cls is None else cls
         link = cls( node1, node2, **options )
         self.links.append( link )
+        if hasattr( link, 'statusCallbacks' ):
+            link.statusCallbacks.append( self.linkStatusChanged )
+        self.reachCache.linkChanged( link )
         return link
 
+    def makeIntfPairs( self, linksParams ):
+        """Create the veth pairs for many links at once, rather than
+           one (or more) ip processes per link in addLink()
+           linksParams: list of addLink() parameter dicts; we fill in
+             default MAC addresses so that addLink() will use them, and
+             premade for the links whose pairs we create
+           returns: ( pairs we tried to create, premade set of
+             ( intf1, intf2 ) that addLink() hasn't used yet )"""
+        pairs, pairParams = [], []
+        for params in linksParams:
+            params.setdefault( 'addr1', self.randMac() )
+            params.setdefault( 'addr2', self.randMac() )
+            cls = params.get( 'cls', self.link )
+            port1, port2 = params.get( 'port1' ), params.get( 'port2' )
+            # Only plain veth pairs with known names can be made in bulk
+            if ( not self.isVethLink( cls ) or port1 is None or
+                 port2 is None or not params.get( 'fast', True ) ):
+                continue
+            node1, node2 = self[ params[ 'node1' ] ], self[ params[ 'node2' ] ]
+            pairs.append( (
+                params.get( 'intfName1' ) or '%s-eth%s' % ( node1, port1 ),
+                params.get( 'intfName2' ) or '%s-eth%s' % ( node2, port2 ),
+                params[ 'addr1' ], params[ 'addr2' ], node1, node2 ) )
+            pairParams.append( params )
+        premade = set()
+        failed = set( makeIntfPairs( pairs, premade ) )
+        for pair, params in zip( pairs, pairParams ):
+            if pair not in failed:
+                params[ 'premade' ] = premade
+        return pairs, premade
+
+    @staticmethod
+    def deleteIntfPairs( pairs, premade ):
+        """Delete veth pairs that makeIntfPairs() created but addLink()
+           didn't use, e.g. because an earlier link failed
+           pairs, premade: as returned by makeIntfPairs()"""
+        for pair in pairs:
+            intf1, intf2, node1 = pair[ 0 ], pair[ 1 ], pair[ 4 ]
+            if ( intf1, intf2 ) in premade:
+                node1.cmd( 'ip link del ' + intf1 )
+        premade.clear()
+
+    @staticmethod
+    def isVethLink( cls ):
+        "Does link class cls make plain veth pairs named node-ethN?"
+        # Look through custom() link classes
+        cls = getattr( cls, 'func', cls )
+        if not ( isinstance( cls, type ) and issubclass( cls, Link ) ):
+            return False
+        return all( getattr( getattr( cls, name ), '__func__', None ) is
+                    getattr( Link, name ).__func__
+                    for name in ( 'makeIntfPair', 'intfName' ) )
+
+    def parallelMap( self, fn, items ):
+        """Call fn on each item, using up to self.workers threads
+           fn: function to call
+           items: list of arguments
+           returns: iterator over results, in the order of items"""
+        if self.workers <= 1 or len( items ) <= 1:
+            for item in items:
+                yield fn( item )
+            return
+        pool = ThreadPool( min( self.workers, len( items ) ) )
+        try:
+            for result in pool.imap( fn, items ):
+                yield result
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def addLinks( self, linksParams ):
+        """Add many links, concurrently where they share no nodes.
+           Links are still added to self.links in the given order.
+           linksParams: list of addLink() parameter dicts
+           returns: list of links, in order"""
+        if self.workers <= 1:
+            return [ self.addLink( **params ) for params in linksParams ]
+        # Schedule each link in the first round after any earlier
+        # links on either of its nodes
+        rounds, lastRound = [], {}
+        for i, params in enumerate( linksParams ):
+            ends = str( params[ 'node1' ] ), str( params[ 'node2' ] )
+            r = max( lastRound.get( end, -1 ) for end in ends ) + 1
+            lastRound.update( dict.fromkeys( ends, r ) )
+            if r == len( rounds ):
+                rounds.append( [] )
+            rounds[ r ].append( i )
+        start = len( self.links )
+        links = [ None ] * len( linksParams )
+        for indices in rounds:
+            results = self.parallelMap(
+                lambda i: self.addLink( **linksParams[ i ] ), indices )
+            for i, link in zip( indices, results ):
+                links[ i ] = link
+        self.links[ start: ] = links
+        return links
+
+    @timed( 'Mininet.configHosts' )
     def configHosts( self ):
-        "Configure a set of hosts."
-        for host in self.hosts:
-            info( host.name + ' ' )
+        "Configure a set of hosts (concurrently if self.workers > 1)."
+        def config( host ):
+            "Configure a single host"
             intf = host.defaultIntf()
             if intf:
                 host.configDefault()
@@ -382,8 +506,33 @@ def configHosts( self ):
             # quietRun( 'renice +18 -p ' + repr( host.pid ) )
             # This may not be the right place to do this, but
             # it needs to be done somewhere.
+        # Log hosts in order as they are configured
+        for host, _result in izip( self.hosts,
+                                   self.parallelMap( config, self.hosts ) ):
+            info( host.name + ' ' )
         info( '\n' )
 
+    def waitStarted( self, nodes=None ):
+        """Wait for node shells to start up. Nodes start their shells
+           without waiting, so we can wait for all of them at once.
+           nodes: nodes to wait for (default: all nodes)"""
+        if nodes is None:
+            nodes = self.controllers + self.switches + self.hosts
+        poller = select.poll()
+        starting = {}
+        for node in nodes:
+            if not node.waitStarted( block=False ):
+                fd = node.stdout.fileno()
+                starting[ fd ] = node
+                poller.register( fd, select.POLLIN )
+        while starting:
+            for fd, _event in poller.poll():
+                node = starting[ fd ]
+                if node.waitStarted( block=False ):
+                    poller.unregister( fd )
+                    del starting[ fd ]
+
+    @timed( 'Mininet.buildFromTopo' )
     def buildFromTopo( self, topo=None ):
         """Build mininet from a topology object
            At the end of this function, everything should be connected
@@ -424,10 +573,23 @@ def buildFromTopo( self, topo=None ):
             self.addSwitch( switchName, **params )
             info( switchName + ' ' )
 
+        # Let node shells start concurrently before we need them
+        self.waitStarted()
+
         info( '\n*** Adding links:\n' )
-        for srcName, dstName, params in topo.links(
-                sort=True, withInfo=True ):
-            self.addLink( **params )
+        links = [ ( srcName, dstName, dict( params ) )
+                  for srcName, dstName, params in topo.links(
+                          sort=True, withInfo=True ) ]
+        linksParams = [ params for _src, _dst, params in links ]
+        pairs, premade = self.makeIntfPairs( linksParams )
+        # Set up all TCIntf qdiscs with one tc process per namespace
+        TCIntf.queueConfigs()
+        try:
+            self.addLinks( linksParams )
+        finally:
+            TCIntf.runQueuedConfigs()
+            self.deleteIntfPairs( pairs, premade )
+        for srcName, dstName, _params in links:
             info( '(%s, %s) ' % ( srcName, dstName ) )
 
         info( '\n' )
@@ -437,6 +599,7 @@ def configureControlNetwork( self ):
         raise Exception( 'configureControlNetwork: '
                          'should be overriden in subclass', self )
 
+    @timed( 'Mininet.build' )
     def build( self ):
         "Build mininet."
         if self.topo:
@@ -468,13 +631,49 @@ def stopXterms( self ):
             os.kill( term.pid, signal.SIGKILL )
         cleanUpScreens()
 
-    def staticArp( self ):
-        "Add all-pairs ARP entries to remove the need to handle broadcast."
-        for src in self.hosts:
-            for dst in self.hosts:
-                if src != dst:
-                    src.setARP( ip=dst.IP(), mac=dst.MAC() )
-
+    def staticArp( self, shared=False ):
+        """Add all-pairs ARP entries to remove the need to handle broadcast.
+           Each host's table is loaded in one go, rather than one
+           arp -s per entry.
+           shared: hosts share one subnet, so build a single table and
+             load it into every host's default interface (each host
+             also gets a harmless entry for itself)"""
+        hosts = [ h for h in self.hosts if h.IP() and h.MAC() ]
+        neighs = [ ( h.IP(), h.MAC() ) for h in hosts ]
+
+        def setARPs( src, table, **kwargs ):
+            "Load table into src, reporting any entries which failed"
+            output = src.setARPs( table, **kwargs )
+            if output:
+                error( '*** staticArp: %s: %s' % ( src, output ) )
+
+        if shared:
+            packed = RtNetlink.packNeighs( neighs )
+            for src in hosts:
+                setARPs( src, neighs, packed=packed )
+            return
+        for src in hosts:
+            intfs = [ i for i in src.intfList() if i.IP() ]
+            # Use the interface on each destination's subnet, falling
+            # back to the default interface as arp -s would
+            tables = {}
+            for dst, neigh in zip( hosts, neighs ):
+                if dst is src:
+                    continue
+                intf = src.defaultIntf()
+                if len( intfs ) > 1:
+                    ipnum = ipParse( neigh[ 0 ] )
+                    for i in intfs:
+                        prefixLen = int( i.prefixLen or 32 )
+                        if ( ipnum ^ ipParse( i.IP() ) ) >> (
+                                32 - prefixLen ) == 0:
+                            intf = i
+                            break
+                tables.setdefault( intf, [] ).append( neigh )
+            for intf, table in tables.iteritems():
+                setARPs( src, table, intf=intf )
+
+    @timed( 'Mininet.start' )
     def start( self ):
         "Start controller and switches."
         if not self.built:
@@ -499,8 +698,15 @@ def start( self ):
         if self.waitConn:
             self.waitConnected()
 
-    def stop( self ):
-        "Stop the controller(s), switches and hosts"
+    @timed( 'Mininet.stop' )
+    def stop( self, cleanAll=False ):
+        """Stop the controller(s), switches and hosts that we created.
+           cleanAll: also run mn -c style global cleanup, which kills
+             *every* Mininet network on this machine"""
+        self.stopTraces()
+        self.stopStats()
+        self.stopQdiscStats()
+        self.stopCgroupStats()
         info( '*** Stopping %i controllers\n' % len( self.controllers ) )
         for controller in self.controllers:
             info( controller.name + ' ' )
@@ -510,9 +716,15 @@ def stop( self ):
             info( '*** Stopping %i terms\n' % len( self.terms ) )
             self.stopXterms()
         info( '*** Stopping %i links\n' % len( self.links ) )
+        # Deleting veths one at a time is slow (~10ms each), but the
+        # kernel deletes them en masse when their namespaces go away
+        deferred = []
         for link in self.links:
             info( '.' )
-            link.stop()
+            if self.diesWithNamespace( link ):
+                deferred.append( link )
+            else:
+                link.stop()
         info( '\n' )
         info( '*** Stopping %i switches\n' % len( self.switches ) )
         stopped = {}
@@ -526,16 +738,95 @@ def stop( self ):
             info( switch.name + ' ' )
             if switch not in stopped:
                 switch.stop()
-            switch.terminate()
+        self.terminateNodes( self.switches )
         info( '\n' )
         info( '*** Stopping %i hosts\n' % len( self.hosts ) )
         for host in self.hosts:
             info( host.name + ' ' )
-            host.terminate()
-        info( '*** Clean all interfaces\n')
-        cleanup()
+        self.terminateNodes( self.hosts )
+        self.waitLinksGone( deferred )
+        if cleanAll:
+            info( '\n*** Clean all interfaces\n')
+            cleanup()
         info( '\n*** Done\n' )
 
+    @staticmethod
+    def diesWithNamespace( link ):
+        "Is link a plain veth pair which is deleted with its namespace?"
+        cls = type( link )
+        if not ( Mininet.isVethLink( cls ) and
+                 cls.stop.__func__ is Link.stop.__func__ and
+                 cls.delete.__func__ is Link.delete.__func__ ):
+            return False
+        return any( intf.node.inNamespace and
+                    type( intf ).delete.__func__ is Intf.delete.__func__
+                    for intf in ( link.intf1, link.intf2 ) )
+
+    @staticmethod
+    def waitLinksGone( links, timeout=5 ):
+        """Wait for links to be deleted along with their namespaces, and
+           delete any which remain (e.g. if a process keeps its
+           namespace alive)
+           links: links to wait for
+           timeout: seconds to wait before deleting links"""
+        # Interfaces in the root namespace; the rest go away for sure
+        rootIntfs = { intf.name: link for link in links
+                      for intf in ( link.intf1, link.intf2 )
+                      if not intf.node.inNamespace }
+        if not rootIntfs:
+            return
+        try:
+            nl = RtNetlink()
+        except ( OSError, IOError, AttributeError ):
+            nl = None
+        deadline = time() + timeout
+        while nl and time() < deadline:
+            names = set( entry[ 'name' ] for entry in nl.links() )
+            rootIntfs = { name: link for name, link in rootIntfs.iteritems()
+                          if name in names }
+            if not rootIntfs:
+                break
+            sleep( .01 )
+        if nl:
+            nl.close()
+        for link in set( rootIntfs.values() ):
+            link.stop()
+
+    @staticmethod
+    def terminateNodes( nodes, timeout=5 ):
+        """Terminate nodes, then wait for all of their shells to exit,
+           so that their namespaces and interfaces are gone when we
+           return. Node classes with a batchTerminate() class method
+           terminate all of their nodes at once.
+           nodes: nodes to terminate
+           timeout: seconds to wait before killing shells"""
+        shells = [ node.shell for node in nodes if node.shell ]
+        batches = {}
+        for node in nodes:
+            if hasattr( type( node ), 'batchTerminate' ):
+                batches.setdefault( type( node ), [] ).append( node )
+            else:
+                # This only sends SIGHUP, so it doesn't wait for the shell
+                node.terminate()
+        for cls, batch in batches.iteritems():
+            cls.batchTerminate( batch )
+        deadline = time() + timeout
+        while True:
+            shells = [ shell for shell in shells if shell.poll() is None ]
+            if not shells:
+                break
+            if time() > deadline:
+                warn( '*** Killing %d shells which did not exit\n' %
+                      len( shells ) )
+                for shell in shells:
+                    try:
+                        os.killpg( shell.pid, signal.SIGKILL )
+                    except OSError:
+                        pass
+                    shell.wait()
+                break
+            sleep( .01 )
+
     def run( self, test, *args, **kwargs ):
         "Perform a complete start/test/stop cycle."
         self.start()
@@ -568,6 +859,65 @@ def monitor( self, hosts=None, timeoutms=-1 ):
             if not ready and timeoutms >= 0:
                 yield None, None
 
+    def gather( self, cmd, nodes=None, maxActive=256, timeoutms=None ):
+        """Run a command on many nodes concurrently, multiplexing their
+           shells with poll(), and return the outputs. This takes about
+           as long as the slowest node rather than the sum of all nodes.
+           cmd: command string, or function of node returning a command
+           nodes: nodes to run command on (default: all hosts)
+           maxActive: maximum number of commands running at once
+           timeoutms: overall timeout in ms, or None to wait indefinitely
+           returns: OrderedDict of node to output, in the order of
+                    nodes; commands which time out are interrupted and
+                    return their partial output, and commands which
+                    never started return ''"""
+        if nodes is None:
+            nodes = self.hosts
+        pending = list( reversed( nodes ) )
+        poller = select.poll()
+        active = {}  # fds of running nodes
+        outputs = OrderedDict( ( node, [] ) for node in nodes )
+        deadline = None if timeoutms is None else time() + timeoutms / 1000.0
+        while pending or active:
+            # Keep up to maxActive commands in flight
+            while pending and len( active ) < maxActive:
+                node = pending.pop()
+                node.sendCmd( cmd( node ) if callable( cmd ) else cmd )
+                fd = node.stdout.fileno()
+                active[ fd ] = node
+                poller.register( fd, select.POLLIN )
+            if deadline is None:
+                ready = poller.poll()
+            else:
+                remaining = deadline - time()
+                if remaining <= 0:
+                    break
+                ready = poller.poll( remaining * 1000 )
+            for fd, event in ready:
+                node = active[ fd ]
+                if event & select.POLLIN:
+                    outputs[ node ].append( node.monitor() )
+                else:
+                    # Output closed: read EOF, if there is one
+                    try:
+                        outputs[ node ].append( node.monitor() )
+                    except ( OSError, IOError ):
+                        # Shell has exited
+                        warn( '*** gather: %s exited\n' % node )
+                        node.waiting = False
+                if not node.waiting:
+                    poller.unregister( fd )
+                    del active[ fd ]
+        # Interrupt anything that timed out
+        for node in active.itervalues():
+            warn( '*** gather: timed out waiting for %s\n' % node )
+            node.sendInt()
+            outputs[ node ].append( node.waitOutput() )
+        for node in reversed( pending ):
+            warn( '*** gather: timed out before starting %s\n' % node )
+        return OrderedDict( ( node, ''.join( output ) )
+                            for node, output in outputs.iteritems() )
+
     # XXX These test methods should be moved out of this class.
     # Probably we should create a tests.py for them
 
@@ -586,43 +936,49 @@ def _parsePing( pingOutput ):
         sent, received = int( m.group( 1 ) ), int( m.group( 2 ) )
         return sent, received
 
+    def pingMatrix( self, hosts=None, timeout=None, count=1, rate=None ):
+        """Probe reachability between all pairs of hosts concurrently.
+           hosts: list of hosts (self.hosts)
+           timeout: time to wait for a response, in seconds (may be string)
+           count: number of probes per pair
+           rate: max probes per second, or None for no limit
+           returns: ReachMatrix (see mininet.reach)"""
+        if not hosts:
+            hosts = self.hosts
+        opts = { 'count': count, 'rate': rate }
+        if timeout:
+            opts[ 'timeout' ] = float( timeout )
+        matrix = reachMatrix( hosts, **opts )
+        if hosts == self.hosts:
+            # Start verifyReachability() from here
+            self.reachCache.update( matrix )
+        return matrix
+
+    @staticmethod
+    def _outputReach( hosts, matrix ):
+        "Print which hosts each host can reach, as ping() always has"
+        for node in hosts:
+            output( '%s -> ' % node.name )
+            for dest in hosts:
+                if node != dest:
+                    output( ( '%s ' % dest.name )
+                            if matrix.reachable( node, dest ) else 'X ' )
+            output( '\n' )
+
     def ping( self, hosts=None, timeout=None ):
         """Ping between all specified hosts.
            hosts: list of hosts
            timeout: time to wait for a response, as string
            returns: ploss packet loss percentage"""
         # should we check if running?
-        packets = 0
-        lost = 0
-        ploss = None
         if not hosts:
             hosts = self.hosts
             output( '*** Ping: testing ping reachability\n' )
-        for node in hosts:
-            output( '%s -> ' % node.name )
-            for dest in hosts:
-                if node != dest:
-                    opts = ''
-                    if timeout:
-                        opts = '-W %s' % timeout
-                    if dest.intfs:
-                        result = node.cmd( 'ping -c1 %s %s' %
-                                           (opts, dest.IP()) )
-                        sent, received = self._parsePing( result )
-                    else:
-                        sent, received = 0, 0
-                    packets += sent
-                    if received > sent:
-                        error( '*** Error: received too many packets' )
-                        error( '%s' % result )
-                        node.cmdPrint( 'route' )
-                        exit( 1 )
-                    lost += sent - received
-                    output( ( '%s ' % dest.name ) if received else 'X ' )
-            output( '\n' )
+        matrix = self.pingMatrix( hosts, timeout )
+        self._outputReach( hosts, matrix )
+        packets, received = matrix.totals()
         if packets > 0:
-            ploss = 100.0 * lost / packets
-            received = packets - lost
+            ploss = 100.0 * ( packets - received ) / packets
             output( "*** Results: %i%% dropped (%d/%d received)\n" %
                     ( ploss, received, packets ) )
         else:
@@ -668,23 +1024,13 @@ def pingFull( self, hosts=None, timeout=None ):
            returns: all ping data; see function body."""
         # should we check if running?
         # Each value is a tuple: (src, dsd, [all ping outputs])
-        all_outputs = []
         if not hosts:
             hosts = self.hosts
             output( '*** Ping: testing ping reachability\n' )
-        for node in hosts:
-            output( '%s -> ' % node.name )
-            for dest in hosts:
-                if node != dest:
-                    opts = ''
-                    if timeout:
-                        opts = '-W %s' % timeout
-                    result = node.cmd( 'ping -c1 %s %s' % (opts, dest.IP()) )
-                    outputs = self._parsePingFull( result )
-                    sent, received, rttmin, rttavg, rttmax, rttdev = outputs
-                    all_outputs.append( (node, dest, outputs) )
-                    output( ( '%s ' % dest.name ) if received else 'X ' )
-            output( '\n' )
+        matrix = self.pingMatrix( hosts, timeout )
+        all_outputs = [ ( node, dest, matrix.stats( node, dest ) )
+                        for node, dest in matrix.pairs() ]
+        self._outputReach( hosts, matrix )
         output( "*** Results: \n" )
         for outputs in all_outputs:
             src, dest, ping_outputs = outputs
@@ -777,6 +1123,178 @@ def iperf( self, hosts=None, l4Type='TCP', udpBw='10M', fmt=None,
         output( '*** Results: %s\n' % result )
         return result
 
+    def oneWayDelay( self, pairs=None, rate=100, duration=5, **kwargs ):
+        """Measure one-way delay in each direction between hosts.
+           pairs: list of (src, dst); default: first two hosts, both ways
+           rate: probes per second for each pair
+           duration: seconds to send probes for
+           kwargs: options for delay.measureDelays()
+           returns: list of DelayStats (see mininet.delay)"""
+        if not pairs:
+            h1, h2 = self.hosts[ 0 ], self.hosts[ 1 ]
+            pairs = [ ( h1, h2 ), ( h2, h1 ) ]
+        output( '*** Delay: probing %d pairs at %s/s for %ss\n' %
+                ( len( pairs ), rate, duration ) )
+        results = measureDelays( pairs, rate=rate, duration=duration,
+                                 **kwargs )
+        for stats in results:
+            output( ' %s\n' % stats )
+        return results
+
+    def linkIntfs( self ):
+        "Return the interfaces of all of our links"
+        return [ intf for link in self.links
+                 for intf in ( link.intf1, link.intf2 ) ]
+
+    def startStats( self, interval=1.0, samples=600 ):
+        """Start sampling the counters of all link interfaces
+           interval: seconds between samples
+           samples: number of samples to keep
+           returns: IntfSampler (see mininet.stats)"""
+        self.stopStats()
+        self.sampler = IntfSampler( self.linkIntfs(), interval=interval,
+                                    samples=samples )
+        self.sampler.start()
+        return self.sampler
+
+    def stopStats( self ):
+        "Stop sampling link counters"
+        if self.sampler:
+            self.sampler.stop()
+            self.sampler = None
+
+    def startQdiscStats( self, interval=.01 ):
+        """Start recording backlog, drops and marks of the qdiscs on
+           every TCIntf
+           interval: seconds between samples
+           returns: QdiscSampler (see mininet.stats), which keeps
+             recording until stopQdiscStats() or stop()"""
+        self.stopQdiscStats()
+        intfs = [ intf for intf in self.linkIntfs()
+                  if isinstance( intf, TCIntf ) ]
+        self.qdiscSampler = QdiscSampler( intfs, interval=interval )
+        self.qdiscSampler.start()
+        return self.qdiscSampler
+
+    def stopQdiscStats( self ):
+        """Stop recording qdisc statistics
+           returns: QdiscSampler with the recorded time series, or None"""
+        sampler, self.qdiscSampler = self.qdiscSampler, None
+        if sampler:
+            sampler.stop()
+        return sampler
+
+    def startCgroupStats( self, interval=1.0, samples=600 ):
+        """Start sampling CPU use and throttling of hosts in cgroups
+           (e.g. CPULimitedHost)
+           interval: seconds between samples
+           samples: number of samples to keep
+           returns: CgroupSampler (see mininet.stats)"""
+        self.stopCgroupStats()
+        self.cgroupSampler = CgroupSampler( self.hosts, interval=interval,
+                                            samples=samples )
+        self.cgroupSampler.start()
+        return self.cgroupSampler
+
+    def stopCgroupStats( self ):
+        """Stop sampling cgroup counters, warning about any hosts
+           that were CPU-starved in the last interval"""
+        sampler, self.cgroupSampler = self.cgroupSampler, None
+        if sampler:
+            sampler.stop()
+            starved = sampler.starved()
+            if starved:
+                warn( '*** Warning: hosts %s were CPU-starved; results '
+                      'may reflect CPU limits rather than the network\n' %
+                      ' '.join( str( h ) for h in starved ) )
+
+    def startTraces( self, tolerance=.001 ):
+        """Start replaying the traces of every TraceLink, from one
+           thread for all of them
+           tolerance: seconds late a change may be without counting
+             as late
+           returns: TraceScheduler (see mininet.trace), which runs
+             until its traces end, or until stopTraces() or stop()"""
+        self.stopTraces()
+        self.traceScheduler = TraceScheduler( tolerance=tolerance )
+        for link in self.links:
+            trace = getattr( link, 'trace', None )
+            if trace:
+                self.traceScheduler.add( link, trace, loop=link.loop )
+        self.traceScheduler.start()
+        return self.traceScheduler
+
+    def stopTraces( self ):
+        """Stop replaying traces
+           returns: TraceScheduler, with its stats(), or None"""
+        scheduler, self.traceScheduler = self.traceScheduler, None
+        if scheduler:
+            scheduler.stop()
+        return scheduler
+
+    def linkStats( self, rates=False, interval=1.0 ):
+        """Return counters, or rates, for every link, reading each
+           namespace once rather than each interface.
+           rates: return per-second rates rather than counters
+           interval: if we haven't called startStats(), seconds to
+             measure rates over
+           returns: { link: ( intf1 stats, intf2 stats ) }, where
+             stats are dicts (rxBytes, txPackets, rxDropped...)"""
+        sampler = self.sampler
+        if not sampler or sampler.count < 1 + rates:
+            # Take a sample (or two) now
+            sampler = IntfSampler( self.linkIntfs(), samples=2 )
+            sampler.sample()
+            if rates:
+                sleep( interval )
+                sampler.sample()
+            sampler.stop()
+        if rates:
+            stats = sampler.rates()
+        else:
+            stats = { intf: sampler.latest( intf )
+                      for intf in sampler.intfs }
+        return { link: ( stats.get( link.intf1 ), stats.get( link.intf2 ) )
+                 for link in self.links }
+
+    def trafficMatrix( self, pattern='permutation', hosts=None,
+                       patternParams=None, **kwargs ):
+        """Run flows between many pairs of hosts at once.
+           pattern: 'all', 'permutation', 'incast', 'stride', an n x n
+             matrix of flow counts, or a list of (src, dst) pairs
+           hosts: list of hosts (self.hosts)
+           patternParams: dict of params for pattern (e.g. seed, step)
+           kwargs: options for traffic.runFlows() (tool, seconds...)
+           returns: list of FlowResult (see mininet.traffic)"""
+        hosts = hosts or self.hosts
+        pairs = makePairs( hosts, pattern, **( patternParams or {} ) )
+        output( '*** Traffic: running %d flows among %d hosts\n' %
+                ( len( pairs ), len( hosts ) ) )
+        results = runFlows( pairs, **kwargs )
+        output( formatFlows( results ) )
+        return results
+
+    def runWorkload( self, duration=10, hosts=None, cdf='websearch',
+                     rate=None, load=None, bw=None, seed=0, **kwargs ):
+        """Run flows with random sizes and Poisson arrivals among hosts,
+           and measure their completion times.
+           duration: seconds of flow arrivals
+           hosts: list of hosts (self.hosts)
+           cdf: 'websearch', 'datamining' or list of (size, probability)
+           rate: new flows/second per host, or
+           load, bw: fraction of each host's bandwidth (Mb/s) to use
+           seed: random seed for the schedule
+           kwargs: options for traffic.runSchedule()
+           returns: list of FlowRecord (see mininet.traffic)"""
+        hosts = hosts or self.hosts
+        flows = makeSchedule( hosts, duration, rate=rate, load=load, bw=bw,
+                              cdf=cdf, seed=seed )
+        output( '*** Workload: running %d flows among %d hosts\n' %
+                ( len( flows ), len( hosts ) ) )
+        records = runSchedule( flows, **kwargs )
+        output( formatRecords( records ) )
+        return records
+
     def runCpuLimitTest( self, cpu, duration=5 ):
         """run CPU limit test with 'while true' processes.
         cpu: desired CPU fraction of each host
@@ -796,30 +1314,22 @@ def runCpuLimitTest( self, cpu, duration=5 ):
             for _core in range( num_procs ):
                 h.cmd( 'while true; do a=1; done &' )
                 pids[ h ].append( h.cmd( 'echo $!' ).strip() )
-        outputs = {}
-        time = {}
-        # get the initial cpu time for each host
-        for host in hosts:
-            outputs[ host ] = []
-            with open( '/sys/fs/cgroup/cpuacct/%s/cpuacct.usage' %
-                       host, 'r' ) as f:
-                time[ host ] = float( f.read() )
+        # Sample each host's cgroup counters once a second
+        sampler = CgroupSampler( hosts, samples=duration + 1 )
+        sampler.sample()
         for _ in range( duration ):
             sleep( 1 )
-            for host in hosts:
-                with open( '/sys/fs/cgroup/cpuacct/%s/cpuacct.usage' %
-                           host, 'r' ) as f:
-                    readTime = float( f.read() )
-                outputs[ host ].append( ( ( readTime - time[ host ] )
-                                        / 1000000000 ) / cores * 100 )
-                time[ host ] = readTime
+            sampler.sample()
         for h, pids in pids.items():
             for pid in pids:
                 h.cmd( 'kill -9 %s' % pid )
         cpu_fractions = []
-        for _host, outputs in outputs.items():
-            for pct in outputs:
-                cpu_fractions.append( pct )
+        for host in sampler.nodes:
+            usage = sampler.history( host, 'cpuNs' )
+            for ( t1, ns1 ), ( t2, ns2 ) in zip( usage, usage[ 1: ] ):
+                cpu_fractions.append( ( ns2 - ns1 ) / 1e9 / ( t2 - t1 )
+                                      / cores * 100 )
+        sampler.stop()
         output( '*** Results: %s\n' % cpu_fractions )
         return cpu_fractions
 
@@ -849,6 +1359,45 @@ def configLinkStatus( self, src, dst, status ):
                 result = dstIntf.ifconfig( status )
                 if result:
                     error( 'link dst status change failed: %s\n' % result )
+                if srcIntf.link:
+                    self.linkStatusChanged( srcIntf.link, status )
+
+    def linkStatusChanged( self, link, status ):
+        """Note that link has gone up or down, so that
+           verifyReachability() will re-probe the pairs it affects
+           link: Link
+           status: string {up, down}"""
+        debug( '*** %s is now %s\n' % ( link, status ) )
+        self.reachCache.linkChanged( link )
+
+    def invalidateReachability( self, nodes=None ):
+        """Make verifyReachability() re-probe pairs involving nodes
+           nodes: hosts, or switches whose links may have changed;
+             None for all pairs (e.g. after changing controllers)"""
+        self.reachCache.invalidate( nodes )
+
+    def verifyReachability( self, timeout=None, count=1, rate=None ):
+        """Re-probe only the pairs of hosts which may have been affected
+           by link status changes since the last verifyReachability()
+           or pingAll(), or all pairs if there are no previous results.
+           Only pairs with shortest paths across a changed link are
+           re-probed, unless reachCache.conservative is set (e.g. for
+           spanning trees), in which case every pair in its connected
+           component is.
+           timeout: time to wait for a response, in seconds
+           count: number of probes per pair
+           rate: max probes per second, or None for no limit
+           returns: ReachMatrix (see mininet.reach) for all hosts"""
+        opts = { 'count': count, 'rate': rate }
+        if timeout:
+            opts[ 'timeout' ] = float( timeout )
+        matrix, probed = self.reachCache.verify( **opts )
+        pairs = matrix.pairs()
+        unreachable = sum( 1 for src, dst in pairs
+                           if not matrix.reachable( src, dst ) )
+        info( '*** Reachability: probed %d of %d pairs, %d unreachable\n' %
+              ( probed, len( pairs ), unreachable ) )
+        return matrix
 
     def interact( self ):
         "Start network and run our simple CLI."
@@ -0,0 +1,508 @@
+"""
+netlink.py: in-process rtnetlink support for Mininet
+
+Configuring interfaces with ifconfig/route costs a fork/exec round trip
+through the node's shell for every operation, plus a regex parse of
+whatever text comes back. For large networks this adds up to tens of
+thousands of processes in Mininet.configHosts().
+
+RtNetlink is a minimal rtnetlink client which talks to the kernel
+directly. A netlink socket is bound to the network namespace in which
+it was created, so we briefly setns() the calling thread into a node's
+namespace (/proc/<pid>/ns/net), open the socket, and switch back. From
+then on, requests on that socket configure the node's namespace without
+any subprocesses.
+
+nsSocket: create any kind of socket inside a network namespace
+
+RtNetlink: link, address, route and neighbor configuration via rtnetlink
+
+Errors are reported by raising OSError with the errno returned by
+the kernel, so that callers can fall back to the shell if necessary.
+"""
+
+import os
+import errno
+import socket
+import struct
+import ctypes
+import ctypes.util
+
+from mininet.log import debug
+
+# Namespace support
+
+CLONE_NEWNET = 0x40000000
+
+def _libc():
+    "Return (cached) handle to the C library"
+    if _libc.lib is None:
+        _libc.lib = ctypes.CDLL( ctypes.util.find_library( 'c' ),
+                                 use_errno=True )
+    return _libc.lib
+
+_libc.lib = None
+
+def setns( fd, nstype=CLONE_NEWNET ):
+    """Move the calling thread into a namespace
+       fd: file descriptor referring to a namespace
+       nstype: namespace type (CLONE_NEWNET)"""
+    if _libc().setns( fd, nstype ) != 0:
+        err = ctypes.get_errno()
+        raise OSError( err, os.strerror( err ) )
+
+def nsSocket( nsPath, family, stype, proto=0 ):
+    """Return a socket which lives in a given network namespace.
+       nsPath: namespace file (e.g. /proc/<pid>/ns/net) or None for ours
+       family, stype, proto: parameters for socket()"""
+    if nsPath is None:
+        return socket.socket( family, stype, proto )
+    # Note that setns() only affects the calling thread, and we
+    # always return to the namespace of the main thread.
+    home = os.open( '/proc/self/ns/net', os.O_RDONLY )
+    try:
+        target = os.open( nsPath, os.O_RDONLY )
+        try:
+            setns( target )
+            try:
+                return socket.socket( family, stype, proto )
+            finally:
+                setns( home )
+        finally:
+            os.close( target )
+    finally:
+        os.close( home )
+
+# Netlink constants (from linux/netlink.h and linux/rtnetlink.h)
+
+NETLINK_ROUTE = 0
+
+NLMSG_ERROR, NLMSG_DONE = 2, 3
+
+NLM_F_REQUEST = 0x1
+NLM_F_ACK = 0x4
+NLM_F_DUMP = 0x300
+NLM_F_REPLACE = 0x100
+NLM_F_EXCL = 0x200
+NLM_F_CREATE = 0x400
+
+RTM_NEWLINK, RTM_DELLINK, RTM_GETLINK = 16, 17, 18
+RTM_NEWADDR, RTM_DELADDR, RTM_GETADDR = 20, 21, 22
+RTM_NEWROUTE, RTM_DELROUTE = 24, 25
+RTM_NEWNEIGH = 28
+RTM_NEWQDISC, RTM_GETQDISC = 36, 38
+
+IFLA_ADDRESS, IFLA_IFNAME, IFLA_MTU, IFLA_STATS64 = 1, 3, 4, 23
+IFLA_GSO_MAX_SIZE = 41
+IFA_ADDRESS, IFA_LOCAL, IFA_BROADCAST = 1, 2, 4
+RTA_DST, RTA_OIF, RTA_GATEWAY = 1, 4, 5
+NDA_DST, NDA_LLADDR = 1, 2
+TCA_KIND, TCA_XSTATS, TCA_STATS2 = 1, 4, 7
+TCA_STATS_BASIC, TCA_STATS_QUEUE = 1, 3
+
+NUD_PERMANENT = 0x80
+
+IFF_UP = 0x1
+
+RT_TABLE_MAIN = 254
+RTPROT_BOOT = 3
+RT_SCOPE_UNIVERSE, RT_SCOPE_LINK = 0, 253
+RTN_UNICAST = 1
+
+# Message headers
+NLMSGHDR = struct.Struct( '=LHHLL' )   # len, type, flags, seq, pid
+RTATTR = struct.Struct( '=HH' )        # len, type
+IFINFOMSG = struct.Struct( '=BxHiII' )  # family, type, index, flags, change
+IFADDRMSG = struct.Struct( '=BBBBi' )  # family, prefixlen, flags, scope, index
+RTMSG = struct.Struct( '=BBBBBBBBI' )  # family, dst_len, src_len, tos,
+                                       # table, protocol, scope, type, flags
+NDMSG = struct.Struct( '=BxxxiHBB' )   # family, index, state, flags, type
+TCMSG = struct.Struct( '=BxxxiIII' )   # family, index, handle, parent, info
+
+# Leading counters of struct rtnl_link_stats64
+LINK_STATS = ( 'rxPackets', 'txPackets', 'rxBytes', 'txBytes',
+               'rxErrors', 'txErrors', 'rxDropped', 'txDropped' )
+LINKSTATS64 = struct.Struct( '=%dQ' % len( LINK_STATS ) )
+
+# Qdisc counters: gnet_stats_basic, gnet_stats_queue, and ECN marks
+# from red's tc_red_xstats (early, pdrop, other, marked)
+QDISC_STATS = ( 'bytes', 'packets', 'qlen', 'backlog', 'drops',
+                'requeues', 'overlimits', 'marks' )
+STATS_BASIC = struct.Struct( '=QI' )   # bytes, packets
+STATS_QUEUE = struct.Struct( '=5I' )   # qlen, backlog, drops, requeues,
+                                       # overlimits
+RED_XSTATS = struct.Struct( '=4I' )
+
+def _align( length ):
+    "Round length up to netlink alignment (4 bytes)"
+    return ( length + 3 ) & ~3
+
+def packAttr( atype, data ):
+    """Return a packed rtattr
+       atype: attribute type
+       data: attribute payload (string)"""
+    length = RTATTR.size + len( data )
+    return ( RTATTR.pack( length, atype ) + data +
+             '\0' * ( _align( length ) - length ) )
+
+def parseAttrs( data, offset=0 ):
+    """Parse a sequence of rtattrs
+       returns: dict of attribute type to payload"""
+    attrs = {}
+    while offset + RTATTR.size <= len( data ):
+        length, atype = RTATTR.unpack_from( data, offset )
+        if length < RTATTR.size:
+            break
+        # Strip NLA_F_NESTED and NLA_F_NET_BYTEORDER
+        attrs[ atype & 0x3fff ] = data[ offset + RTATTR.size:
+                                        offset + length ]
+        offset += _align( length )
+    return attrs
+
+def macToBytes( mac ):
+    "Convert colon-hex MAC address string to packed bytes"
+    return ''.join( chr( int( b, 16 ) ) for b in mac.split( ':' ) )
+
+def bytesToMac( data ):
+    "Convert packed bytes to colon-hex MAC address string"
+    return ':'.join( '%02x' % ord( b ) for b in data )
+
+def prefixMask( prefixLen ):
+    "Return netmask for prefix length as unsigned int"
+    return ( 0xffffffff << ( 32 - int( prefixLen ) ) ) & 0xffffffff
+
+
+class RtNetlink( object ):
+    "Minimal rtnetlink client bound to a network namespace"
+
+    def __init__( self, nsPath=None ):
+        """nsPath: namespace file (e.g. /proc/<pid>/ns/net),
+                   or None for our own namespace"""
+        self.nsPath = nsPath
+        self.sock = nsSocket( nsPath, socket.AF_NETLINK, socket.SOCK_RAW,
+                              NETLINK_ROUTE )
+        self.sock.bind( ( 0, 0 ) )
+        self.seq = 0
+
+    def close( self ):
+        "Close our netlink socket"
+        if self.sock:
+            self.sock.close()
+            self.sock = None
+
+    def fileno( self ):
+        "Return our socket's file descriptor"
+        return self.sock.fileno()
+
+    # Core request/response support
+
+    def request( self, msgtype, body, attrs=(), flags=NLM_F_ACK ):
+        """Send a netlink request and return the responses.
+           msgtype: RTM_* message type
+           body: packed family-specific header
+           attrs: list of packed rtattrs
+           flags: request flags (NLM_F_ACK)
+           returns: list of ( msgtype, payload ) responses
+           raises OSError on error"""
+        self.seq += 1
+        payload = body + ''.join( attrs )
+        msg = NLMSGHDR.pack( NLMSGHDR.size + len( payload ), msgtype,
+                             NLM_F_REQUEST | flags, self.seq, 0 ) + payload
+        self.sock.send( msg )
+        responses = []
+        while True:
+            data = self.sock.recv( 65536 )
+            offset = 0
+            while offset + NLMSGHDR.size <= len( data ):
+                length, rtype, _flags, seq, _pid = NLMSGHDR.unpack_from(
+                    data, offset )
+                if length < NLMSGHDR.size:
+                    break
+                start, end = offset + NLMSGHDR.size, offset + length
+                offset += _align( length )
+                if seq != self.seq:
+                    # Stale response to an earlier request
+                    continue
+                if rtype == NLMSG_DONE:
+                    return responses
+                if rtype == NLMSG_ERROR:
+                    err = -struct.unpack_from( '=i', data, start )[ 0 ]
+                    if err:
+                        raise OSError( err, os.strerror( err ) )
+                    return responses
+                responses.append( ( rtype, data[ start: end ] ) )
+
+    def dump( self, msgtype, body, attrs=() ):
+        "Send a dump request and return the responses"
+        return self.request( msgtype, body, attrs, flags=NLM_F_DUMP )
+
+    def requestMany( self, msgtype, payloads, flags=NLM_F_ACK,
+                     chunkSize=32768 ):
+        """Send many requests of one type, packing as many as will fit
+           into each send() and then collecting their acks.
+           msgtype: RTM_* message type
+           payloads: list of packed request bodies (including attrs)
+           flags: request flags (NLM_F_ACK)
+           chunkSize: maximum bytes per send()
+           returns: list of ( payload index, OSError ) for failures"""
+        errors = []
+        i = 0
+        while i < len( payloads ):
+            msgs, pending, size = [], {}, 0
+            while i < len( payloads ) and size < chunkSize:
+                self.seq += 1
+                payload = payloads[ i ]
+                msg = NLMSGHDR.pack( NLMSGHDR.size + len( payload ),
+                                     msgtype, NLM_F_REQUEST | flags,
+                                     self.seq, 0 ) + payload
+                msgs.append( msg )
+                size += len( msg )
+                pending[ self.seq ] = i
+                i += 1
+            self.sock.send( ''.join( msgs ) )
+            # Each request is answered by an ack (or error)
+            while pending:
+                data = self.sock.recv( 65536 )
+                offset = 0
+                while offset + NLMSGHDR.size <= len( data ):
+                    length, rtype, _flags, seq, _pid = (
+                        NLMSGHDR.unpack_from( data, offset ) )
+                    if length < NLMSGHDR.size:
+                        break
+                    start = offset + NLMSGHDR.size
+                    offset += _align( length )
+                    if rtype != NLMSG_ERROR or seq not in pending:
+                        continue
+                    index = pending.pop( seq )
+                    err = -struct.unpack_from( '=i', data, start )[ 0 ]
+                    if err:
+                        errors.append( ( index,
+                                         OSError( err, os.strerror( err ) ) ) )
+        return errors
+
+    # Links
+
+    def getLink( self, name ):
+        """Return information about a link.
+           name: interface name
+           returns: dict with index, flags, mac"""
+        body = IFINFOMSG.pack( socket.AF_UNSPEC, 0, 0, 0, 0 )
+        responses = self.request( RTM_GETLINK, body,
+                                  [ packAttr( IFLA_IFNAME, name + '\0' ) ] )
+        for rtype, payload in responses:
+            if rtype == RTM_NEWLINK:
+                return self._linkInfo( payload )
+        raise OSError( errno.ENODEV, os.strerror( errno.ENODEV ) )
+
+    def _linkInfo( self, payload ):
+        "Internal method: parse an RTM_NEWLINK payload"
+        _family, _itype, index, flags, _change = IFINFOMSG.unpack_from(
+            payload )
+        attrs = parseAttrs( payload, IFINFOMSG.size )
+        name = attrs.get( IFLA_IFNAME, '' ).rstrip( '\0' )
+        mac = attrs.get( IFLA_ADDRESS )
+        stats = attrs.get( IFLA_STATS64 )
+        mtu, gso = attrs.get( IFLA_MTU ), attrs.get( IFLA_GSO_MAX_SIZE )
+        return { 'index': index, 'flags': flags, 'name': name,
+                 'mac': bytesToMac( mac ) if mac else None,
+                 'mtu': struct.unpack( '=I', mtu )[ 0 ] if mtu else None,
+                 'gsoMaxSize': ( struct.unpack( '=I', gso )[ 0 ]
+                                 if gso else None ),
+                 'stats': ( LINKSTATS64.unpack_from( stats )
+                            if stats else None ) }
+
+    def links( self ):
+        "Return information about all links in our namespace"
+        body = IFINFOMSG.pack( socket.AF_UNSPEC, 0, 0, 0, 0 )
+        return [ self._linkInfo( payload )
+                 for rtype, payload in self.dump( RTM_GETLINK, body )
+                 if rtype == RTM_NEWLINK ]
+
+    def index( self, name ):
+        "Return interface index for name"
+        # We don't cache this, since interfaces may be renamed
+        # or deleted and recreated underneath us
+        return self.getLink( name )[ 'index' ]
+
+    def setLink( self, name, flags=0, change=0, attrs=() ):
+        """Change link flags and/or attributes.
+           name: interface name
+           flags: new flag values
+           change: mask of flags to change"""
+        body = IFINFOMSG.pack( socket.AF_UNSPEC, 0, self.index( name ),
+                               flags, change )
+        self.request( RTM_NEWLINK, body, attrs )
+
+    def setLinkUp( self, name, up=True ):
+        "Bring a link up (or down)"
+        self.setLink( name, flags=IFF_UP if up else 0, change=IFF_UP )
+
+    def isLinkUp( self, name ):
+        "Is link administratively up?"
+        return bool( self.getLink( name )[ 'flags' ] & IFF_UP )
+
+    def setMAC( self, name, mac ):
+        "Set the MAC address of a link"
+        self.setLink( name, attrs=[ packAttr( IFLA_ADDRESS,
+                                              macToBytes( mac ) ) ] )
+
+    def delLink( self, name ):
+        "Delete a link (which also deletes its veth peer)"
+        body = IFINFOMSG.pack( socket.AF_UNSPEC, 0, 0, 0, 0 )
+        self.request( RTM_DELLINK, body,
+                      [ packAttr( IFLA_IFNAME, name + '\0' ) ] )
+
+    # Addresses
+
+    def getAddrs( self, name=None ):
+        """Return IPv4 addresses
+           name: interface name or None for all interfaces
+           returns: list of ( index, ip, prefixLen )"""
+        index = self.index( name ) if name else None
+        body = IFADDRMSG.pack( socket.AF_INET, 0, 0, 0, 0 )
+        addrs = []
+        for rtype, payload in self.dump( RTM_GETADDR, body ):
+            if rtype != RTM_NEWADDR:
+                continue
+            _family, prefixLen, _flags, _scope, aindex = (
+                IFADDRMSG.unpack_from( payload ) )
+            if index is not None and aindex != index:
+                continue
+            attrs = parseAttrs( payload, IFADDRMSG.size )
+            ip = attrs.get( IFA_LOCAL, attrs.get( IFA_ADDRESS ) )
+            if ip:
+                addrs.append( ( aindex, socket.inet_ntoa( ip ), prefixLen ) )
+        return addrs
+
+    def delAddr( self, name, ip, prefixLen ):
+        "Remove an IPv4 address from a link"
+        body = IFADDRMSG.pack( socket.AF_INET, int( prefixLen ), 0, 0,
+                               self.index( name ) )
+        self.request( RTM_DELADDR, body,
+                      [ packAttr( IFA_LOCAL, socket.inet_aton( ip ) ) ] )
+
+    def addAddr( self, name, ip, prefixLen ):
+        "Add an IPv4 address (with broadcast address) to a link"
+        packed = socket.inet_aton( ip )
+        ipnum = struct.unpack( '!L', packed )[ 0 ]
+        bcast = struct.pack( '!L', ipnum | ( ~prefixMask( prefixLen ) &
+                                             0xffffffff ) )
+        body = IFADDRMSG.pack( socket.AF_INET, int( prefixLen ), 0,
+                               RT_SCOPE_UNIVERSE, self.index( name ) )
+        attrs = [ packAttr( IFA_LOCAL, packed ),
+                  packAttr( IFA_ADDRESS, packed ) ]
+        if int( prefixLen ) < 31:
+            attrs.append( packAttr( IFA_BROADCAST, bcast ) )
+        self.request( RTM_NEWADDR, body, attrs,
+                      flags=NLM_F_ACK | NLM_F_CREATE | NLM_F_REPLACE )
+
+    def setAddr( self, name, ip, prefixLen ):
+        """Replace the IPv4 address of a link and bring it up,
+           like ifconfig <name> <ip>/<prefixLen>"""
+        for _index, oldip, oldlen in self.getAddrs( name ):
+            if ( oldip, oldlen ) != ( ip, int( prefixLen ) ):
+                self.delAddr( name, oldip, oldlen )
+        self.addAddr( name, ip, prefixLen )
+        self.setLinkUp( name )
+
+    # Neighbors
+
+    @staticmethod
+    def packNeighs( neighs ):
+        """Pack neighbor entries for addNeighs(); the result can be
+           reused for any number of interfaces.
+           neighs: list of ( ip, mac ) strings
+           returns: list of packed attributes"""
+        return [ packAttr( NDA_DST, socket.inet_aton( ip ) ) +
+                 packAttr( NDA_LLADDR, macToBytes( mac ) )
+                 for ip, mac in neighs ]
+
+    def addNeighs( self, name, packed ):
+        """Add (or replace) permanent IPv4 neighbor (ARP) entries,
+           with a single send() for up to hundreds of entries
+           name: interface name
+           packed: entries from packNeighs()
+           returns: list of ( entry index, OSError ) for every entry
+             which failed, in order
+           raises OSError if the interface doesn't exist"""
+        body = NDMSG.pack( socket.AF_INET, self.index( name ),
+                           NUD_PERMANENT, 0, 0 )
+        errors = self.requestMany(
+            RTM_NEWNEIGH, [ body + attrs for attrs in packed ],
+            flags=NLM_F_ACK | NLM_F_CREATE | NLM_F_REPLACE )
+        return sorted( errors, key=lambda error: error[ 0 ] )
+
+    # Routes
+
+    def addRoute( self, dst=None, prefixLen=0, dev=None, gateway=None,
+                  replace=True ):
+        """Add an IPv4 route
+           dst: destination address (None for default route)
+           prefixLen: destination prefix length
+           dev: output interface name (optional)
+           gateway: gateway address (optional)
+           replace: replace existing route?"""
+        scope = RT_SCOPE_UNIVERSE if gateway else RT_SCOPE_LINK
+        body = RTMSG.pack( socket.AF_INET, prefixLen if dst else 0, 0, 0,
+                           RT_TABLE_MAIN, RTPROT_BOOT, scope, RTN_UNICAST, 0 )
+        attrs = []
+        if dst:
+            attrs.append( packAttr( RTA_DST, socket.inet_aton( dst ) ) )
+        if gateway:
+            attrs.append( packAttr( RTA_GATEWAY,
+                                    socket.inet_aton( gateway ) ) )
+        if dev:
+            attrs.append( packAttr( RTA_OIF,
+                                    struct.pack( '=i', self.index( dev ) ) ) )
+        flags = NLM_F_ACK | NLM_F_CREATE
+        flags |= NLM_F_REPLACE if replace else NLM_F_EXCL
+        self.request( RTM_NEWROUTE, body, attrs, flags=flags )
+
+    def delDefaultRoute( self ):
+        "Remove the default route, if any"
+        body = RTMSG.pack( socket.AF_INET, 0, 0, 0, RT_TABLE_MAIN, 0,
+                           0, 0, 0 )
+        try:
+            self.request( RTM_DELROUTE, body )
+        except OSError as e:
+            # ESRCH: no default route to delete
+            if e.errno != errno.ESRCH:
+                raise
+            debug( 'delDefaultRoute: no default route\n' )
+
+    # Queueing disciplines
+
+    def qdiscs( self ):
+        """Return statistics for all qdiscs in our namespace, like
+           tc -s qdisc show, but in one dump
+           returns: list of dicts with index, handle, parent, kind and
+             QDISC_STATS counters"""
+        body = TCMSG.pack( socket.AF_UNSPEC, 0, 0, 0, 0 )
+        qdiscs = []
+        for rtype, payload in self.dump( RTM_GETQDISC, body ):
+            if rtype != RTM_NEWQDISC:
+                continue
+            _family, index, handle, parent, _info = TCMSG.unpack_from(
+                payload )
+            attrs = parseAttrs( payload, TCMSG.size )
+            kind = attrs.get( TCA_KIND, '' ).rstrip( '\0' )
+            stats = parseAttrs( attrs.get( TCA_STATS2, '' ) )
+            basic = stats.get( TCA_STATS_BASIC, '' )
+            queue = stats.get( TCA_STATS_QUEUE, '' )
+            xstats = attrs.get( TCA_XSTATS, '' )
+            counters = (
+                ( STATS_BASIC.unpack_from( basic )
+                  if len( basic ) >= STATS_BASIC.size else ( 0, 0 ) ) +
+                ( STATS_QUEUE.unpack_from( queue )
+                  if len( queue ) >= STATS_QUEUE.size else ( 0, ) * 5 ) +
+                ( ( RED_XSTATS.unpack_from( xstats )[ 3 ], )
+                  if kind == 'red' and len( xstats ) >= RED_XSTATS.size
+                  else ( 0, ) ) )
+            qdisc = dict( zip( QDISC_STATS, counters ) )
+            qdisc.update( index=index, handle=handle, parent=parent,
+                          kind=kind )
+            qdiscs.append( qdisc )
+        return qdiscs
+
+    def __repr__( self ):
+        return '<%s %s>' % ( self.__class__.__name__, self.nsPath or 'root' )
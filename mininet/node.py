@@ -57,15 +57,21 @@
 import re
 import signal
 import select
-from subprocess import Popen, PIPE
+from subprocess import Popen, PIPE, STDOUT
 from time import sleep
 
 from mininet.log import info, error, warn, debug
 from mininet.util import ( quietRun, errRun, errFail, moveIntf, isShellBuiltin,
-                           numCores, retry, mountCgroups )
+                           numCores, retry, mountCgroups, RingBuffer,
+                           TcShell )
 from mininet.moduledeps import moduleDeps, pathCheck, TUN
 from mininet.link import Link, Intf, TCIntf, OVSIntf
+from mininet.netlink import RtNetlink
+from mininet.spawn import spawn
+from mininet.capture import Capture
+from mininet.timing import phaseTimer, timed
 from re import findall
+from collections import deque
 from distutils.version import StrictVersion
 
 class Node( object ):
@@ -78,6 +84,7 @@ def __init__( self, name, inNamespace=True, tdf = 1, **params ):
         """name: name of node
            inNamespace: in network namespace?
            privateDirs: list of private directory strings or tuples
+           maxOutput: bytes of command output to retain (None: unlimited)
            params: Node parameters (see config() for details)"""
 
         # Make sure class actually works
@@ -102,7 +109,12 @@ def __init__( self, name, inNamespace=True, tdf = 1, **params ):
             self.lastPid, self.lastCmd, self.pollOut ) = (
                 None, None, None, None, None, None, None, None )
         self.waiting = False
-        self.readbuf = ''
+        self.starting = 0  # sentinels to read before shell is ready
+        self.readbuf = RingBuffer()
+        self.maxOutput = params.get( 'maxOutput', self.maxOutput )
+        self.nl = None  # netlink socket for our namespace
+        self.tcsh = None  # TcShell for our namespace
+        self.cmdQueue = None  # commands queued for cmdBatch()
 
         # Start command interpreter shell
         self.startShell()
@@ -142,13 +154,13 @@ def startShell( self, mnopts=None ):
         # in the subprocess and insulate it from signals (e.g. SIGINT)
         # received by the parent
         master, slave = pty.openpty()
-        self.shell = self._popen( cmd, stdin=slave, stdout=slave, stderr=slave,
-                                  close_fds=False )
+        self.shell = self._spawnShell( cmd, slave )
         self.stdin = os.fdopen( master, 'rw' )
         self.stdout = self.stdin
         self.pid = self.shell.pid
         self.pollOut = select.poll()
-        self.pollOut.register( self.stdout )
+        # stdout is also stdin, so don't wake up when it's writable
+        self.pollOut.register( self.stdout, select.POLLIN )
         # Maintain mapping between file descriptors and nodes
         # This is useful for monitoring multiple nodes
         # using select.poll()
@@ -157,32 +169,44 @@ def startShell( self, mnopts=None ):
         self.execed = False
         self.lastCmd = None
         self.lastPid = None
-        self.readbuf = ''
-        # Wait for prompt
-        while True:
-            data = self.read( 1024 )
-            if data[ -1 ] == chr( 127 ):
-                break
-            self.pollOut.poll()
+        self.readbuf.clear()
         self.waiting = False
+        # Rather than waiting for the prompt, send our setup commands
+        # right away; the shell will read them once it has started.
         # +m: disable job control notification
-        self.cmd( 'unset HISTFILE; stty -echo; set +m' )
+        self.write( 'unset HISTFILE; stty -echo; set +m\n' )
+        # We are ready after the initial prompt and the one after setup
+        self.starting = 2
+
+    def waitStarted( self, block=True ):
+        """Wait for our shell to finish starting up. Until it has, our
+           namespace may not exist yet.
+           block: wait, or just consume whatever output is available
+           returns: True if the shell has started"""
+        while self.starting:
+            if not len( self.readbuf ) and not self.pollOut.poll(
+                    None if block else 0 ):
+                break
+            data = self.read( 1024 )
+            self.starting -= data.count( chr( 127 ) )
+        return not self.starting
 
     def mountPrivateDirs( self ):
         "mount private directories"
+        cmds = []
         for directory in self.privateDirs:
             if isinstance( directory, tuple ):
                 # mount given private directory
                 privateDir = directory[ 1 ] % self.__dict__
                 mountPoint = directory[ 0 ]
-                self.cmd( 'mkdir -p %s' % privateDir )
-                self.cmd( 'mkdir -p %s' % mountPoint )
-                self.cmd( 'mount --bind %s %s' %
-                               ( privateDir, mountPoint ) )
+                cmds += [ 'mkdir -p %s' % privateDir,
+                          'mkdir -p %s' % mountPoint,
+                          'mount --bind %s %s' % ( privateDir, mountPoint ) ]
             else:
                 # mount temporary filesystem on directory
-                self.cmd( 'mkdir -p %s' % directory )
-                self.cmd( 'mount -n -t tmpfs tmpfs %s' % directory )
+                cmds += [ 'mkdir -p %s' % directory,
+                          'mount -n -t tmpfs tmpfs %s' % directory ]
+        self.cmdBatch( cmds )
 
     def unmountPrivateDirs( self ):
         "mount private directories"
@@ -200,6 +224,15 @@ def _popen( self, cmd, **params ):
         assert self
         return Popen( cmd, **params )
 
+    def _spawnShell( self, cmd, tty ):
+        """Internal method: spawn and return our shell process, using
+           posix_spawnp() if possible since it is much faster than fork()
+           cmd: command to run (list)
+           tty: terminal file descriptor for stdin/stdout/stderr"""
+        return ( spawn( cmd, tty ) or
+                 self._popen( cmd, stdin=tty, stdout=tty, stderr=tty,
+                              close_fds=False ) )
+
     def cleanup( self ):
         "Help python collect its garbage."
         # We used to do this, but it slows us down:
@@ -207,6 +240,12 @@ def cleanup( self ):
         # for intfName in self.intfNames():
         # if self.name in intfName:
         # quietRun( 'ip link del ' + intfName )
+        if self.nl:
+            self.nl.close()
+        self.nl = None
+        if self.tcsh:
+            self.tcsh.close()
+        self.tcsh = None
         self.shell = None
 
     # Subshell I/O, commands and control
@@ -216,26 +255,48 @@ def read( self, maxbytes=1024 ):
            maxbytes: maximum number of bytes to return"""
         count = len( self.readbuf )
         if count < maxbytes:
-            data = os.read( self.stdout.fileno(), maxbytes - count )
-            self.readbuf += data
-        if maxbytes >= len( self.readbuf ):
-            result = self.readbuf
-            self.readbuf = ''
-        else:
-            result = self.readbuf[ :maxbytes ]
-            self.readbuf = self.readbuf[ maxbytes: ]
-        return result
+            self.readbuf.fill( self.stdout.fileno(), maxbytes - count )
+        return self.readbuf.read( maxbytes )
 
     def readline( self ):
         """Buffered readline from node, non-blocking.
            returns: line (minus newline) or None"""
-        self.readbuf += self.read( 1024 )
-        if '\n' not in self.readbuf:
-            return None
         pos = self.readbuf.find( '\n' )
-        line = self.readbuf[ 0: pos ]
-        self.readbuf = self.readbuf[ pos + 1: ]
-        return line
+        if pos < 0 and not self.readbuf.full():
+            self.readbuf.fill( self.stdout.fileno(), 1024 )
+            pos = self.readbuf.find( '\n' )
+        if pos < 0:
+            # Return an over-long line in pieces rather than stalling
+            return self.readbuf.read( len( self.readbuf ) ) if (
+                self.readbuf.full() ) else None
+        line = self.readbuf.read( pos + 1 )
+        return line[ :-1 ]
+
+    def readOutput( self, timeoutms=None, findPid=True ):
+        """Read what output is available (reading up to 1024 bytes at
+           a time), waiting no longer than timeoutms for it. A PID
+           marker (chr(1), digits and newline) may arrive in pieces,
+           so we wait for the rest of it, scanning only new bytes for
+           its end, or if timeoutms passes first, return what precedes
+           it and leave it buffered.
+           timeoutms: timeout in ms or None to wait indefinitely
+           findPid: look for a PID marker
+           returns: data, or None at EOF"""
+        buf, fd = self.readbuf, self.stdout.fileno()
+        count = len( buf )
+        if count < 1024 and self.pollOut.poll( 0 if count else timeoutms ):
+            if not buf.fill( fd, 1024 - count ) and not count:
+                return None
+        start = buf.find( chr( 1 ) ) if findPid else -1
+        if start >= 0:
+            end = buf.find( '\n', start )
+            while end < 0 and not buf.full():
+                scanned = len( buf )
+                if ( not self.pollOut.poll( timeoutms ) or
+                     not buf.fill( fd, 1024 ) ):
+                    return buf.read( start )
+                end = buf.find( '\n', scanned )
+        return buf.read( len( buf ) )
 
     def write( self, data ):
         """Write data to node.
@@ -269,6 +330,7 @@ def sendCmd( self, *args, **kwargs ):
            args: command and arguments, or string
            printPid: print command's PID? (False)"""
         assert self.shell and not self.waiting
+        self.waitStarted()
         printPid = kwargs.get( 'printPid', False )
         # Allow sendCmd( [ list ] )
         if len( args ) == 1 and isinstance( args[ 0 ], list ):
@@ -289,6 +351,7 @@ def sendCmd( self, *args, **kwargs ):
             cmd += ' printf "\\001%d\\012" $! '
         elif printPid and not isShellBuiltin( cmd ):
             cmd = 'mnexec -p ' + cmd
+        phaseTimer.countCommands()
         self.write( cmd + '\n' )
         self.lastPid = None
         self.waiting = True
@@ -303,18 +366,13 @@ def monitor( self, timeoutms=None, findPid=True ):
            Set self.waiting to False if command has completed.
            timeoutms: timeout in ms or None to wait indefinitely
            findPid: look for PID from mnexec -p"""
-        self.waitReadable( timeoutms )
-        data = self.read( 1024 )
+        data = self.readOutput( timeoutms, findPid ) or ''
         pidre = r'\[\d+\] \d+\r\n'
-        # Look for PID
+        # Look for PID; readOutput() returns all of its marker or none
         marker = chr( 1 ) + r'\d+\r\n'
         if findPid and chr( 1 ) in data:
             # suppress the job and PID of a backgrounded command
-            if re.findall( pidre, data ):
-                data = re.sub( pidre, '', data )
-            # Marker can be read in chunks; continue until all of it is read
-            while not re.findall( marker, data ):
-                data += self.read( 1024 )
+            data = re.sub( pidre, '', data )
             markers = re.findall( marker, data )
             if markers:
                 self.lastPid = int( markers[ 0 ][ 1: ] )
@@ -328,32 +386,119 @@ def monitor( self, timeoutms=None, findPid=True ):
             data = data.replace( chr( 127 ), '' )
         return data
 
-    def waitOutput( self, verbose=False, findPid=True ):
+    # Maximum number of bytes of output retained by waitOutput(),
+    # or None for no limit
+    maxOutput = None
+
+    def waitOutput( self, verbose=False, findPid=True, callback=None,
+                    maxOutput=None ):
         """Wait for a command to complete.
            Completion is signaled by a sentinel character, ASCII(127)
            appearing in the output stream.  Wait for the sentinel and return
            the output, including trailing newline.
-           verbose: print output interactively"""
+           verbose: print output interactively
+           findPid: look for PID from mnexec -p
+           callback: function called with each chunk of output
+           maxOutput: bytes of output to retain (default: self.maxOutput);
+             if output is longer, only the last maxOutput bytes
+             are returned"""
         log = info if verbose else debug
-        output = ''
+        if maxOutput is None:
+            maxOutput = self.maxOutput
+        chunks, retained = deque(), 0
         while self.waiting:
             data = self.monitor( findPid=findPid )
-            output += data
+            if not data:
+                continue
             log( data )
+            if callback:
+                callback( data )
+            chunks.append( data )
+            retained += len( data )
+            # Drop chunks which are entirely outside the retained tail
+            while ( maxOutput is not None and chunks and
+                    retained - len( chunks[ 0 ] ) >= maxOutput ):
+                retained -= len( chunks.popleft() )
+        output = ''.join( chunks )
+        if maxOutput is not None and len( output ) > maxOutput:
+            output = output[ len( output ) - maxOutput: ]
         return output
 
     def cmd( self, *args, **kwargs ):
         """Send a command, wait for output, and return it.
-           cmd: string"""
+           cmd: string
+           verbose: print output interactively
+           callback: function called with each chunk of output
+           maxOutput: bytes of output to retain (see waitOutput())"""
         verbose = kwargs.get( 'verbose', False )
         log = info if verbose else debug
+        if self.cmdQueue is not None:
+            # Queue for later execution (see queueCmds())
+            log( '*** %s : queued %s\n' % ( self.name, args ) )
+            self.cmdQueue.append( args[ 0 ] if len( args ) == 1
+                                  else list( args ) )
+            return ''
         log( '*** %s : %s\n' % ( self.name, args ) )
         if self.shell:
             self.sendCmd( *args, **kwargs )
-            return self.waitOutput( verbose )
+            return self.waitOutput( verbose,
+                                    callback=kwargs.get( 'callback' ),
+                                    maxOutput=kwargs.get( 'maxOutput' ) )
         else:
             warn( '(%s exited - ignoring cmd%s)\n' % ( self, args ) )
 
+    # Separator printed between the outputs of batched commands
+    batchSep = chr( 30 )
+    # Maximum length of a batched command line
+    batchMax = 4000
+
+    def cmdBatch( self, cmds, verbose=False ):
+        """Send a list of commands to our shell in as few round trips
+           as possible, and return their outputs.
+           cmds: list of command strings (or lists of arguments)
+           verbose: print output interactively
+           returns: list of outputs, one per command
+           Note: commands should not read from stdin."""
+        if self.cmdQueue is not None:
+            self.cmdQueue.extend( cmds )
+            return [ '' ] * len( cmds )
+        sep = "printf '\\%03o'" % ord( self.batchSep )
+        lines, line = [], ''
+        for cmd in cmds:
+            if not isinstance( cmd, basestring ):
+                cmd = ' '.join( [ str( c ) for c in cmd ] )
+            cmd = cmd.strip().rstrip( ';' ).strip() or 'true'
+            # Backgrounded commands can't be followed by ';'
+            cmd += ( ' ' if cmd[ -1 ] == '&' else '; ' ) + sep + '; '
+            if line and len( line ) + len( cmd ) > self.batchMax:
+                lines.append( line )
+                line = ''
+            line += cmd
+        if line:
+            lines.append( line )
+        # Each line counts as one command when we send it
+        phaseTimer.countCommands( len( cmds ) - len( lines ) )
+        outputs = []
+        for line in lines:
+            output = self.cmd( line, verbose=verbose ) or ''
+            # The last piece is whatever follows the final separator
+            outputs += output.split( self.batchSep )[ :-1 ]
+        # Pad in case our shell went away
+        outputs += [ '' ] * ( len( cmds ) - len( outputs ) )
+        return outputs
+
+    def queueCmds( self ):
+        """Start queueing cmd() calls rather than running them;
+           runQueuedCmds() sends them to the shell in one batch.
+           Note: queued cmd() calls return ''."""
+        self.cmdQueue = []
+
+    def runQueuedCmds( self, verbose=False ):
+        """Run commands queued since queueCmds() using cmdBatch()
+           returns: list of outputs"""
+        cmds, self.cmdQueue = self.cmdQueue, None
+        return self.cmdBatch( cmds, verbose=verbose ) if cmds else []
+
     def cmdPrint( self, *args):
         """Call cmd and printing its output
            cmd: string"""
@@ -363,6 +508,7 @@ def popen( self, *args, **kwargs ):
         """Return a Popen() object in our namespace
            args: Popen() args, single list, or string
            kwargs: Popen() keyword args"""
+        self.waitStarted()
         defaults = { 'stdout': PIPE, 'stderr': PIPE,
                      'mncmd':
                      [ 'mnexec', '-da', str( self.pid ) ] }
@@ -397,6 +543,51 @@ def pexec( self, *args, **kwargs ):
         exitcode = popen.wait()
         return out, err, exitcode
 
+    # Netlink support: rather than running ifconfig/route in our
+    # shell, we can configure our namespace in-process
+
+    useNetlink = True
+
+    def nsPath( self ):
+        "Return the file for our network namespace, or None if root"
+        self.waitStarted()
+        return '/proc/%s/ns/net' % self.pid if self.inNamespace else None
+
+    def netns( self ):
+        "Return our network namespace as an ip link ... netns argument"
+        self.waitStarted()
+        return self.pid
+
+    def netlink( self ):
+        """Return an RtNetlink socket for our namespace, or None if
+           netlink is disabled or unavailable (use the shell instead)"""
+        if self.nl is None and self.useNetlink and self.shell:
+            try:
+                self.nl = RtNetlink( self.nsPath() )
+            except ( OSError, IOError, AttributeError ) as e:
+                debug( '*** %s: netlink unavailable (%s), using shell\n' %
+                       ( self.name, e ) )
+                self.nl = False
+        return self.nl or None
+
+    def tcShell( self ):
+        "Return a TcShell for our namespace, starting it if necessary"
+        if self.tcsh is None:
+            self.tcsh = TcShell( self )
+        return self.tcsh
+
+    def capture( self, intf=None, bpf=None, snaplen=65535, ringMB=16,
+                 **params ):
+        """Capture packets in our namespace, without running tcpdump
+           intf: interface or name (default: all interfaces)
+           bpf: filter (tcpdump expression or compiled program)
+           snaplen: max bytes to capture per packet
+           ringMB: size of the capture ring buffer in MB
+           params: other Capture() params
+           returns: Capture (see mininet.capture)"""
+        return Capture( self, intf, bpf=bpf, snaplen=snaplen,
+                        ringMB=ringMB, **params )
+
     # Interface management, configuration, and routing
 
     # BL notes: This might be a bit redundant or over-complicated.
@@ -493,10 +684,46 @@ def setARP( self, ip, mac ):
         result = self.cmd( 'arp', '-s', ip, mac )
         return result
 
+    def setARPs( self, neighs, intf=None, packed=None ):
+        """Add many static ARP entries at once: via netlink if we can,
+           otherwise with a single ip -batch process.
+           neighs: list of ( ip, mac ) strings
+           intf: interface for the entries (default interface)
+           packed: RtNetlink.packNeighs( neighs ), if already computed
+           returns: error output, with a line for each failed entry,
+             or '' on success"""
+        intf = self.intf( intf )
+        nl = self.netlink()
+        if nl:
+            try:
+                errors = nl.addNeighs( str( intf ),
+                                       packed if packed is not None
+                                       else RtNetlink.packNeighs( neighs ) )
+                return ''.join( 'neigh %s lladdr %s dev %s: %s\n' %
+                                ( neighs[ i ][ 0 ], neighs[ i ][ 1 ], intf,
+                                  e.strerror ) for i, e in errors )
+            except OSError as e:
+                debug( '*** %s: netlink setARPs failed: %s\n' %
+                       ( self.name, e ) )
+        popen = self.popen( [ 'ip', '-force', '-batch', '-' ], stdin=PIPE,
+                            stdout=PIPE, stderr=STDOUT )
+        output, _err = popen.communicate(
+            ''.join( 'neigh replace %s lladdr %s dev %s nud permanent\n' %
+                     ( ip, mac, intf ) for ip, mac in neighs ) )
+        return output
+
     def setHostRoute( self, ip, intf ):
         """Add route to host.
            ip: IP address as dotted decimal
            intf: string, interface name"""
+        nl = self.netlink()
+        if nl:
+            try:
+                nl.addRoute( ip, 32, dev=str( intf ) )
+                return ''
+            except OSError as e:
+                debug( '*** %s: netlink setHostRoute failed: %s\n' %
+                       ( self.name, e ) )
         return self.cmd( 'route add -host', ip, 'dev', intf )
 
     def setDefaultRoute( self, intf=None ):
@@ -507,6 +734,18 @@ def setDefaultRoute( self, intf=None ):
             params = intf
         else:
             params = 'dev %s' % intf
+        nl = self.netlink()
+        words = params.split()
+        opts = dict( zip( words[ ::2 ], words[ 1::2 ] ) )
+        if ( nl and len( words ) % 2 == 0 and
+             set( opts ).issubset( ( 'dev', 'via' ) ) ):
+            try:
+                nl.delDefaultRoute()
+                nl.addRoute( dev=opts.get( 'dev' ), gateway=opts.get( 'via' ) )
+                return
+            except OSError as e:
+                debug( '*** %s: netlink setDefaultRoute failed: %s\n' %
+                       ( self.name, e ) )
         # Do this in one line in case we're messing with the root namespace
         self.cmd( 'ip route del default; ip route add default', params )
 
@@ -577,13 +816,44 @@ def config( self, mac=None, ip=None,
         # the superclass config method here as follows:
         # r = Parent.config( **_params )
         r = {}
-        self.setParam( r, 'setMAC', mac=mac )
-        self.setParam( r, 'setIP', ip=ip )
-        self.setParam( r, 'setDefaultRoute', defaultRoute=defaultRoute )
-        # This should be examined
-        self.cmd( 'ifconfig lo ' + lo )
+        # Send the shell commands for these settings (if we can't use
+        # netlink) in one batch; cmd() in subclasses' config() methods
+        # still runs synchronously
+        batch = self.cmdQueue is None
+        if batch:
+            self.queueCmds()
+        queued = {}  # param: ( first, last ) queued command
+        try:
+            for method, param in ( ( 'setMAC', dict( mac=mac ) ),
+                                   ( 'setIP', dict( ip=ip ) ),
+                                   ( 'setDefaultRoute',
+                                     dict( defaultRoute=defaultRoute ) ) ):
+                first = len( self.cmdQueue )
+                self.setParam( r, method, **param )
+                queued[ param.keys()[ 0 ] ] = first, len( self.cmdQueue )
+            # This should be examined
+            self.setLoopback( lo )
+        finally:
+            outputs = self.runQueuedCmds() if batch else []
+        # Return the output of each setting's commands, as cmd() would
+        for name, ( first, last ) in queued.iteritems():
+            if name in r and last > first and outputs:
+                r[ name ] = ''.join( outputs[ first:last ] )
         return r
 
+    def setLoopback( self, lo='up' ):
+        """Configure loopback interface
+           lo: ifconfig arguments for lo ('up')"""
+        nl = self.netlink()
+        if nl and lo in ( 'up', 'down' ):
+            try:
+                nl.setLinkUp( 'lo', lo == 'up' )
+                return
+            except OSError as e:
+                debug( '*** %s: netlink setLoopback failed: %s\n' %
+                       ( self.name, e ) )
+        self.cmd( 'ifconfig lo ' + lo )
+
     def configDefault( self, **moreParams ):
         "Configure with default parameters"
         self.params.update( moreParams )
@@ -638,6 +908,207 @@ class Host( Node ):
     "A host is simply a Node"
     pass
 
+class LightHost( Host ):
+    """A host without a shell: we keep only a named network namespace
+       (bind mounted by ip netns add), and spawn a short-lived process
+       in it for each cmd() or popen(). This uses far less memory than
+       a shell per host, and no ptys, in very large topologies.
+       Note: background commands (cmd &) run with output discarded,
+       and privateDirs are not supported."""
+
+    nsPrefix = 'mn-'
+    nsDir = '/var/run/netns'
+
+    def __init__( self, name, **kwargs ):
+        self.nsName = None  # name of our network namespace
+        self.proc = None  # process running the current command
+        self.bgPids = []  # background commands
+        Host.__init__( self, name, **kwargs )
+
+    def startShell( self, mnopts=None ):
+        "Create our network namespace (rather than a shell)"
+        if self.nsName:
+            error( "%s: namespace already exists\n" % self.name )
+            return
+        if not self.inNamespace:
+            raise Exception( 'LightHost %s requires a network namespace'
+                             % self.name )
+        # Our pid in the name lets mn -c tell whether we're still running
+        nsName = '%s%d-%s' % ( self.nsPrefix, os.getpid(), self.name )
+        if os.path.exists( os.path.join( self.nsDir, nsName ) ):
+            raise Exception( 'LightHost %s: namespace %s already exists'
+                             % ( self.name, nsName ) )
+        output = quietRun( 'ip netns add ' + nsName )
+        if output:
+            raise Exception( 'Error creating namespace %s: %s' %
+                             ( nsName, output ) )
+        self.nsName = nsName
+        self.execed = False
+        self.lastCmd = None
+        self.lastPid = None
+        self.readbuf.clear()
+        self.waiting = False
+
+    def mountPrivateDirs( self ):
+        "We don't have a mount namespace, so privateDirs are not supported"
+        if self.privateDirs:
+            raise Exception( 'LightHost %s: privateDirs not supported'
+                             % self.name )
+
+    def unmountPrivateDirs( self ):
+        "No private directories to unmount"
+        pass
+
+    def nsPath( self ):
+        "Return the file for our network namespace"
+        return os.path.join( self.nsDir, self.nsName )
+
+    def netns( self ):
+        "Return our network namespace as an ip link ... netns argument"
+        return self.nsName
+
+    def popen( self, *args, **kwargs ):
+        """Return a Popen() object in our namespace, in a new session
+           args: Popen() args, single list, or string
+           kwargs: Popen() keyword args"""
+        kwargs.setdefault( 'mncmd', [ 'ip', 'netns', 'exec', self.nsName,
+                                      'mnexec', '-d' ] )
+        return Host.popen( self, *args, **kwargs )
+
+    def netlink( self ):
+        """Return an RtNetlink socket for our namespace, or None if
+           netlink is disabled or unavailable (use cmd() instead)"""
+        if self.nl is None and self.useNetlink and self.nsName:
+            try:
+                self.nl = RtNetlink( self.nsPath() )
+            except ( OSError, IOError, AttributeError ) as e:
+                debug( '*** %s: netlink unavailable (%s), using cmd()\n' %
+                       ( self.name, e ) )
+                self.nl = False
+        return self.nl or None
+
+    def cmd( self, *args, **kwargs ):
+        """Run a command in our namespace, wait for output, and return it.
+           cmd: string
+           verbose: print output interactively
+           callback: function called with each chunk of output
+           maxOutput: bytes of output to retain (see waitOutput())"""
+        if self.cmdQueue is not None or not self.nsName:
+            # Queue command, or warn that we have exited
+            return Host.cmd( self, *args, **kwargs )
+        verbose = kwargs.get( 'verbose', False )
+        log = info if verbose else debug
+        log( '*** %s : %s\n' % ( self.name, args ) )
+        self.sendCmd( *args, **kwargs )
+        return self.waitOutput( verbose,
+                                callback=kwargs.get( 'callback' ),
+                                maxOutput=kwargs.get( 'maxOutput' ) )
+
+    def sendCmd( self, *args, **kwargs ):
+        """Start a command in our namespace, and return without waiting
+           for it to complete.
+           args: command and arguments, or string
+           printPid: print command's PID? (False)"""
+        assert self.nsName and not self.waiting
+        printPid = kwargs.get( 'printPid', False )
+        # Allow sendCmd( [ list ] )
+        if len( args ) == 1 and isinstance( args[ 0 ], list ):
+            cmd = args[ 0 ]
+        # Allow sendCmd( cmd, arg1, arg2... )
+        elif len( args ) > 0:
+            cmd = args
+        # Convert to string
+        if not isinstance( cmd, str ):
+            cmd = ' '.join( [ str( c ) for c in cmd ] )
+        self.lastCmd = cmd
+        cmd = cmd.strip()
+        if cmd.endswith( '&' ):
+            # Detach background command and print its PID
+            cmd = ( '{ %s } </dev/null >/dev/null 2>&1; '
+                    'printf "\\001%%d\\n" $!' % cmd )
+        elif printPid and cmd and not isShellBuiltin( cmd ):
+            cmd = 'mnexec -p ' + cmd
+        phaseTimer.countCommands()
+        self.proc = self.popen( [ 'bash', '-c', cmd or 'true' ],
+                                stdin=PIPE, stdout=PIPE, stderr=STDOUT )
+        self.stdin, self.stdout = self.proc.stdin, self.proc.stdout
+        self.pollOut = select.poll()
+        self.pollOut.register( self.stdout )
+        self.outToNode[ self.stdout.fileno() ] = self
+        self.readbuf.clear()
+        self.lastPid = None
+        self.waiting = True
+
+    def sendInt( self, intr=chr( 3 ) ):
+        "Interrupt running command."
+        if self.proc and self.proc.poll() is None:
+            debug( 'sendInt: interrupting %s\n' % self.proc.pid )
+            os.killpg( self.proc.pid, signal.SIGINT )
+
+    def monitor( self, timeoutms=None, findPid=True ):
+        """Monitor and return the output of a command.
+           Set self.waiting to False if command has completed.
+           timeoutms: timeout in ms or None to wait indefinitely
+           findPid: look for PID printed by sendCmd()"""
+        if not self.waiting:
+            return ''
+        data = self.readOutput( timeoutms, findPid )
+        if data is None:
+            # EOF: command has completed
+            self.proc.wait()
+            self.stdin.close()
+            self.stdout.close()
+            self.waiting = False
+            return ''
+        # readOutput() returns all of a PID marker or none of it
+        marker = chr( 1 ) + r'(\d+)\r?\n'
+        if findPid and chr( 1 ) in data:
+            pids = re.findall( marker, data )
+            if pids:
+                self.lastPid = int( pids[ 0 ] )
+                if self.lastCmd.strip().endswith( '&' ):
+                    # Its process group is that of our bash -c
+                    self.bgPids.append( self.proc.pid )
+                data = re.sub( marker, '', data )
+        return data
+
+    def killProcs( self ):
+        "Kill any commands we have started"
+        pgids = list( self.bgPids )
+        if self.proc and self.proc.poll() is None:
+            pgids.append( self.proc.pid )
+        for pgid in pgids:
+            try:
+                os.killpg( pgid, signal.SIGHUP )
+            except OSError:
+                pass
+        self.bgPids = []
+
+    def terminate( self ):
+        "Kill our processes and remove our namespace."
+        self.killProcs()
+        if self.nsName:
+            quietRun( 'ip netns del ' + self.nsName )
+        self.cleanup()
+        self.nsName = None
+
+    @classmethod
+    def batchTerminate( cls, hosts ):
+        """Terminate a list of LightHosts, removing all of their
+           namespaces with a single ip -batch process
+           hosts: LightHosts to terminate"""
+        for host in hosts:
+            host.killProcs()
+        names = [ host.nsName for host in hosts if host.nsName ]
+        if names:
+            popen = Popen( [ 'ip', '-force', '-batch', '-' ], stdin=PIPE,
+                           stdout=PIPE, stderr=STDOUT )
+            popen.communicate( ''.join( 'netns del %s\n' % name
+                                        for name in names ) )
+        for host in hosts:
+            host.cleanup()
+            host.nsName = None
+
 class CPULimitedHost( Host ):
 
     "CPU limited host"
@@ -971,9 +1442,9 @@ def TCReapply( intf ):
             ifspeed = 10000000000  # 10 Gbps
             minspeed = ifspeed * 0.001
 
-            res = intf.config( **intf.params )
+            res = intf.reapply()
 
-            if res is None:  # link may not have TC parameters
+            if 'parent' not in res:  # link may not have TC parameters
                 return
 
             # Re-add qdisc, root, and default classes user switch created, but
@@ -1091,7 +1562,7 @@ def TCReapply( intf ):
            over tc queuing disciplines. As a quick hack/
            workaround, we clear OVS's and reapply our own."""
         if isinstance( intf, TCIntf ):
-            intf.config( **intf.params )
+            intf.reapply()
 
     def attach( self, intf ):
         "Connect a data port"
@@ -1195,6 +1666,7 @@ def start( self, controllers ):
     argmax = 128000
 
     @classmethod
+    @timed( 'OVSSwitch.batchStartup' )
     def batchStartup( cls, switches, run=errRun ):
         """Batch startup for OVS
            switches: switches to start up
@@ -1217,10 +1689,10 @@ def batchStartup( cls, switches, run=errRun ):
         if cmds:
             run( cmds, shell=True )
         # Reapply link config if necessary...
-        for switch in switches:
-            for intf in switch.intfs.itervalues():
-                if isinstance( intf, TCIntf ):
-                    intf.config( **intf.params )
+        TCIntf.batchConfig( [ intf for switch in switches
+                              for intf in switch.intfs.itervalues()
+                              if isinstance( intf, TCIntf ) ],
+                            changedOnly=True )
         return switches
 
     def stop( self, deleteIntfs=True ):
@@ -0,0 +1,512 @@
+"""
+reach.py: concurrent reachability testing for Mininet
+
+Mininet.ping() used to run ping -c1 from each source to each
+destination, one after another, through the source's shell. That
+is n*(n-1) fork/exec round trips, each waiting for its own reply,
+so pingall on a few hundred hosts took tens of minutes.
+
+probe() instead opens one raw ICMP socket in each source's network
+namespace (see netlink.nsSocket) and sends echo requests from all
+sources to all destinations from a single poll() loop, so the whole
+test takes about one timeout plus the time to send the packets.
+Nodes which we can't open sockets for (e.g. remote nodes, or hosts
+which have netlink disabled) fall back to a single shell loop per
+source which runs ping to all of its destinations concurrently.
+
+Results are collected in a ReachMatrix, which holds packet counts and
+RTT statistics for every (src, dst) pair, using numpy arrays if numpy
+is available. Mininet.ping()/pingFull() print and return views of it.
+
+ReachCache keeps the last ReachMatrix for a network along with a set
+of dirty pairs which need to be probed again. When a link changes
+state, the pairs of hosts with a shortest path (in hops, counting
+links that are down) across it are marked dirty, so that
+Mininet.verifyReachability() only has to re-probe those. If the link
+is a bridge, these are exactly the pairs it separates; otherwise
+traffic might not take shortest paths (e.g. with a spanning tree, or
+routes set up by a controller), so a ReachCache may be made
+conservative, in which case every pair in the link's connected
+component is marked dirty instead.
+"""
+
+import os
+import re
+import math
+import time
+import errno
+import select
+import socket
+import struct
+from array import array
+
+from mininet.log import debug, error
+from mininet.netlink import nsSocket
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class ReachMatrix( object ):
+    """Packet counts and RTT statistics (in ms) between pairs of nodes.
+       Statistics are stored in flat arrays indexed by
+       pos( src, dst ); lossMatrix() and rttMatrix() return 2D views."""
+
+    def __init__( self, srcs, dsts=None ):
+        """srcs: list of source nodes
+           dsts: list of destination nodes (srcs)"""
+        self.srcs = list( srcs )
+        self.dsts = self.srcs if dsts is None else list( dsts )
+        self.srcIndex = { node: i for i, node in enumerate( self.srcs ) }
+        self.dstIndex = { node: i for i, node in enumerate( self.dsts ) }
+        size = len( self.srcs ) * len( self.dsts )
+        self.sent = self._zeros( size, 'l' )
+        self.received = self._zeros( size, 'l' )
+        self.rttmin = self._zeros( size, 'd' )
+        self.rttmax = self._zeros( size, 'd' )
+        self.rttsum = self._zeros( size, 'd' )
+        self.rttsq = self._zeros( size, 'd' )
+
+    @staticmethod
+    def _zeros( size, typecode ):
+        "Return a zeroed numpy array if possible, else an array"
+        if numpy is not None:
+            return numpy.zeros( size, dtype=( int if typecode == 'l'
+                                              else float ) )
+        return array( typecode, [ 0 ] ) * size
+
+    def pos( self, src, dst ):
+        "Return array index for (src, dst)"
+        return self.srcIndex[ src ] * len( self.dsts ) + self.dstIndex[ dst ]
+
+    def clear( self, pos ):
+        "Forget results for the pair at pos"
+        for stat in ( self.sent, self.received, self.rttmin, self.rttmax,
+                      self.rttsum, self.rttsq ):
+            stat[ pos ] = 0
+
+    def addSent( self, pos, count=1 ):
+        "Record count packets sent for the pair at pos"
+        self.sent[ pos ] += count
+
+    def addReply( self, pos, rtt ):
+        """Record a reply for the pair at pos
+           rtt: round trip time in ms"""
+        if not self.received[ pos ] or rtt < self.rttmin[ pos ]:
+            self.rttmin[ pos ] = rtt
+        if rtt > self.rttmax[ pos ]:
+            self.rttmax[ pos ] = rtt
+        self.received[ pos ] += 1
+        self.rttsum[ pos ] += rtt
+        self.rttsq[ pos ] += rtt * rtt
+
+    def setStats( self, pos, stats ):
+        """Set results for the pair at pos
+           stats: ( sent, received, rttmin, rttavg, rttmax, rttdev )"""
+        sent, received, rttmin, rttavg, rttmax, rttdev = stats
+        self.sent[ pos ], self.received[ pos ] = sent, received
+        self.rttmin[ pos ], self.rttmax[ pos ] = rttmin, rttmax
+        self.rttsum[ pos ] = rttavg * received
+        self.rttsq[ pos ] = ( rttdev * rttdev + rttavg * rttavg ) * received
+
+    def stats( self, src, dst ):
+        """Return statistics for a pair, in the same form as
+           Mininet._parsePingFull():
+           ( sent, received, rttmin, rttavg, rttmax, rttdev )"""
+        pos = self.pos( src, dst )
+        sent, received = int( self.sent[ pos ] ), int( self.received[ pos ] )
+        if not received:
+            return sent, received, 0, 0, 0, 0
+        avg = self.rttsum[ pos ] / received
+        dev = math.sqrt( max( self.rttsq[ pos ] / received - avg * avg, 0 ) )
+        return ( sent, received, float( self.rttmin[ pos ] ), float( avg ),
+                 float( self.rttmax[ pos ] ), dev )
+
+    def reachable( self, src, dst ):
+        "Did any probe from src to dst get a reply?"
+        return self.received[ self.pos( src, dst ) ] > 0
+
+    def pairs( self ):
+        "Return (src, dst) for all distinct pairs, in row order"
+        return [ ( src, dst ) for src in self.srcs for dst in self.dsts
+                 if src != dst ]
+
+    def totals( self ):
+        "Return total packets sent and received"
+        return int( sum( self.sent ) ), int( sum( self.received ) )
+
+    def ploss( self ):
+        "Return packet loss percentage, or None if no packets were sent"
+        sent, received = self.totals()
+        return 100.0 * ( sent - received ) / sent if sent else None
+
+    def _matrix( self, values ):
+        "Return values as a 2D numpy array or list of lists"
+        cols = len( self.dsts )
+        if numpy is not None:
+            return numpy.array( values ).reshape( len( self.srcs ), cols )
+        return [ list( values[ i: i + cols ] )
+                 for i in range( 0, len( values ), cols ) ]
+
+    def lossMatrix( self ):
+        "Return loss fraction for each (src, dst); 1 if nothing was sent"
+        loss = [ 1 - float( r ) / s if s else 1.0
+                 for s, r in zip( self.sent, self.received ) ]
+        return self._matrix( loss )
+
+    def rttMatrix( self ):
+        "Return average RTT (ms) for each (src, dst); -1 if unreachable"
+        rtt = [ float( total ) / r if r else -1.0
+                for total, r in zip( self.rttsum, self.received ) ]
+        return self._matrix( rtt )
+
+
+# ICMP echo probes
+
+ICMP_ECHOREPLY, ICMP_ECHO = 0, 8
+ICMPHDR = struct.Struct( '!BBHHH' )    # type, code, checksum, id, seq
+PROBE = struct.Struct( '!Id' )         # pair position, send time
+
+SOL_RAW = 255
+ICMP_FILTER = 1
+SO_RCVBUFFORCE = 33
+
+def checksum( data ):
+    "Return the internet checksum of data"
+    if len( data ) % 2:
+        data += '\0'
+    total = sum( array( 'H', data ) )
+    total = ( total >> 16 ) + ( total & 0xffff )
+    total += total >> 16
+    return socket.htons( ~total & 0xffff )
+
+def echoRequest( ident, seq, payload ):
+    "Return an ICMP echo request packet"
+    header = ICMPHDR.pack( ICMP_ECHO, 0, 0, ident, seq )
+    csum = checksum( header + payload )
+    return ICMPHDR.pack( ICMP_ECHO, 0, csum, ident, seq ) + payload
+
+def icmpSocket( node, rcvbuf=4 << 20 ):
+    """Return a raw ICMP socket in node's namespace which only receives
+       echo replies, or None if we can't (use startPings() instead)"""
+    # If we can't use netlink in node's namespace (e.g. it is remote
+    # or has netlink disabled), we shouldn't open sockets there either
+    if node.netlink() is None:
+        return None
+    try:
+        sock = nsSocket( node.nsPath(), socket.AF_INET, socket.SOCK_RAW,
+                         socket.IPPROTO_ICMP )
+    except ( OSError, socket.error ) as e:
+        debug( '*** %s: no raw socket (%s), using ping\n' % ( node, e ) )
+        return None
+    sock.setblocking( False )
+    # Every raw ICMP socket sees every ICMP packet in its namespace,
+    # so drop everything but echo replies in the kernel
+    try:
+        sock.setsockopt( SOL_RAW, ICMP_FILTER,
+                         struct.pack( 'I', ~( 1 << ICMP_ECHOREPLY )
+                                      & 0xffffffff ) )
+    except socket.error:
+        pass
+    # With hundreds of destinations, replies can arrive faster than
+    # we read them
+    for opt in SO_RCVBUFFORCE, socket.SO_RCVBUF:
+        try:
+            sock.setsockopt( socket.SOL_SOCKET, opt, rcvbuf )
+            break
+        except socket.error:
+            pass
+    return sock
+
+def _recvReplies( sock, ident, matrix, pending, timeout ):
+    "Read echo replies for ident from sock into matrix"
+    now = time.time()
+    while True:
+        try:
+            data = sock.recv( 2048 )
+        except socket.error as e:
+            if e.errno in ( errno.EAGAIN, errno.EINTR ):
+                return
+            raise
+        ihl = ( ord( data[ 0 ] ) & 0xf ) * 4
+        if len( data ) < ihl + ICMPHDR.size + PROBE.size:
+            continue
+        icmpType, _code, _csum, rid, seq = ICMPHDR.unpack_from( data, ihl )
+        if icmpType != ICMP_ECHOREPLY or rid != ident:
+            continue
+        pos, sendTime = PROBE.unpack_from( data, ihl + ICMPHDR.size )
+        # Ignore duplicates and late replies, as ping -W does
+        if pending.pop( ( pos, seq ), None ) is None:
+            continue
+        rtt = now - sendTime
+        if rtt <= timeout:
+            matrix.addReply( pos, rtt * 1000.0 )
+
+def socketProbes( jobs, matrix, count, timeout, rate ):
+    """Probe from sources with raw sockets
+       jobs: list of ( src, sock, [ ( pos, dstIP ) ] )
+       matrix: ReachMatrix to update
+       count: probes per pair
+       timeout: seconds to wait for each reply
+       rate: max packets/second, or None"""
+    poller = select.poll()
+    fdJob = {}
+    # ICMP ids must be unique within each namespace; base them on our
+    # pid, as ping does, to stay clear of other pingers
+    idents = [ ( os.getpid() + i ) & 0xffff for i in range( len( jobs ) ) ]
+    for ident, ( _src, sock, _dests ) in zip( idents, jobs ):
+        poller.register( sock.fileno(), select.POLLIN )
+        fdJob[ sock.fileno() ] = ( sock, ident )
+    pending = {}
+    gap = 1.0 / rate if rate else 0
+    nextSend = time.time()
+
+    def drain( wait=0 ):
+        "Read any replies which have arrived, waiting up to wait seconds"
+        for fd, _event in poller.poll( int( wait * 1000 ) ):
+            sock, ident = fdJob[ fd ]
+            _recvReplies( sock, ident, matrix, pending, timeout )
+
+    # Send to each source's destinations in turn, interleaving the
+    # sources so that we don't aim all of them at the same host at once
+    longest = max( len( dests ) for _src, _sock, dests in jobs )
+    for seq in range( count ):
+        for d in range( longest ):
+            for i, ( src, sock, dests ) in enumerate( jobs ):
+                if d >= len( dests ):
+                    continue
+                pos, ip = dests[ ( d + i ) % len( dests ) ]
+                if gap:
+                    delay = nextSend - time.time()
+                    if delay > 0:
+                        drain( delay )
+                    nextSend = max( nextSend, time.time() - 1 ) + gap
+                matrix.addSent( pos )
+                for _attempt in range( 100 ):
+                    payload = PROBE.pack( pos, time.time() )
+                    try:
+                        sock.sendto( echoRequest( idents[ i ], seq, payload ),
+                                     ( ip, 0 ) )
+                        pending[ pos, seq ] = True
+                    except socket.error as e:
+                        # Wait for a slow (e.g. shaped) link to drain
+                        if e.errno in ( errno.EAGAIN, errno.ENOBUFS ):
+                            drain( .01 )
+                            continue
+                        # e.g. ENETUNREACH: counts as lost, like ping
+                        debug( '*** %s -> %s: %s\n' % ( src, ip, e ) )
+                    break
+            drain()
+    # Wait for stragglers
+    end = time.time() + timeout
+    while pending and time.time() < end:
+        drain( end - time.time() )
+
+
+def parsePing( pingOutput ):
+    """Parse ping output and return
+       ( sent, received, rttmin, rttavg, rttmax, rttdev )"""
+    errorTuple = ( 1, 0, 0, 0, 0, 0 )
+    if re.search( r'[uU]nreachable', pingOutput ):
+        return errorTuple
+    m = re.search( r'(\d+) packets transmitted, (\d+) received', pingOutput )
+    if m is None:
+        error( '*** Error: could not parse ping output: %s\n' % pingOutput )
+        return errorTuple
+    sent, received = int( m.group( 1 ) ), int( m.group( 2 ) )
+    r = r'rtt min/avg/max/mdev = '
+    r += r'(\d+\.\d+)/(\d+\.\d+)/(\d+\.\d+)/(\d+\.\d+) ms'
+    m = re.search( r, pingOutput )
+    if m is None:
+        return sent, 0, 0, 0, 0, 0
+    return ( sent, received ) + tuple( float( g ) for g in m.groups() )
+
+def startPings( jobs, count, timeout ):
+    """Start one shell per source which runs ping to all of its
+       destinations concurrently
+       jobs: list of ( src, [ ( pos, dstIP ) ] )
+       count: probes per pair
+       timeout: seconds to wait for each reply
+       returns: list of ( src, dests, Popen )"""
+    wait = max( int( math.ceil( timeout ) ), 1 )
+    procs = []
+    for src, dests in jobs:
+        # One line per destination: <ip> <ping output>
+        script = ( 'for ip in %s; do ( echo $ip $(ping -n -c%d -W%d $ip '
+                   '2>&1) ) & done; wait' %
+                   ( ' '.join( ip for _pos, ip in dests ), count, wait ) )
+        procs.append( ( src, dests, src.popen( [ 'sh', '-c', script ] ) ) )
+    return procs
+
+def finishPings( procs, matrix, count ):
+    """Collect output from startPings()
+       procs: list of ( src, dests, Popen )
+       matrix: ReachMatrix to update
+       count: probes per pair"""
+    for src, dests, proc in procs:
+        out, _err = proc.communicate()
+        lines = dict( line.split( ' ', 1 ) for line in out.splitlines()
+                      if ' ' in line )
+        for pos, ip in dests:
+            if ip in lines:
+                matrix.setStats( pos, parsePing( lines[ ip ] ) )
+            else:
+                debug( '*** %s: no ping output for %s\n' % ( src, ip ) )
+                matrix.setStats( pos, ( count, 0, 0, 0, 0, 0 ) )
+
+
+def probe( matrix, pairs=None, count=1, timeout=2.0, rate=None ):
+    """Probe reachability between pairs of nodes concurrently
+       matrix: ReachMatrix to update
+       pairs: list of (src, dst) to probe (matrix.pairs())
+       count: number of echo requests per pair
+       timeout: seconds to wait for each reply
+       rate: max packets/second for raw socket probes, or None;
+             useful for reactive controllers, which may drop
+             packets if too many new flows appear at once
+       returns: matrix"""
+    if pairs is None:
+        pairs = matrix.pairs()
+    bySrc = {}
+    for src, dst in pairs:
+        pos = matrix.pos( src, dst )
+        matrix.clear( pos )
+        # As before, destinations without interfaces aren't tested
+        if dst.intfs and dst.IP():
+            bySrc.setdefault( src, [] ).append( ( pos, dst.IP() ) )
+    sockJobs, pingJobs = [], []
+    try:
+        for src in sorted( bySrc, key=matrix.srcIndex.get ):
+            sock = icmpSocket( src )
+            if sock:
+                sockJobs.append( ( src, sock, bySrc[ src ] ) )
+            else:
+                pingJobs.append( ( src, bySrc[ src ] ) )
+        # Run the shells while we send from the sockets
+        procs = startPings( pingJobs, count, timeout )
+        if sockJobs:
+            socketProbes( sockJobs, matrix, count, timeout, rate )
+        finishPings( procs, matrix, count )
+    finally:
+        for _src, sock, _dests in sockJobs:
+            sock.close()
+    return matrix
+
+def reachMatrix( srcs, dsts=None, **kwargs ):
+    """Probe from all srcs to all dsts and return a ReachMatrix
+       srcs: source nodes
+       dsts: destination nodes (srcs)
+       kwargs: options for probe()"""
+    return probe( ReachMatrix( srcs, dsts ), **kwargs )
+
+
+class ReachCache( object ):
+    """Cached reachability results for a network, and the (src, dst)
+       pairs which have to be probed again since they were measured"""
+
+    def __init__( self, net, conservative=False ):
+        """net: Mininet network
+           conservative: mark a changed link's whole component dirty,
+             rather than only pairs with shortest paths across it"""
+        self.net = net
+        self.conservative = conservative
+        self.matrix = None
+        self.dirty = set()
+        self.adjacency, self.linkCount = None, 0
+        self.distances = {}  # start: hops( start ), for this adjacency
+
+    def neighbors( self ):
+        "Return (cached) node -> set of neighbors for net's links"
+        if self.adjacency is None or self.linkCount != len( self.net.links ):
+            adjacency = {}
+            for link in self.net.links:
+                node1, node2 = link.intf1.node, link.intf2.node
+                adjacency.setdefault( node1, set() ).add( node2 )
+                adjacency.setdefault( node2, set() ).add( node1 )
+            self.adjacency = adjacency
+            self.linkCount = len( self.net.links )
+            self.distances = {}
+        return self.adjacency
+
+    def hops( self, start ):
+        "Return (cached) hop counts from start to every node connected to it"
+        neighbors = self.neighbors()
+        if start in self.distances:
+            return self.distances[ start ]
+        hops, frontier = { start: 0 }, [ start ]
+        while frontier:
+            nextFrontier = []
+            for node in frontier:
+                for neighbor in neighbors.get( node, () ):
+                    if neighbor not in hops:
+                        hops[ neighbor ] = hops[ node ] + 1
+                        nextFrontier.append( neighbor )
+            frontier = nextFrontier
+        self.distances[ start ] = hops
+        return hops
+
+    def update( self, matrix ):
+        "Use matrix, which covers all of net's hosts, as our results"
+        self.matrix = matrix
+        self.dirty.clear()
+
+    def linkChanged( self, link ):
+        """Mark pairs whose traffic might cross link as dirty: those
+           with a shortest path across link (all of the pairs it
+           separates, if it is a bridge), or if we are conservative,
+           every pair in link's connected component; other components
+           can't be affected"""
+        if self.matrix is None:
+            return
+        node1, node2 = link.intf1.node, link.intf2.node
+        # Both ends of link are in the same component
+        hops1, hops2 = self.hops( node1 ), self.hops( node2 )
+        hosts = [ host for host in self.matrix.srcs if host in hops1 ]
+        for src in hosts:
+            hops = self.hops( src ) if not self.conservative else None
+            for dst in hosts:
+                if src == dst:
+                    continue
+                if ( self.conservative or
+                     hops1[ src ] + 1 + hops2[ dst ] == hops[ dst ] or
+                     hops2[ src ] + 1 + hops1[ dst ] == hops[ dst ] ):
+                    self.dirty.add( ( src, dst ) )
+
+    def invalidate( self, nodes=None ):
+        """Mark pairs involving nodes as dirty
+           nodes: hosts, or other nodes whose links should be treated
+             as changed; None for all pairs (e.g. after a controller
+             change)"""
+        if self.matrix is None:
+            return
+        if nodes is None:
+            self.dirty.update( self.matrix.pairs() )
+            return
+        for node in nodes:
+            if node in self.matrix.srcIndex:
+                for other in self.matrix.srcs:
+                    if other != node:
+                        self.dirty.add( ( node, other ) )
+                        self.dirty.add( ( other, node ) )
+            else:
+                for link in self.net.links:
+                    if node in ( link.intf1.node, link.intf2.node ):
+                        self.linkChanged( link )
+
+    def verify( self, **kwargs ):
+        """Probe dirty pairs, or all pairs if we have no results for
+           the network's current hosts
+           kwargs: options for probe()
+           returns: ReachMatrix, number of pairs probed"""
+        hosts = self.net.hosts
+        if self.matrix is None or self.matrix.srcs != hosts:
+            matrix = reachMatrix( hosts, **kwargs )
+            self.update( matrix )
+            return matrix, len( matrix.pairs() )
+        pairs = sorted( self.dirty, key=lambda pair: self.matrix.pos( *pair ) )
+        if pairs:
+            probe( self.matrix, pairs, **kwargs )
+        self.dirty.clear()
+        return self.matrix, len( pairs )
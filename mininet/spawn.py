@@ -0,0 +1,109 @@
+"""
+spawn.py: cheap process creation for node shells
+
+subprocess.Popen() forks the Mininet process and then waits for the
+child to exec. fork() has to copy our page tables, so every node we add
+makes adding the next one slower; with thousands of nodes, creating the
+shells dominates startup time.
+
+posix_spawnp() (via vfork/CLONE_VM in glibc) shares our memory with the
+child until it execs, so its cost does not depend on our size. spawn()
+starts a process with its stdio on a given descriptor (e.g. a pty) and
+returns a Spawned object which supports the subset of the Popen API
+that Mininet uses for shells.
+
+Together with Node.startShell() not waiting for the shell prompt (see
+Node.waitStarted() and Mininet.waitStarted()), this lets all of the
+shells of a large network start concurrently.
+"""
+
+import os
+import ctypes
+import signal
+
+from mininet.netlink import _libc
+from mininet.timing import phaseTimer
+
+
+class Spawned( object ):
+    "Popen-like object for a process started by spawn()"
+
+    def __init__( self, pid ):
+        self.pid = pid
+        self.returncode = None
+
+    def _status( self, status ):
+        "Set returncode from waitpid() status, as Popen does"
+        if os.WIFSIGNALED( status ):
+            self.returncode = -os.WTERMSIG( status )
+        else:
+            self.returncode = os.WEXITSTATUS( status )
+
+    def poll( self ):
+        "Return returncode, or None if process is still running"
+        if self.returncode is None:
+            try:
+                pid, status = os.waitpid( self.pid, os.WNOHANG )
+                if pid == self.pid:
+                    self._status( status )
+            except OSError:
+                # Already reaped
+                self.returncode = 0
+        return self.returncode
+
+    def wait( self ):
+        "Wait for process to exit and return returncode"
+        if self.returncode is None:
+            try:
+                _pid, status = os.waitpid( self.pid, 0 )
+                self._status( status )
+            except OSError:
+                self.returncode = 0
+        return self.returncode
+
+    def send_signal( self, sig ):
+        "Send a signal to the process"
+        os.kill( self.pid, sig )
+
+    def terminate( self ):
+        "Send SIGTERM"
+        self.send_signal( signal.SIGTERM )
+
+    def kill( self ):
+        "Send SIGKILL"
+        self.send_signal( signal.SIGKILL )
+
+
+def _strings( strs ):
+    "Return a NULL-terminated C array of strings"
+    return ( ctypes.c_char_p * ( len( strs ) + 1 ) )( *( strs + [ None ] ) )
+
+
+def spawn( cmd, fd ):
+    """Start a process with stdin, stdout and stderr on fd
+       cmd: command and arguments (list)
+       fd: file descriptor for stdio
+       returns: Spawned object, or None if posix_spawnp() is unavailable
+       raises OSError if the command could not be run"""
+    try:
+        libc = _libc()
+        spawnp = libc.posix_spawnp
+    except ( OSError, AttributeError ):
+        return None
+    # posix_spawn_file_actions_t is opaque; this is plenty of space
+    actions = ctypes.create_string_buffer( 256 )
+    libc.posix_spawn_file_actions_init( actions )
+    try:
+        for target in 0, 1, 2:
+            libc.posix_spawn_file_actions_adddup2( actions, fd, target )
+        pid = ctypes.c_int()
+        env = [ '%s=%s' % item for item in os.environ.iteritems() ]
+        err = spawnp( ctypes.byref( pid ), cmd[ 0 ], actions, None,
+                      _strings( [ str( arg ) for arg in cmd ] ),
+                      _strings( env ) )
+    finally:
+        libc.posix_spawn_file_actions_destroy( actions )
+    if err:
+        raise OSError( err, '%s: %s' % ( cmd[ 0 ], os.strerror( err ) ) )
+    phaseTimer.countSpawned()
+    return Spawned( pid.value )
@@ -0,0 +1,573 @@
+"""
+stats.py: interface and qdisc counter sampling for Mininet
+
+Reading counters with ifconfig costs a fork/exec per interface, which
+adds up to seconds per sample for a network with thousands of ports.
+IntfSampler instead reads every interface in a namespace at once, with
+one netlink RTM_GETLINK dump (IFLA_STATS64) per namespace, so a sample
+of a whole network costs one dump for the root namespace (switches)
+plus one per host.
+
+Nodes that can't use netlink in-process (e.g. remote nodes) fall back
+to a single read of /proc/net/dev per node.
+
+Samples are kept in a ring buffer, preallocated when the sampler is
+created, of samples x interfaces x counters (a numpy array if numpy is
+available), so that a long-running sampler doesn't allocate memory or
+grow without bound. rates() computes per-second rates between any two
+samples in the ring.
+
+CgroupSampler does the same for nodes in cgroups (e.g. CPULimitedHost),
+keeping each node's cgroup files (cpuacct.usage, cpu.stat, memory and
+blkio, or their cgroup v2 equivalents) open and re-reading them, so
+that we can see each host's CPU use and whether it was throttled.
+
+QdiscSampler records the statistics of the qdiscs that TCIntf sets up
+(htb/hfsc/tbf 5:, red 6:, netem 10:): bytes, packets, backlog, drops,
+overlimits and, for red with ECN, marks. It reads all of a namespace's
+qdiscs with one RTM_GETQDISC dump, which is cheap enough to sample
+every 10ms or faster, and keeps a time series for each qdisc that can
+be written out with writeCSV() or writeParquet().
+"""
+
+import os
+import csv
+import threading
+from time import time
+from array import array
+
+from mininet.log import debug, warn
+from mininet.util import numCores
+from mininet.netlink import RtNetlink, LINK_STATS, QDISC_STATS
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def parseProcNetDev( text ):
+    """Parse /proc/net/dev
+       returns: { intf name: tuple of LINK_STATS counters }"""
+    stats = {}
+    for line in text.splitlines()[ 2: ]:
+        name, _sep, counters = line.partition( ':' )
+        fields = [ int( f ) for f in counters.split() ]
+        if len( fields ) < 16:
+            continue
+        rx, tx = fields[ :8 ], fields[ 8: ]
+        # bytes packets errs drop ... for each direction
+        stats[ name.strip() ] = ( rx[ 1 ], tx[ 1 ], rx[ 0 ], tx[ 0 ],
+                                  rx[ 2 ], tx[ 2 ], rx[ 3 ], tx[ 3 ] )
+    return stats
+
+def intfCounters( intf ):
+    """Read one interface's counters
+       returns: dict of LINK_STATS counters"""
+    nl = intf.netlink()
+    if nl:
+        values = nl.getLink( intf.name )[ 'stats' ]
+    else:
+        values = parseProcNetDev( intf.cmd( 'cat /proc/net/dev' ) ).get(
+            intf.name )
+    if values is None:
+        raise Exception( 'No counters for interface %s' % intf )
+    return dict( zip( LINK_STATS, values ) )
+
+
+class PeriodicSampler( object ):
+    "Base class: call sample() every interval in a background thread"
+
+    def __init__( self, interval ):
+        "interval: seconds between samples"
+        self.interval = interval
+        self.count = 0  # samples taken so far
+        self.missed = 0  # samples skipped because we fell behind
+        self.thread, self.stopped = None, threading.Event()
+
+    def sample( self ):
+        "Take one sample; override in subclasses"
+        raise NotImplementedError
+
+    def close( self ):
+        "Release resources after stopping; override in subclasses"
+        pass
+
+    def _run( self ):
+        "Internal method: sample every interval until stopped"
+        start = time()
+        n = 0
+        while not self.stopped.is_set():
+            self.sample()
+            n += 1
+            # Keep to absolute deadlines, skipping any we missed
+            now = time()
+            due = start + n * self.interval
+            if due < now:
+                behind = int( ( now - due ) / self.interval ) + 1
+                self.missed += behind
+                n += behind
+                due = start + n * self.interval
+            self.stopped.wait( due - now )
+
+    def start( self ):
+        "Start sampling every interval in a background thread"
+        if self.thread:
+            return
+        self.stopped.clear()
+        self.thread = threading.Thread( target=self._run,
+                                        name=self.__class__.__name__ )
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop( self ):
+        "Stop sampling and release resources"
+        if self.thread:
+            self.stopped.set()
+            self.thread.join()
+            self.thread = None
+        if self.missed:
+            warn( '*** %s: missed %d of %d samples\n' %
+                  ( self.__class__.__name__, self.missed,
+                    self.count + self.missed ) )
+        self.close()
+
+
+class RingSampler( PeriodicSampler ):
+    """Base class: keep samples of counters for a list of keys (e.g.
+       interfaces) in a preallocated ring buffer"""
+
+    fields = ()  # counter names; set in subclasses
+
+    def __init__( self, keys, interval=1.0, samples=600 ):
+        """keys: objects whose counters we sample
+           interval: seconds between samples when running
+           samples: number of samples to keep"""
+        PeriodicSampler.__init__( self, interval )
+        self.keys = list( keys )
+        self.index = { key: i for i, key in enumerate( self.keys ) }
+        self.samples = samples
+        width = len( self.keys ) * len( self.fields )
+        if numpy is not None:
+            self.times = numpy.zeros( samples )
+            self.data = numpy.zeros( ( samples, len( self.keys ),
+                                       len( self.fields ) ), dtype=int )
+        else:
+            self.times = array( 'd', [ 0 ] ) * samples
+            self.data = array( 'l', [ 0 ] ) * ( samples * width )
+
+    def _row( self, slot, i ):
+        "Internal method: return counters for key i at slot"
+        if numpy is not None:
+            return self.data[ slot, i ]
+        start = ( slot * len( self.keys ) + i ) * len( self.fields )
+        return self.data[ start:start + len( self.fields ) ]
+
+    def _store( self, slot, i, values ):
+        """Internal method: store counters for key i at slot, or
+           repeat its previous counters if values is None"""
+        width = len( self.fields )
+        if values is None:
+            values = ( self._row( ( slot - 1 ) % self.samples, i )
+                       if self.count else ( 0, ) * width )
+        if numpy is not None:
+            self.data[ slot, i ] = values
+        else:
+            start = ( slot * len( self.keys ) + i ) * width
+            self.data[ start:start + width ] = array( 'l', values )
+
+    def _slot( self, back=0 ):
+        """Internal method: return ring slot of the sample taken back
+           samples before the latest, or None"""
+        count = self.count
+        if back >= min( count, self.samples ):
+            return None
+        return ( count - 1 - back ) % self.samples
+
+    def latest( self, key ):
+        """Return key's most recent counters as a dict, or None"""
+        slot = self._slot()
+        if slot is None:
+            return None
+        row = self._row( slot, self.index[ key ] )
+        return dict( zip( self.fields, [ int( v ) for v in row ] ) )
+
+    def rates( self, key=None, window=1 ):
+        """Return per-second counter rates over the last window samples
+           key: key (e.g. interface), or None for all keys
+           returns: dict of counter rates for key, or
+             { key: dict of counter rates }; None if there aren't
+             enough samples yet"""
+        window = min( window, self.count - 1, self.samples - 1 )
+        if window < 1:
+            return None
+        new, old = self._slot(), self._slot( window )
+        elapsed = self.times[ new ] - self.times[ old ]
+        if elapsed <= 0:
+            return None
+        if key is not None:
+            i = self.index[ key ]
+            return dict( zip( self.fields,
+                              [ ( n - o ) / elapsed for n, o in
+                                zip( self._row( new, i ),
+                                     self._row( old, i ) ) ] ) )
+        if numpy is not None:
+            diffs = ( self.data[ new ] - self.data[ old ] ) / elapsed
+            return { key: dict( zip( self.fields, diffs[ i ].tolist() ) )
+                     for i, key in enumerate( self.keys ) }
+        return { key: self.rates( key, window ) for key in self.keys }
+
+    def history( self, key, field ):
+        """Return the samples in the ring for one counter, oldest first
+           returns: list of ( time, value )"""
+        i, f = self.index[ key ], self.fields.index( field )
+        backs = range( min( self.count, self.samples ) - 1, -1, -1 )
+        return [ ( self.times[ slot ], int( self._row( slot, i )[ f ] ) )
+                 for slot in [ self._slot( back ) for back in backs ] ]
+
+
+class IntfSampler( RingSampler ):
+    "Sample the counters of many interfaces into a ring buffer"
+
+    fields = LINK_STATS
+
+    def __init__( self, intfs, interval=1.0, samples=600 ):
+        """intfs: interfaces to sample
+           interval: seconds between samples when running
+           samples: number of samples to keep"""
+        RingSampler.__init__( self, intfs, interval, samples )
+        self.intfs = self.keys
+        self.groups = self._groups()
+
+    def _groups( self ):
+        """Internal method: group intfs so that each namespace is read
+           once per sample
+           returns: list of ( reader, [ ( intf name, index ) ] )"""
+        groups, readers = {}, {}
+        for i, intf in enumerate( self.intfs ):
+            node = intf.node
+            # Our own netlink socket per namespace, since the
+            # node's may be in use by another thread
+            if node.netlink():
+                key = node.nsPath()
+                if key not in readers:
+                    readers[ key ] = self._netlinkReader( RtNetlink( key ) )
+            else:
+                key = node
+                if key not in readers:
+                    readers[ key ] = self._procReader( node )
+            groups.setdefault( key, [] ).append( ( intf.name, i ) )
+        return [ ( readers[ key ], members )
+                 for key, members in groups.iteritems() ]
+
+    @staticmethod
+    def _netlinkReader( nl ):
+        "Internal method: return a function that dumps nl's counters"
+        def read():
+            "Return { name: counters } for nl's namespace"
+            return { link[ 'name' ]: link[ 'stats' ] for link in nl.links()
+                     if link[ 'stats' ] }
+        read.nl = nl
+        return read
+
+    @staticmethod
+    def _procReader( node ):
+        "Internal method: return a function that reads node's counters"
+        def read():
+            "Return { name: counters } for node's namespace"
+            popen = node.popen( 'cat', '/proc/net/dev' )
+            text, _err = popen.communicate()
+            return parseProcNetDev( text )
+        return read
+
+    def sample( self ):
+        """Read all counters now into the next slot of the ring
+           returns: sample time"""
+        slot = self.count % self.samples
+        self.times[ slot ] = time()
+        for read, members in self.groups:
+            try:
+                counters = read()
+            except ( OSError, IOError ) as e:
+                debug( '*** IntfSampler: %s\n' % e )
+                counters = {}
+            # Interfaces that are gone repeat their last counters
+            for name, i in members:
+                self._store( slot, i, counters.get( name ) )
+        self.count += 1
+        return self.times[ slot ]
+
+    def close( self ):
+        "Close our netlink sockets"
+        for read, _members in self.groups:
+            nl = getattr( read, 'nl', None )
+            if nl:
+                nl.close()
+        self.groups = []
+
+    def history( self, intf, field='rxBytes' ):
+        """Return the samples in the ring for one counter, oldest first
+           returns: list of ( time, value )"""
+        return RingSampler.history( self, intf, field )
+
+
+CGROUP_ROOT = '/sys/fs/cgroup'
+
+def _parseCpuStat( text ):
+    "Parse cpu.stat (cgroup v1 or v2) into CgroupSampler fields"
+    stat = dict( line.split() for line in text.splitlines()
+                 if len( line.split() ) == 2 )
+    values = { 'periods': int( stat.get( 'nr_periods', 0 ) ),
+               'throttled': int( stat.get( 'nr_throttled', 0 ) ) }
+    if 'throttled_time' in stat:
+        values[ 'throttledNs' ] = int( stat[ 'throttled_time' ] )
+    else:
+        values[ 'throttledNs' ] = int( stat.get( 'throttled_usec',
+                                                 0 ) ) * 1000
+    if 'usage_usec' in stat:
+        values[ 'cpuNs' ] = int( stat[ 'usage_usec' ] ) * 1000
+    return values
+
+def _parseIoBytes( text ):
+    """Parse blkio.throttle.io_service_bytes (v1) or io.stat (v2)
+       into total bytes read and written"""
+    total = 0
+    for line in text.splitlines():
+        words = line.split()
+        if words[ :1 ] == [ 'Total' ]:
+            return { 'ioBytes': int( words[ 1 ] ) }
+        for word in words[ 1: ]:
+            key, _sep, value = word.partition( '=' )
+            if key in ( 'rbytes', 'wbytes' ):
+                total += int( value )
+    return { 'ioBytes': total }
+
+def _parseInt( field ):
+    "Return a parser for a file holding a single counter"
+    return lambda text: { field: int( text ) }
+
+
+class CgroupSampler( RingSampler ):
+    """Sample CPU, throttling, memory and I/O counters of nodes in
+       cgroups (e.g. CPULimitedHost) into a ring buffer"""
+
+    fields = ( 'cpuNs', 'periods', 'throttled', 'throttledNs',
+               'memBytes', 'ioBytes' )
+
+    # ( cgroup v1 controller, file, parser ); v2 has no controller dir
+    filesV1 = ( ( 'cpuacct', 'cpuacct.usage', _parseInt( 'cpuNs' ) ),
+                ( 'cpu', 'cpu.stat', _parseCpuStat ),
+                ( 'memory', 'memory.usage_in_bytes',
+                  _parseInt( 'memBytes' ) ),
+                ( 'blkio', 'blkio.throttle.io_service_bytes',
+                  _parseIoBytes ) )
+    filesV2 = ( ( '', 'cpu.stat', _parseCpuStat ),
+                ( '', 'memory.current', _parseInt( 'memBytes' ) ),
+                ( '', 'io.stat', _parseIoBytes ) )
+
+    def __init__( self, nodes, interval=1.0, samples=600,
+                  root=CGROUP_ROOT ):
+        """nodes: nodes with a cgroup attribute (e.g. CPULimitedHost)
+           interval: seconds between samples when running
+           samples: number of samples to keep
+           root: cgroup file system mount point"""
+        nodes = [ node for node in nodes
+                  if getattr( node, 'cgroup', None ) ]
+        RingSampler.__init__( self, nodes, interval, samples )
+        self.nodes = self.keys
+        unified = os.path.exists( os.path.join( root,
+                                                'cgroup.controllers' ) )
+        files = self.filesV2 if unified else self.filesV1
+        # Keep the files open, so each sample is just a read per file
+        self.files = []  # per node: list of ( fd, parser )
+        for node in self.nodes:
+            # e.g. 'cpu,cpuacct,cpuset:/h1' -> '/h1'
+            group = node.cgroup.split( ':' )[ -1 ].lstrip( '/' )
+            opened = []
+            for controller, name, parser in files:
+                path = os.path.join( root, controller, group, name )
+                try:
+                    opened.append( ( os.open( path, os.O_RDONLY ),
+                                     parser ) )
+                except OSError:
+                    debug( '*** CgroupSampler: cannot open %s\n' % path )
+            self.files.append( opened )
+
+    def sample( self ):
+        """Read all counters now into the next slot of the ring
+           returns: sample time"""
+        slot = self.count % self.samples
+        self.times[ slot ] = time()
+        for i, opened in enumerate( self.files ):
+            values = {}
+            try:
+                for fd, parser in opened:
+                    os.lseek( fd, 0, os.SEEK_SET )
+                    values.update( parser( os.read( fd, 65536 ) ) )
+            except ( OSError, ValueError ) as e:
+                # The cgroup is gone: repeat its last counters
+                debug( '*** CgroupSampler: %s\n' % e )
+                values = None
+            self._store( slot, i, [ values.get( f, 0 ) for f in self.fields ]
+                         if values is not None else None )
+        self.count += 1
+        return self.times[ slot ]
+
+    def close( self ):
+        "Close our cgroup files"
+        for opened in self.files:
+            for fd, _parser in opened:
+                os.close( fd )
+        self.files = []
+
+    def utilization( self, node=None, window=1 ):
+        """Return CPU use over the last window samples, as a fraction
+           of the whole machine (all cores)
+           node: node, or None for { node: utilization }"""
+        rates = self.rates( node, window )
+        if rates is None:
+            return None
+        if node is not None:
+            return rates[ 'cpuNs' ] / 1e9 / numCores()
+        return { n: r[ 'cpuNs' ] / 1e9 / numCores()
+                 for n, r in rates.iteritems() }
+
+    def throttling( self, node=None, window=1 ):
+        """Return the fraction of CFS periods in which node was
+           throttled over the last window samples
+           node: node, or None for { node: throttling }"""
+        rates = self.rates( node, window )
+        if rates is None:
+            return None
+        if node is not None:
+            rates = { node: rates }
+        throttling = { n: ( r[ 'throttled' ] / r[ 'periods' ]
+                            if r[ 'periods' ] else 0.0 )
+                       for n, r in rates.iteritems() }
+        return throttling[ node ] if node is not None else throttling
+
+    def starved( self, threshold=.5, window=1 ):
+        """Return nodes that were throttled in more than threshold of
+           their CFS periods over the last window samples, i.e. that
+           wanted more CPU than they got. Throughput and timing
+           results from these nodes reflect their CPU limit (or an
+           oversubscribed machine) rather than the network.
+           returns: list of nodes"""
+        throttling = self.throttling( window=window ) or {}
+        return [ node for node in self.nodes
+                 if throttling.get( node, 0 ) > threshold ]
+
+
+def handleStr( handle ):
+    "Format a qdisc handle as tc does (e.g. 5:, 10:)"
+    return '%x:' % ( handle >> 16 )
+
+
+class QdiscSampler( PeriodicSampler ):
+    """Record statistics (backlog, drops, ECN marks...) of the qdiscs
+       on TCIntfs, as a time series for each qdisc"""
+
+    fields = QDISC_STATS
+
+    def __init__( self, intfs, interval=.01 ):
+        """intfs: interfaces whose qdiscs we sample
+           interval: seconds between samples when running"""
+        PeriodicSampler.__init__( self, interval )
+        self.intfs = list( intfs )
+        # { ( intf, handle ): ( kind, times, counters ) }
+        self.series = {}
+        self.namespaces = []  # ( RtNetlink, { ifindex: intf } )
+        byNs = {}
+        for intf in self.intfs:
+            if not intf.node.netlink():
+                warn( '*** QdiscSampler: no netlink for %s, skipping %s\n'
+                      % ( intf.node, intf ) )
+                continue
+            byNs.setdefault( intf.node.nsPath(), [] ).append( intf )
+        for nsPath, nsIntfs in byNs.iteritems():
+            # Our own socket, since the node's may be in use elsewhere
+            nl = RtNetlink( nsPath )
+            names = { intf.name: intf for intf in nsIntfs }
+            indexes = { link[ 'index' ]: names[ link[ 'name' ] ]
+                        for link in nl.links() if link[ 'name' ] in names }
+            self.namespaces.append( ( nl, indexes ) )
+
+    def sample( self ):
+        """Read the qdiscs of every namespace, one dump each
+           returns: sample time"""
+        now = time()
+        for nl, indexes in self.namespaces:
+            try:
+                qdiscs = nl.qdiscs()
+            except ( OSError, IOError ) as e:
+                debug( '*** QdiscSampler: %s\n' % e )
+                continue
+            now = time()
+            for qdisc in qdiscs:
+                intf = indexes.get( qdisc[ 'index' ] )
+                # Skip default qdiscs (handle 0:), which we didn't add
+                if intf is None or not qdisc[ 'handle' ]:
+                    continue
+                key = ( intf, handleStr( qdisc[ 'handle' ] ) )
+                series = self.series.get( key )
+                if series is None or series[ 0 ] != qdisc[ 'kind' ]:
+                    series = self.series[ key ] = (
+                        qdisc[ 'kind' ], array( 'd' ), array( 'l' ) )
+                series[ 1 ].append( now )
+                series[ 2 ].extend( [ qdisc[ f ] for f in self.fields ] )
+        self.count += 1
+        return now
+
+    def close( self ):
+        "Close our netlink sockets"
+        for nl, _indexes in self.namespaces:
+            nl.close()
+        self.namespaces = []
+
+    def timeSeries( self, intf, handle, field='backlog' ):
+        """Return one counter of one qdisc
+           intf: interface
+           handle: qdisc handle (e.g. '5:', '10:')
+           field: counter name (see QDISC_STATS)
+           returns: list of ( time, value )"""
+        _kind, times, counters = self.series[ intf, handle ]
+        f, width = self.fields.index( field ), len( self.fields )
+        return zip( times, counters[ f::width ] )
+
+    def rows( self ):
+        """Return all samples, by time
+           returns: list of ( time, intf name, handle, kind, counters... )"""
+        width = len( self.fields )
+        rows = []
+        for ( intf, handle ), ( kind, times, counters ) in (
+                self.series.iteritems() ):
+            for i, t in enumerate( times ):
+                values = counters[ i * width: ( i + 1 ) * width ]
+                rows.append( ( t, intf.name, handle, kind ) +
+                             tuple( values ) )
+        rows.sort()
+        return rows
+
+    def columns( self ):
+        "Return column names for rows()"
+        return ( 'time', 'intf', 'handle', 'kind' ) + self.fields
+
+    def writeCSV( self, path ):
+        "Write all samples to a CSV file"
+        with open( path, 'w' ) as f:
+            writer = csv.writer( f )
+            writer.writerow( self.columns() )
+            writer.writerows( self.rows() )
+
+    def writeParquet( self, path ):
+        "Write all samples to a Parquet file (requires pyarrow)"
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise Exception( 'writeParquet requires pyarrow' )
+        columns = zip( *self.rows() ) or [ () ] * len( self.columns() )
+        table = pyarrow.Table.from_arrays(
+            [ pyarrow.array( list( column ) ) for column in columns ],
+            names=list( self.columns() ) )
+        pyarrow.parquet.write_table( table, path )
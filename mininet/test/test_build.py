@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+
+"""Package: mininet
+   Test building networks from topologies (Mininet.buildFromTopo),
+   and stopping them (Mininet.stop)"""
+
+import unittest
+import sys
+
+from mininet.net import Mininet
+from mininet.node import Host, LightHost
+from mininet.topo import Topo
+from mininet.link import Intf
+from mininet.log import setLogLevel
+from mininet.clean import cleanup
+
+
+class FailingIntf( Intf ):
+    "Intf which fails to be created while fail is set"
+
+    fail = False
+
+    def __init__( self, name, **params ):
+        if self.fail:
+            raise Exception( 'FailingIntf: %s failed' % name )
+        Intf.__init__( self, name, **params )
+
+
+class ChainTopo( Topo ):
+    "Chain of hosts h1 - h2 - ... hN; the first link uses FailingIntf"
+
+    def build( self, n=4 ):
+        hosts = [ self.addHost( 'h%d' % i ) for i in range( 1, n + 1 ) ]
+        for i, ( src, dst ) in enumerate( zip( hosts, hosts[ 1: ] ) ):
+            if i == 0:
+                self.addLink( src, dst, intf=FailingIntf )
+            else:
+                self.addLink( src, dst )
+
+
+class MeshTopo( Topo ):
+    "Hosts linked to every other host, with some parallel links"
+
+    def build( self, n=6 ):
+        hosts = [ self.addHost( 'h%d' % i ) for i in range( 1, n + 1 ) ]
+        for i, src in enumerate( hosts ):
+            for dst in hosts[ i + 1: ]:
+                self.addLink( src, dst )
+        self.addLink( hosts[ 0 ], hosts[ 1 ] )
+
+
+class testBuild( unittest.TestCase ):
+    "Verify building from a topology"
+
+    @staticmethod
+    def tearDown():
+        "Clean up if necessary"
+        FailingIntf.fail = False
+        if sys.exc_info != ( None, None, None ):
+            cleanup()
+
+    def testRebuildAfterFailure( self ):
+        "A build that fails partway should not affect the next build"
+        FailingIntf.fail = True
+        net = Mininet( topo=ChainTopo(), controller=None, build=False )
+        self.assertRaises( Exception, net.build )
+        net.stop()
+        FailingIntf.fail = False
+        # The pairs made in bulk for the other links should not stop
+        # addLink() from making them again
+        net = Mininet( controller=None )
+        h2, h3 = net.addHost( 'h2' ), net.addHost( 'h3' )
+        net.addLink( h2, h3, port1=1, port2=0 )
+        self.assertIn( 'h2-eth1@', h2.cmd( 'ip link show' ) )
+        self.assertIn( 'h3-eth0@', h3.cmd( 'ip link show' ) )
+        net.stop()
+        net = Mininet( topo=ChainTopo(), controller=None )
+        for name, intfs in ( ( 'h1', [ 'h1-eth0' ] ),
+                             ( 'h2', [ 'h2-eth0', 'h2-eth1' ] ),
+                             ( 'h3', [ 'h3-eth0', 'h3-eth1' ] ),
+                             ( 'h4', [ 'h4-eth0' ] ) ):
+            self.assertEqual( net[ name ].intfNames(), intfs )
+            output = net[ name ].cmd( 'ip link show' )
+            for intf in intfs:
+                self.assertIn( intf + '@', output )
+        net.stop()
+
+    @staticmethod
+    def describe( net ):
+        """Return the links, interfaces and addresses of net (MACs
+           other than the default interfaces' are random)
+           returns: ( links, { node: ( mac, [ ( intf, ip ) ] ) } )"""
+        links = [ str( link ) for link in net.links ]
+        intfs = {}
+        for node in net.hosts:
+            intfs[ node.name ] = ( node.MAC(),
+                                   [ ( name, node.intf( name ).IP() )
+                                     for name in node.intfNames() ] )
+            # What the kernel has should match
+            output = node.cmd( 'ip link show' )
+            for name in node.intfNames():
+                assert name + '@' in output, name
+        return links, intfs
+
+    def testWorkers( self ):
+        "Building with several workers should give the same network"
+        results = []
+        for workers in 1, 4:
+            net = Mininet( topo=MeshTopo(), controller=None,
+                           autoSetMacs=True, workers=workers )
+            results.append( self.describe( net ) )
+            net.stop()
+        self.assertEqual( len( results[ 0 ][ 0 ] ), 16 )
+        self.assertEqual( results[ 0 ], results[ 1 ] )
+
+
+class testStop( unittest.TestCase ):
+    "Verify that stopping a network leaves others running"
+
+    hostClass = Host  # overridden in subclasses
+
+    @staticmethod
+    def tearDown():
+        "Clean up if necessary"
+        if sys.exc_info != ( None, None, None ):
+            cleanup()
+
+    def makeNet( self, *names ):
+        "Return a network of hosts in a chain"
+        net = Mininet( host=self.hostClass, controller=None )
+        hosts = [ net.addHost( name ) for name in names ]
+        for src, dst in zip( hosts, hosts[ 1: ] ):
+            net.addLink( src, dst )
+        net.build()
+        return net
+
+    def testStopOne( self ):
+        "The other network should still be reachable after stop()"
+        net1 = self.makeNet( 'h1', 'h2' )
+        net2 = self.makeNet( 'h3', 'h4' )
+        h3, h4 = net2.hosts
+        matrix = net2.pingMatrix( timeout=.5 )
+        self.assertTrue( matrix.reachable( h3, h4 ) )
+        net1.stop()
+        self.assertIn( 'h3-eth0@', h3.cmd( 'ip link show' ) )
+        matrix = net2.pingMatrix( timeout=.5 )
+        self.assertTrue( matrix.reachable( h3, h4 ) )
+        self.assertTrue( matrix.reachable( h4, h3 ) )
+        net2.stop()
+
+
+class testStopLight( testStop ):
+    "Verify stopping networks of shell-less hosts"
+    hostClass = LightHost
+
+
+if __name__ == '__main__':
+    setLogLevel( 'warning' )
+    unittest.main()
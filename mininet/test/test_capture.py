@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+
+"""Package: mininet
+   Test in-process packet capture (mininet.capture)"""
+
+import unittest
+import sys
+import os
+import shutil
+import struct
+import tempfile
+
+from mininet.net import Mininet
+from mininet.log import setLogLevel
+from mininet.clean import cleanup
+from mininet.capture import PcapWriter
+
+# ldh [12]; jeq #0x800, L2, L5; ldb [23]; jeq #1, L4, L5; ret; ret #0
+ICMP = [ ( 0x28, 0, 0, 12 ), ( 0x15, 0, 3, 0x800 ), ( 0x30, 0, 0, 23 ),
+         ( 0x15, 0, 1, 1 ), ( 0x6, 0, 0, 65535 ), ( 0x6, 0, 0, 0 ) ]
+
+
+class testCapture( unittest.TestCase ):
+    "Capture packets between a pair of linked hosts"
+
+    @staticmethod
+    def tearDown():
+        "Clean up if necessary"
+        if sys.exc_info != ( None, None, None ):
+            cleanup()
+
+    def setUp( self ):
+        "Create a pair of linked hosts"
+        self.net = Mininet( controller=None )
+        self.h1 = self.net.addHost( 'h1' )
+        self.h2 = self.net.addHost( 'h2' )
+        self.net.addLink( self.h1, self.h2 )
+        self.net.build()
+
+    def testFilter( self ):
+        "We should see exactly the ICMP packets, with snaplen applied"
+        cap = self.h1.capture( self.h1.defaultIntf(), bpf=ICMP,
+                               timeoutMs=10 )
+        self.net.pingMatrix( count=3 )
+        packets = list( cap.packets( timeout=.5 ) )
+        self.assertEqual( len( packets ), 12 )
+        self.assertEqual( cap.stats(), ( 12, 0 ) )
+        for ( sec, nsec ), _length, _data in packets:
+            self.assertTrue( isinstance( sec, ( int, long ) ) )
+            self.assertTrue( 0 <= nsec < 1000000000 )
+        cap.close()
+        cap = self.h1.capture( snaplen=40, timeoutMs=10 )
+        self.net.pingMatrix( count=1 )
+        packets = list( cap.packets( timeout=.5 ) )
+        self.assertTrue( all( len( data ) <= 40 < length
+                              for _t, length, data in packets ) )
+        cap.close()
+        self.net.stop()
+
+    def testPcap( self ):
+        "Pcap files should be rotated and well formed"
+        tmpdir = tempfile.mkdtemp()
+        path = os.path.join( tmpdir, 'test.pcap' )
+        writer = PcapWriter( path, maxBytes=1000, maxFiles=2 )
+        for i in range( 30 ):
+            writer.write( ( 1000 + i, 999999999 ), 150, 'x' * 100 )
+        writer.close()
+        self.assertEqual( sorted( os.listdir( tmpdir ) ),
+                          [ 'test.pcap', 'test.pcap.1' ] )
+        with open( path, 'rb' ) as f:
+            header, record = f.read( 24 ), f.read( 16 )
+        self.assertEqual( struct.unpack( '=IHHiIII', header )[ 0 ],
+                          PcapWriter.MAGIC_NSEC )
+        # The current file starts at the 25th packet, and timestamps
+        # should keep every nanosecond
+        self.assertEqual( struct.unpack( '=IIII', record ),
+                          ( 1024, 999999999, 100, 150 ) )
+        shutil.rmtree( tmpdir )
+        self.net.stop()
+
+
+if __name__ == '__main__':
+    setLogLevel( 'warning' )
+    unittest.main()
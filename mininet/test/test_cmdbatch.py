@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+
+"""Package: mininet
+   Test batched shell commands (Node.cmdBatch) and their use in
+   Node.configDefault()"""
+
+import unittest
+import sys
+
+from mininet.net import Mininet
+from mininet.node import Node, Host
+from mininet.log import setLogLevel
+from mininet.clean import cleanup
+
+
+class ShellHost( Host ):
+    """Host which configures its interfaces using the shell, and
+       records what cmd() returns in its own config()"""
+
+    useNetlink = False
+
+    def config( self, **params ):
+        r = Host.config( self, **params )
+        self.configOutput = self.cmd( 'echo configured' )
+        return r
+
+
+class testCmdBatch( unittest.TestCase ):
+    "Verify the outputs of batched commands"
+
+    @staticmethod
+    def tearDown():
+        "Clean up if necessary"
+        if sys.exc_info != ( None, None, None ):
+            cleanup()
+
+    def setUp( self ):
+        self.node = Node( 'n0' )
+
+    def testOutputs( self ):
+        "Each command's output should be returned separately"
+        outputs = self.node.cmdBatch( [ 'echo a', 'true', 'printf "b\\nc"',
+                                        [ 'echo', 'd', 'e' ], '' ] )
+        self.assertEqual( outputs, [ 'a\r\n', '', 'b\r\nc', 'd e\r\n', '' ] )
+        self.node.terminate()
+
+    def testSplitBatch( self ):
+        "A batch longer than batchMax should be split into several lines"
+        self.node.batchMax = 50
+        cmds = [ 'echo %d' % i for i in range( 20 ) ]
+        outputs = self.node.cmdBatch( cmds )
+        self.assertEqual( outputs, [ '%d\r\n' % i for i in range( 20 ) ] )
+        self.node.terminate()
+
+    def testErrors( self ):
+        "Errors should be reported in the output of the failing command"
+        outputs = self.node.cmdBatch( [ 'echo a', 'ls /nonexistent',
+                                        'false', 'echo b' ] )
+        self.assertEqual( outputs[ 0 ], 'a\r\n' )
+        self.assertIn( 'No such file', outputs[ 1 ] )
+        self.assertEqual( outputs[ 2: ], [ '', 'b\r\n' ] )
+        # Our shell should still be usable
+        self.assertEqual( self.node.cmd( 'echo c' ), 'c\r\n' )
+        self.node.terminate()
+
+    def testQueue( self ):
+        "Queued commands should run as one batch"
+        self.node.queueCmds()
+        self.assertEqual( self.node.cmd( 'echo a' ), '' )
+        self.node.cmd( 'ls /nonexistent' )
+        outputs = self.node.runQueuedCmds()
+        self.assertEqual( outputs[ 0 ], 'a\r\n' )
+        self.assertIn( 'No such file', outputs[ 1 ] )
+        self.assertEqual( self.node.cmd( 'echo b' ), 'b\r\n' )
+        self.node.terminate()
+
+
+class testConfigDefault( unittest.TestCase ):
+    "Verify configDefault() with shell configuration"
+
+    @staticmethod
+    def tearDown():
+        "Clean up if necessary"
+        if sys.exc_info != ( None, None, None ):
+            cleanup()
+
+    def testConfig( self ):
+        "cmd() in config() should run at once, and errors be returned"
+        net = Mininet( host=ShellHost, controller=None )
+        h1, h2 = net.addHost( 'h1' ), net.addHost( 'h2' )
+        net.addLink( h1, h2 )
+        net.build()
+        self.assertEqual( h1.configOutput, 'configured\r\n' )
+        self.assertIn( h1.MAC(), h1.cmd( 'ip link show h1-eth0' ) )
+        self.assertIn( h1.IP(), h1.cmd( 'ip addr show h1-eth0' ) )
+        # An invalid route should be reported in the config() results
+        r = h1.config( defaultRoute='dev nonexistent' )
+        self.assertIn( 'nonexistent', r[ 'defaultRoute' ] )
+        net.stop()
+
+
+if __name__ == '__main__':
+    setLogLevel( 'warning' )
+    unittest.main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+
+"""Package: mininet
+   Test one-way delay measurement (mininet.delay)"""
+
+import unittest
+import sys
+
+from mininet.net import Mininet
+from mininet.log import setLogLevel
+from mininet.clean import cleanup
+from mininet.delay import Histogram
+
+
+class testHistogram( unittest.TestCase ):
+    "Check histogram precision and percentiles"
+
+    def testPrecision( self ):
+        "Values should land in buckets within the relative error"
+        hist = Histogram( subBits=7 )
+        for value in 0, 1, 127, 128, 255, 256, 1000, 123456789:
+            index = hist.index( value )
+            low, high = hist.lowest( index ), hist.lowest( index + 1 )
+            self.assertTrue( low <= value < high )
+            self.assertTrue( high - low <= max( 1, value / 64 ) )
+
+    def testPercentiles( self ):
+        "Percentiles should be within the histogram's precision"
+        hist = Histogram()
+        for value in range( 1, 10001 ):
+            hist.record( value * 1000 )
+        self.assertEqual( hist.min, 1000 )
+        self.assertEqual( hist.max, 10000000 )
+        self.assertAlmostEqual( hist.percentile( 50 ) / 5e6, 1, places=1 )
+        self.assertAlmostEqual( hist.percentile( 99 ) / 9.9e6, 1, places=1 )
+        self.assertEqual( hist.percentile( 100 ), hist.max )
+        other = Histogram()
+        other.record( 20000000 )
+        hist.merge( other )
+        self.assertEqual( ( hist.total, hist.max ), ( 10001, 20000000 ) )
+
+
+class testOneWayDelay( unittest.TestCase ):
+    "Measure delays between a pair of linked hosts"
+
+    @staticmethod
+    def tearDown():
+        "Clean up if necessary"
+        if sys.exc_info != ( None, None, None ):
+            cleanup()
+
+    def testProbes( self ):
+        "Every probe should arrive, with a small positive delay"
+        net = Mininet( controller=None )
+        h1, h2 = net.addHost( 'h1' ), net.addHost( 'h2' )
+        net.addLink( h1, h2 )
+        net.build()
+        results = net.oneWayDelay( rate=100, duration=.5 )
+        net.stop()
+        self.assertEqual( [ ( s.src, s.dst ) for s in results ],
+                          [ ( h1, h2 ), ( h2, h1 ) ] )
+        for stats in results:
+            self.assertEqual( ( stats.sent, stats.received ), ( 50, 50 ) )
+            self.assertTrue( 0 < stats.histogram.min )
+            self.assertTrue( stats.summary()[ 3 ] < 100 )
+
+
+if __name__ == '__main__':
+    setLogLevel( 'warning' )
+    unittest.main()
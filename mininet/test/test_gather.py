@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+
+"""Package: mininet
+   Test running commands on many nodes at once (Mininet.gather)"""
+
+import unittest
+import sys
+from time import time
+
+from mininet.net import Mininet
+from mininet.log import setLogLevel
+from mininet.clean import cleanup
+
+
+class testGather( unittest.TestCase ):
+    "Verify gather() outputs and timing"
+
+    @staticmethod
+    def tearDown():
+        "Clean up if necessary"
+        if sys.exc_info != ( None, None, None ):
+            cleanup()
+
+    def setUp( self ):
+        self.net = Mininet( controller=None )
+        self.hosts = [ self.net.addHost( 'h%d' % i ) for i in range( 1, 7 ) ]
+        self.net.build()
+
+    def testOrder( self ):
+        "Outputs should be in node order, whichever finishes first"
+        nodes = list( reversed( self.hosts ) )
+        # Earlier nodes are slower
+        outputs = self.net.gather(
+            lambda node: 'sleep %.1f; echo %s' % (
+                .1 * ( len( nodes ) - nodes.index( node ) ), node ),
+            nodes=nodes )
+        self.assertEqual( outputs.keys(), nodes )
+        self.assertEqual( [ output.strip() for output in outputs.values() ],
+                          [ node.name for node in nodes ] )
+        self.net.stop()
+
+    def testSlow( self ):
+        "Slow nodes should run concurrently, and time out if need be"
+        h1 = self.hosts[ 0 ]
+        start = time()
+        outputs = self.net.gather( 'sleep .5; echo done', maxActive=3 )
+        # Two rounds of three
+        self.assertTrue( time() - start < 2.5 )
+        self.assertEqual( set( outputs.values() ), set( [ 'done\r\n' ] ) )
+        outputs = self.net.gather(
+            lambda node: 'sleep %d; echo done' % ( 10 if node == h1 else 0 ),
+            timeoutms=1000 )
+        self.assertNotIn( 'done', outputs[ h1 ] )
+        for node in self.hosts[ 1: ]:
+            self.assertEqual( outputs[ node ], 'done\r\n' )
+        # h1 should be usable again
+        self.assertEqual( h1.cmd( 'echo ok' ), 'ok\r\n' )
+        self.net.stop()
+
+
+if __name__ == '__main__':
+    setLogLevel( 'warning' )
+    unittest.main()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+
+"""Package: mininet
+   Test interface configuration via netlink and via the shell."""
+
+import unittest
+import sys
+import os
+import re
+import errno
+
+from mininet.net import Mininet
+from mininet.node import Host, LightHost
+from mininet.netlink import RtNetlink, packAttr, NDA_DST
+from mininet.log import setLogLevel
+from mininet.clean import cleanup
+
+
+class ShellHost( Host ):
+    "Host which always configures its interfaces using the shell"
+    useNetlink = False
+
+
+class testIntfConfigNetlink( unittest.TestCase ):
+    "Verify that interface configuration is visible in the namespace."
+
+    hostClass = Host  # overridden in subclasses
+
+    @staticmethod
+    def tearDown():
+        "Clean up if necessary"
+        if sys.exc_info != ( None, None, None ):
+            cleanup()
+
+    def setUp( self ):
+        "Create a pair of linked hosts"
+        self.net = Mininet( host=self.hostClass, controller=None )
+        self.h1 = self.net.addHost( 'h1' )
+        self.h2 = self.net.addHost( 'h2' )
+        self.net.addLink( self.h1, self.h2 )
+        self.net.configHosts()
+
+    def testSetIP( self ):
+        "setIP() should change the address seen by ip addr"
+        intf = self.h1.defaultIntf()
+        self.assertEqual( intf.setIP( '10.1.2.3', 16 ), '' )
+        self.assertIn( '10.1.2.3/16', self.h1.cmd( 'ip addr show', intf ) )
+        self.assertEqual( intf.updateIP(), '10.1.2.3' )
+        self.net.stop()
+
+    def testSetMAC( self ):
+        "setMAC() should change the MAC seen by ip link"
+        intf = self.h2.defaultIntf()
+        intf.setMAC( '00:00:00:00:12:34' )
+        self.assertIn( '00:00:00:00:12:34',
+                       self.h2.cmd( 'ip link show', intf ) )
+        self.assertEqual( intf.updateMAC(), '00:00:00:00:12:34' )
+        self.assertTrue( intf.isUp() )
+        self.net.stop()
+
+    def testRoutes( self ):
+        "setHostRoute() and setDefaultRoute() should update the routes"
+        intf = self.h1.defaultIntf()
+        self.h1.setHostRoute( '10.9.9.9', intf )
+        self.h1.setDefaultRoute( 'via %s' % self.h2.IP() )
+        routes = self.h1.cmd( 'ip route' )
+        self.assertIn( '10.9.9.9 dev %s' % intf, routes )
+        self.assertIn( 'default via %s' % self.h2.IP(), routes )
+        self.net.stop()
+
+
+class testIntfConfigShell( testIntfConfigNetlink ):
+    "Verify interface configuration using the shell fallback."
+    hostClass = ShellHost
+
+
+class testIntfConfigLight( testIntfConfigNetlink ):
+    "Verify interface configuration of shell-less hosts."
+    hostClass = LightHost
+
+
+class testStaticArp( unittest.TestCase ):
+    "Verify static ARP tables loaded via netlink and via ip -batch."
+
+    hostClass = Host  # overridden in subclasses
+
+    @staticmethod
+    def tearDown():
+        "Clean up if necessary"
+        if sys.exc_info != ( None, None, None ):
+            cleanup()
+
+    def setUp( self ):
+        "Create a chain of hosts on one subnet"
+        self.net = Mininet( host=self.hostClass, controller=None )
+        self.hosts = [ self.net.addHost( 'h%d' % i ) for i in range( 1, 6 ) ]
+        for src, dst in zip( self.hosts, self.hosts[ 1: ] ):
+            self.net.addLink( src, dst )
+        self.net.build()
+
+    def neighs( self, host ):
+        "Return host's permanent neighbor entries as a set of ( ip, mac )"
+        output = host.cmd( 'ip neigh show nud permanent' )
+        return set( re.findall( r'(\S+) dev \S+ lladdr (\S+)', output ) )
+
+    def checkTables( self ):
+        "Each host's table should hold every peer"
+        for host in self.hosts:
+            peers = set( ( peer.IP(), peer.MAC() ) for peer in self.hosts
+                         if peer is not host )
+            self.assertTrue( peers <= self.neighs( host ), host )
+
+    def testStaticArp( self ):
+        "staticArp() should load every peer into each host"
+        self.net.staticArp()
+        self.checkTables()
+        self.net.stop()
+
+    def testShared( self ):
+        "staticArp( shared=True ) should load every peer into each host"
+        self.net.staticArp( shared=True )
+        self.checkTables()
+        self.net.stop()
+
+
+class testStaticArpShell( testStaticArp ):
+    "Verify static ARP tables loaded with ip -batch."
+    hostClass = ShellHost
+
+
+class testAddNeighs( testStaticArp ):
+    "Verify error reporting of RtNetlink.addNeighs()"
+
+    # Only testErrors, not the tests we inherit
+    testStaticArp = testShared = None
+
+    def testErrors( self ):
+        "addNeighs() should return every failed entry"
+        h1 = self.hosts[ 0 ]
+        nl = RtNetlink( h1.nsPath() )
+        packed = RtNetlink.packNeighs( [ ( '10.1.0.%d' % i,
+                                           '00:00:00:00:01:%02d' % i )
+                                         for i in range( 5 ) ] )
+        # Addresses of the wrong length are rejected
+        for i in 1, 3:
+            packed[ i ] = packAttr( NDA_DST, 'abc' )
+        errors = nl.addNeighs( str( h1.defaultIntf() ), packed )
+        nl.close()
+        self.assertEqual( [ i for i, _e in errors ], [ 1, 3 ] )
+        self.assertEqual( [ e.errno for _i, e in errors ],
+                          [ errno.EINVAL, errno.EINVAL ] )
+        added = set( ip for ip, _mac in self.neighs( h1 ) )
+        self.assertEqual( added & set( '10.1.0.%d' % i for i in range( 5 ) ),
+                          set( [ '10.1.0.0', '10.1.0.2', '10.1.0.4' ] ) )
+        self.net.stop()
+
+
+class testLightHostNamespace( unittest.TestCase ):
+    "Verify naming and cleanup of LightHost namespaces."
+
+    @staticmethod
+    def tearDown():
+        "Clean up if necessary"
+        if sys.exc_info != ( None, None, None ):
+            cleanup()
+
+    def testNameClash( self ):
+        "A second LightHost with the same name should fail"
+        h1 = LightHost( 'h1' )
+        self.assertIn( '-%d-' % os.getpid(), h1.nsName )
+        self.assertRaises( Exception, LightHost, 'h1' )
+        # The first host's namespace should still be usable
+        self.assertEqual( h1.cmd( 'echo hello' ).strip(), 'hello' )
+        h1.terminate()
+
+    def testCleanupKeepsLive( self ):
+        "cleanup() should leave the namespaces of a running process"
+        h1 = LightHost( 'h1' )
+        cleanup()
+        self.assertTrue( os.path.exists( h1.nsPath() ) )
+        self.assertIn( 'lo', h1.cmd( 'ip link show' ) )
+        h1.terminate()
+        self.assertFalse( os.path.exists( os.path.join( LightHost.nsDir,
+                                                        'mn-%d-h1' %
+                                                        os.getpid() ) ) )
+
+
+if __name__ == '__main__':
+    setLogLevel( 'warning' )
+    unittest.main()
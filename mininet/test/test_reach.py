@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+
+"""Package: mininet
+   Test concurrent reachability testing (mininet.reach)"""
+
+import unittest
+import sys
+
+from mininet.net import Mininet
+from mininet.node import Host, LightHost
+from mininet.log import setLogLevel
+from mininet.clean import cleanup
+
+
+class testReachMatrix( unittest.TestCase ):
+    "Verify ping results for a chain of hosts h1 - h2 - h3"
+
+    hostClass = Host  # overridden in subclasses
+
+    @staticmethod
+    def tearDown():
+        "Clean up if necessary"
+        if sys.exc_info != ( None, None, None ):
+            cleanup()
+
+    def setUp( self ):
+        "Create h1 - h2 - h3 with no routes between h1 and h3"
+        self.net = Mininet( host=self.hostClass, controller=None )
+        self.hosts = [ self.net.addHost( 'h%d' % i ) for i in 1, 2, 3 ]
+        h1, h2, h3 = self.hosts
+        self.net.addLink( h1, h2 )
+        self.net.addLink( h2, h3 )
+        self.net.build()
+        # h2 is reachable from h3 via h2-eth1 only
+        h2.intf( 'h2-eth1' ).setIP( '10.0.1.1/24' )
+        h3.defaultIntf().setIP( '10.0.1.2/24' )
+
+    def testPingMatrix( self ):
+        "Only directly connected pairs should be reachable"
+        h1, h2, h3 = self.hosts
+        matrix = self.net.pingMatrix( count=2, timeout=.5 )
+        self.assertEqual( matrix.stats( h1, h2 )[ :2 ], ( 2, 2 ) )
+        self.assertEqual( matrix.stats( h2, h3 )[ :2 ], ( 2, 2 ) )
+        self.assertTrue( matrix.reachable( h2, h1 ) )
+        self.assertFalse( matrix.reachable( h1, h3 ) )
+        self.assertFalse( matrix.reachable( h3, h1 ) )
+        loss = matrix.lossMatrix()
+        self.assertEqual( loss[ 0 ][ 1 ], 0 )
+        self.assertEqual( loss[ 0 ][ 2 ], 1 )
+        self.net.stop()
+
+    def testPing( self ):
+        "ping() and pingFull() should report the same results"
+        h1, h2, _h3 = self.hosts
+        self.assertEqual( self.net.ping( [ h1, h2 ], timeout='.5' ), 0 )
+        # h3 can't reach h2's default IP, nor h1 reach h3
+        self.assertEqual( self.net.ping( timeout='.5' ), 50 )
+        results = self.net.pingFull( timeout='.5' )
+        self.assertEqual( len( results ), 6 )
+        received = [ ( src.name, dst.name ) for src, dst, stats in results
+                     if stats[ 1 ] ]
+        self.assertEqual( received, [ ( 'h1', 'h2' ), ( 'h2', 'h1' ),
+                                     ( 'h2', 'h3' ) ] )
+        self.net.stop()
+
+
+    def testVerifyReachability( self ):
+        "Pairs whose paths cross a changed link should be re-probed"
+        h1, h2, h3 = self.hosts
+        h4, h5 = self.net.addHost( 'h4' ), self.net.addHost( 'h5' )
+        self.net.addLink( h4, h5 )
+        h4.configDefault()
+        h5.configDefault()
+        matrix = self.net.pingMatrix( timeout=.5 )
+        self.assertTrue( matrix.reachable( h2, h3 ) )
+        self.assertTrue( matrix.reachable( h4, h5 ) )
+        self.net.configLinkStatus( 'h2', 'h3', 'down' )
+        # h2 - h3 is a bridge: only the pairs it separates are dirty
+        self.assertEqual( self.net.reachCache.dirty,
+                          set( [ ( h1, h3 ), ( h3, h1 ),
+                                 ( h2, h3 ), ( h3, h2 ) ] ) )
+        matrix = self.net.verifyReachability( timeout=.5 )
+        self.assertFalse( matrix.reachable( h2, h3 ) )
+        self.assertTrue( matrix.reachable( h1, h2 ) )
+        self.assertEqual( self.net.reachCache.dirty, set() )
+        # Conservatively, pairs in h4 - h5 are still unaffected
+        self.net.reachCache.conservative = True
+        self.net.configLinkStatus( 'h2', 'h3', 'up' )
+        self.assertEqual( self.net.reachCache.dirty,
+                          set( ( src, dst ) for src in ( h1, h2, h3 )
+                               for dst in ( h1, h2, h3 ) if src != dst ) )
+        matrix = self.net.verifyReachability( timeout=.5 )
+        self.assertTrue( matrix.reachable( h2, h3 ) )
+        self.net.stop()
+
+
+class testReachMatrixLight( testReachMatrix ):
+    "Verify ping results for shell-less hosts."
+    hostClass = LightHost
+
+
+class testReachCache( unittest.TestCase ):
+    """Verify which pairs are re-probed in a connected network: a ring
+       h1 - h2 - h3 - h4 - h1, and h4 - h5"""
+
+    @staticmethod
+    def tearDown():
+        "Clean up if necessary"
+        if sys.exc_info != ( None, None, None ):
+            cleanup()
+
+    @staticmethod
+    def pairs( *names ):
+        "Return both directions of each pair of names"
+        pairs = set()
+        for src, dst in names:
+            pairs.update( [ ( src, dst ), ( dst, src ) ] )
+        return pairs
+
+    def dirty( self ):
+        "Return our cache's dirty pairs, by name"
+        return set( ( src.name, dst.name )
+                    for src, dst in self.net.reachCache.dirty )
+
+    def testChangedLinks( self ):
+        "Only pairs whose shortest paths cross a link should be dirty"
+        self.net = Mininet( controller=None )
+        hosts = [ self.net.addHost( 'h%d' % i ) for i in range( 1, 6 ) ]
+        for src, dst in ( 0, 1 ), ( 1, 2 ), ( 2, 3 ), ( 3, 0 ), ( 3, 4 ):
+            self.net.addLink( hosts[ src ], hosts[ dst ] )
+        self.net.build()
+        self.net.pingMatrix( timeout=.1 )
+        cache = self.net.reachCache
+        self.net.configLinkStatus( 'h1', 'h2', 'down' )
+        self.assertEqual( self.dirty(),
+                          self.pairs( ( 'h1', 'h2' ), ( 'h1', 'h3' ),
+                                      ( 'h2', 'h4' ), ( 'h2', 'h5' ) ) )
+        _matrix, probed = cache.verify( timeout=.1 )
+        self.assertEqual( probed, 8 )
+        # A bridge separates h5 from the rest
+        self.net.configLinkStatus( 'h4', 'h5', 'down' )
+        self.assertEqual( self.dirty(),
+                          self.pairs( *[ ( 'h5', 'h%d' % i )
+                                         for i in range( 1, 5 ) ] ) )
+        cache.dirty.clear()
+        cache.conservative = True
+        self.net.configLinkStatus( 'h1', 'h2', 'up' )
+        _matrix, probed = cache.verify( timeout=.1 )
+        self.assertEqual( probed, 20 )
+        self.net.stop()
+
+
+if __name__ == '__main__':
+    setLogLevel( 'warning' )
+    unittest.main()
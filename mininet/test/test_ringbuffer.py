@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+
+"""Package: mininet
+   Test the ring buffer for node output (mininet.util.RingBuffer)"""
+
+import unittest
+import sys
+import os
+
+from mininet.node import Node
+from mininet.util import RingBuffer
+from mininet.log import setLogLevel
+from mininet.clean import cleanup
+
+
+class testRingBuffer( unittest.TestCase ):
+    "Fill and drain a small ring buffer through a pipe"
+
+    def setUp( self ):
+        "Create a pipe to fill from"
+        self.rfd, self.wfd = os.pipe()
+
+    def tearDown( self ):
+        "Close the pipe"
+        os.close( self.rfd )
+        os.close( self.wfd )
+
+    def fill( self, ring, data ):
+        "Write data to the pipe and read it into ring"
+        os.write( self.wfd, data )
+        return ring.fill( self.rfd, len( data ) )
+
+    def testWraparound( self ):
+        "Data should wrap around the end of the buffer"
+        ring = RingBuffer( 8 )
+        self.assertEqual( self.fill( ring, 'abcdef' ), 6 )
+        self.assertEqual( ring.read( 4 ), 'abcd' )
+        # Only the contiguous space after the data is read into
+        self.assertEqual( self.fill( ring, 'ghijkl' ), 2 )
+        self.assertEqual( ring.fill( self.rfd, 4 ), 4 )
+        self.assertTrue( ring.full() )
+        self.assertEqual( ring.fill( self.rfd, 4 ), 0 )
+        self.assertEqual( ring.read( 8 ), 'efghijkl' )
+        self.assertEqual( len( ring ), 0 )
+
+    def testFindAcrossWrap( self ):
+        "find() should see data on both sides of the wrap"
+        ring = RingBuffer( 8 )
+        self.fill( ring, 'abcdef' )
+        ring.read( 5 )
+        self.fill( ring, 'gh' )
+        self.fill( ring, 'i\njk' )
+        self.assertEqual( ring.find( '\n' ), 4 )
+        self.assertEqual( ring.find( 'h' ), 2 )
+        self.assertEqual( ring.find( 'z' ), -1 )
+        # Starting at an offset, on either side of the wrap
+        self.assertEqual( ring.find( 'h', 1 ), 2 )
+        self.assertEqual( ring.find( 'h', 3 ), -1 )
+        self.assertEqual( ring.find( 'j', 4 ), 5 )
+        self.assertEqual( ring.read( 5 ), 'fghi\n' )
+
+
+class testReadline( unittest.TestCase ):
+    "Read an over-long line from a node's shell"
+
+    @staticmethod
+    def tearDown():
+        "Clean up if necessary"
+        if sys.exc_info != ( None, None, None ):
+            cleanup()
+
+    def testLongLine( self ):
+        "A line longer than the buffer should be returned in pieces"
+        node = Node( 'n0' )
+        size = len( node.readbuf.buf )
+        # Wait for the shell to start and settle
+        node.cmd( 'true' )
+        node.write( "printf '%%0%dd\\n' 0\n" % ( size + 100 ) )
+        pieces = []
+        while sum( len( piece ) for piece in pieces ) < size + 100:
+            node.waitReadable( 1000 )
+            line = node.readline()
+            if line:
+                pieces.append( line )
+            # Retention is bounded by the buffer
+            self.assertTrue( len( node.readbuf ) <= size )
+        # The shell's pty ends lines with \r\n
+        self.assertEqual( pieces, [ '0' * size, '0' * 100 + '\r' ] )
+        node.terminate()
+
+    def testSplitMarker( self ):
+        "A PID marker that arrives in pieces should be waited for"
+        node = Node( 'n0' )
+        node.cmd( 'true' )
+        node.sendCmd( "printf 'a\\001'; sleep .5; printf '42\\nb\\n'" )
+        # What precedes the marker is returned when we time out
+        self.assertEqual( node.monitor( timeoutms=200 ), 'a' )
+        self.assertTrue( node.waiting )
+        self.assertEqual( node.lastPid, None )
+        self.assertEqual( node.waitOutput(), 'b\r\n' )
+        self.assertEqual( node.lastPid, 42 )
+        node.terminate()
+
+
+if __name__ == '__main__':
+    setLogLevel( 'warning' )
+    unittest.main()
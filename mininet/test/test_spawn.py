@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+
+"""Package: mininet
+   Test starting node shells with posix_spawnp (mininet.spawn)"""
+
+import unittest
+import sys
+import os
+import signal
+from subprocess import PIPE
+
+from mininet.node import Node
+from mininet.spawn import spawn, Spawned
+from mininet.log import setLogLevel
+from mininet.clean import cleanup
+
+
+class testSpawn( unittest.TestCase ):
+    "Verify spawn() and the Spawned process object"
+
+    def testExit( self ):
+        "poll() and wait() should report the exit status"
+        fd = os.open( os.devnull, os.O_RDWR )
+        proc = spawn( [ 'sh', '-c', 'exit 3' ], fd )
+        os.close( fd )
+        self.assertTrue( isinstance( proc, Spawned ) )
+        self.assertEqual( proc.wait(), 3 )
+        self.assertEqual( proc.poll(), 3 )
+
+    def testMissing( self ):
+        "A missing command should fail when spawned or when it runs"
+        fd = os.open( os.devnull, os.O_RDWR )
+        try:
+            proc = spawn( [ 'mn-no-such-command' ], fd )
+            # glibc may report exec failure as exit status 127
+            self.assertEqual( proc.wait(), 127 )
+        except OSError:
+            pass
+        finally:
+            os.close( fd )
+
+
+class testSpawnedNode( unittest.TestCase ):
+    "Verify that a spawned node shell is usable while starting"
+
+    @staticmethod
+    def tearDown():
+        "Clean up if necessary"
+        if sys.exc_info != ( None, None, None ):
+            cleanup()
+
+    def testBeforeStarted( self ):
+        "cmd(), popen() and nsPath() should wait for the shell to start"
+        node = Node( 'n0' )
+        self.assertTrue( isinstance( node.shell, Spawned ) )
+        self.assertTrue( node.starting )
+        self.assertEqual( node.cmd( 'echo hello' ), 'hello\r\n' )
+        self.assertFalse( node.starting )
+        node.terminate()
+        node = Node( 'n1' )
+        self.assertTrue( os.path.exists( node.nsPath() ) )
+        proc = node.popen( [ 'ip', 'link', 'show', 'lo' ], stdout=PIPE )
+        self.assertIn( 'lo:', proc.communicate()[ 0 ] )
+        node.terminate()
+
+    def testAfterStarted( self ):
+        "The shell should be usable after waitStarted()"
+        node = Node( 'n0' )
+        self.assertTrue( node.waitStarted() )
+        self.assertTrue( node.waitStarted( block=False ) )
+        self.assertEqual( node.cmd( 'echo hello' ), 'hello\r\n' )
+        # The shell runs in its own network namespace
+        self.assertNotEqual( os.readlink( node.nsPath() ),
+                             os.readlink( '/proc/self/ns/net' ) )
+        shell = node.shell
+        self.assertEqual( shell.poll(), None )
+        shell.kill()
+        self.assertEqual( shell.wait(), -signal.SIGKILL )
+        node.terminate()
+
+
+if __name__ == '__main__':
+    setLogLevel( 'warning' )
+    unittest.main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+
+"""Package: mininet
+   Test interface counter sampling (mininet.stats)"""
+
+import unittest
+import sys
+import os
+import csv
+import shutil
+import tempfile
+
+from mininet.net import Mininet
+from mininet.log import setLogLevel
+from mininet.clean import cleanup
+from mininet.link import TCLink
+from mininet.stats import parseProcNetDev, CgroupSampler
+
+
+class testStats( unittest.TestCase ):
+    "Sample counters of a pair of linked hosts"
+
+    @staticmethod
+    def tearDown():
+        "Clean up if necessary"
+        if sys.exc_info != ( None, None, None ):
+            cleanup()
+
+    def testCounters( self ):
+        "Sampled counters should match each end and /proc/net/dev"
+        net = Mininet( controller=None )
+        h1, h2 = net.addHost( 'h1' ), net.addHost( 'h2' )
+        link = net.addLink( h1, h2 )
+        net.build()
+        sampler = net.startStats( interval=.05, samples=4 )
+        net.trafficMatrix( 'all', tool='builtin', seconds=.5 )
+        net.stopStats()
+        self.assertTrue( sampler.count > 4 )
+        self.assertEqual( len( sampler.history( link.intf1 ) ), 4 )
+        stats1, stats2 = net.linkStats()[ link ]
+        self.assertTrue( stats1[ 'txBytes' ] > 1000000 )
+        self.assertEqual( stats1[ 'txBytes' ], stats2[ 'rxBytes' ] )
+        self.assertEqual( ( stats1, stats2 ), link.stats() )
+        proc = parseProcNetDev( h1.cmd( 'cat /proc/net/dev' ) )
+        self.assertEqual( proc[ link.intf1.name ][ 3 ],
+                          stats1[ 'txBytes' ] )
+        rates1, _rates2 = net.linkStats( rates=True, interval=.1 )[ link ]
+        self.assertTrue( rates1[ 'txBytes' ] < 10000 )
+        net.stop()
+
+    def testQdiscs( self ):
+        "A bandwidth-limited link should build up a backlog in its qdisc"
+        net = Mininet( controller=None, link=TCLink )
+        h1, h2 = net.addHost( 'h1' ), net.addHost( 'h2' )
+        link = net.addLink( h1, h2, bw=10 )
+        net.build()
+        net.startQdiscStats( interval=.01 )
+        net.trafficMatrix( 'all', tool='builtin', seconds=.5 )
+        sampler = net.stopQdiscStats()
+        net.stop()
+        self.assertEqual( sorted( sampler.series ),
+                          [ ( link.intf1, '5:' ), ( link.intf2, '5:' ) ] )
+        backlog = sampler.timeSeries( link.intf1, '5:', 'backlog' )
+        self.assertTrue( len( backlog ) > 20 )
+        self.assertTrue( max( value for _t, value in backlog ) > 0 )
+        path = tempfile.mktemp( suffix='.csv' )
+        sampler.writeCSV( path )
+        with open( path ) as f:
+            rows = list( csv.reader( f ) )
+        os.remove( path )
+        self.assertEqual( rows[ 0 ][ :4 ], [ 'time', 'intf', 'handle',
+                                             'kind' ] )
+        self.assertEqual( len( rows ), len( sampler.rows() ) + 1 )
+
+
+class testCgroupSampler( unittest.TestCase ):
+    "Read cgroup counters from a cgroup v1 style file tree"
+
+    class Node( object ):
+        "Stand-in for a CPULimitedHost"
+        cgroup = 'cpu,cpuacct,cpuset:/h1'
+
+    def setUp( self ):
+        "Create a cgroup tree"
+        self.root = tempfile.mkdtemp()
+        for controller in 'cpu', 'cpuacct':
+            os.makedirs( os.path.join( self.root, controller, 'h1' ) )
+        self.write( 0, 0, 0 )
+
+    def tearDown( self ):
+        "Remove the cgroup tree"
+        shutil.rmtree( self.root )
+
+    def write( self, usage, periods, throttled ):
+        "Rewrite the cgroup's counters in place"
+        for name, text in ( ( 'cpuacct/h1/cpuacct.usage', '%d\n' % usage ),
+                            ( 'cpu/h1/cpu.stat',
+                              'nr_periods %d\nnr_throttled %d\n'
+                              'throttled_time 0\n' % ( periods,
+                                                       throttled ) ) ):
+            with open( os.path.join( self.root, name ), 'w' ) as f:
+                f.write( text )
+
+    def testThrottling( self ):
+        "Counters should be re-read from the open files"
+        node = self.Node()
+        sampler = CgroupSampler( [ node ], samples=2, root=self.root )
+        sampler.sample()
+        self.write( 500000000, 10, 8 )
+        sampler.sample()
+        sampler.stop()
+        self.assertEqual( sampler.latest( node )[ 'cpuNs' ], 500000000 )
+        self.assertAlmostEqual( sampler.throttling( node ), .8 )
+        self.assertEqual( sampler.starved(), [ node ] )
+        self.assertTrue( sampler.utilization( node ) > 0 )
+
+
+if __name__ == '__main__':
+    setLogLevel( 'warning' )
+    unittest.main()
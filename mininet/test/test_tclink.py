@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+
+"""Package: mininet
+   Test TCIntf qdisc configuration"""
+
+import unittest
+import sys
+import re
+
+from mininet.net import Mininet
+from mininet.topo import Topo
+from mininet.link import TCLink
+from mininet.log import setLogLevel
+from mininet.clean import cleanup
+from mininet.util import tcBatch
+
+
+class StarTopo( Topo ):
+    "Hosts linked to a central host with bandwidth-limited links"
+
+    def build( self, n=4, **params ):
+        center = self.addHost( 'r' )
+        for i in range( n ):
+            self.addLink( self.addHost( 'h%d' % i ), center, **params )
+
+
+class testTCBatch( unittest.TestCase ):
+    "Apply qdisc configuration with tc -batch"
+
+    @staticmethod
+    def tearDown():
+        "Clean up if necessary"
+        if sys.exc_info != ( None, None, None ):
+            cleanup()
+
+    @staticmethod
+    def qdiscs( node ):
+        "Return node's qdisc kinds and handles"
+        return [ line.split()[ 1:5 ] for line in
+                 node.cmd( 'tc qdisc show' ).splitlines()
+                 if 'dev lo' not in line ]
+
+    def testBuild( self ):
+        "Every TCIntf should get its htb qdisc and class"
+        net = Mininet( topo=StarTopo( bw=10 ), controller=None,
+                       link=TCLink )
+        for host in net.hosts:
+            for intf in host.intfList():
+                self.assertTrue( [ 'htb', '5:', 'dev', intf.name ]
+                                 in self.qdiscs( host ) )
+        self.assertTrue( 'rate 10Mbit' in
+                         net[ 'r' ].cmd( 'tc class show dev r-eth2' ) )
+        net.stop()
+
+    def testOutputs( self ):
+        "Each command's error should be reported against it"
+        net = Mininet( controller=None, link=TCLink )
+        h1, h2 = net.addHost( 'h1' ), net.addHost( 'h2' )
+        link = net.addLink( h1, h2 )
+        result = link.intf1.config( bw=5 )
+        self.assertEqual( result[ 'tcoutputs' ], [ '', '' ] )
+        self.assertEqual( result[ 'parent' ], ' parent 5:1 ' )
+        # Our qdiscs are deleted first if there are any
+        result = link.intf1.config( bw=10 )
+        self.assertEqual( result[ 'tcoutputs' ], [ '', '', '' ] )
+        outputs = tcBatch( [ 'qdisc show dev h1-eth0',
+                             'qdisc add dev h1-eth0 root handle 5: htb',
+                             'qdisc bogus' ], node=h1 )
+        self.assertEqual( outputs[ 0 ], '' )
+        self.assertTrue( outputs[ 1 ] and outputs[ 2 ] )
+        net.stop()
+
+    def testReapply( self ):
+        "reapply() should only reprogram qdiscs that have changed"
+        net = Mininet( controller=None, link=TCLink )
+        h1, h2 = net.addHost( 'h1' ), net.addHost( 'h2' )
+        intf = net.addLink( h1, h2, bw=10 ).intf1
+        self.assertEqual( intf.reapply(), { 'parent': ' parent 5:1 ',
+                                            'tcoutputs': [] } )
+        h1.cmd( 'tc qdisc del dev h1-eth0 root' )
+        self.assertEqual( self.qdiscs( h1 )[ 0 ][ 0 ], 'noqueue' )
+        self.assertEqual( intf.reapply()[ 'tcoutputs' ], [ '', '' ] )
+        self.assertEqual( self.qdiscs( h1 ),
+                          [ [ 'htb', '5:', 'dev', 'h1-eth0' ] ] )
+        # A later config() is what we keep
+        intf.config( bw=20 )
+        self.assertEqual( intf.reapply()[ 'tcoutputs' ], [] )
+        self.assertTrue( 'rate 20Mbit' in
+                         h1.cmd( 'tc class show dev h1-eth0' ) )
+        net.stop()
+
+    def testUpdate( self ):
+        "update() should change qdiscs in place where it can"
+        net = Mininet( controller=None, link=TCLink )
+        h1, h2 = net.addHost( 'h1' ), net.addHost( 'h2' )
+        link = net.addLink( h1, h2, bw=10 )
+        net.build()
+        net.trafficMatrix( 'all', tool='builtin', seconds=.2 )
+
+        def sent():
+            "Return bytes sent through h1's root qdisc"
+            stats = h1.cmd( 'tc -s qdisc show dev h1-eth0' )
+            return int( re.search( r'Sent (\d+) bytes', stats ).group( 1 ) )
+
+        before = sent()
+        self.assertTrue( before > 0 )
+        # Only the htb class changes
+        result1, _result2 = link.update( bw=20 )
+        self.assertEqual( result1, { 'parent': ' parent 5:1 ',
+                                     'tcoutputs': [ '' ] } )
+        self.assertTrue( 'rate 20Mbit' in
+                         h1.cmd( 'tc class show dev h1-eth0' ) )
+        # Counters were kept, so the qdisc was not replaced
+        self.assertTrue( sent() >= before )
+        self.assertEqual( link.intf1.update( bw=None ),
+                          { 'tcoutputs': [ '' ] } )
+        self.assertEqual( self.qdiscs( h1 )[ 0 ][ 0 ], 'noqueue' )
+        # Nothing to change, so we start over - without h1's shell,
+        # which may be in use by another thread
+        def busy( *_args, **_kwargs ):
+            "h1's shell should not be used"
+            raise Exception( 'shell used by update()' )
+        h1.cmd = h1.cmdBatch = busy
+        self.assertEqual( link.intf1.update( bw=5 )[ 'tcoutputs' ],
+                          [ '', '' ] )
+        del h1.cmd, h1.cmdBatch
+        self.assertTrue( 'rate 5Mbit' in
+                         h1.cmd( 'tc class show dev h1-eth0' ) )
+        net.stop()
+
+    def testHighRate( self ):
+        "Rates above bwParamMax should get burst scaled to the rate"
+        net = Mininet( controller=None, link=TCLink )
+        h1, h2 = net.addHost( 'h1' ), net.addHost( 'h2' )
+        intf = net.addLink( h1, h2, bw=1000 ).intf1
+        self.assertTrue( intf.tcCmds( bw=1000 )[ 0 ][ -1 ].endswith(
+            'burst 15k' ) )
+        intf.config( bw=40000 )
+        burst = intf.highRateBurst( 40000 )
+        self.assertTrue( burst >= 2 * intf.gsoMaxSize() )
+        self.assertTrue( 'rate 40Gbit ceil 40Gbit burst %db cburst %db' %
+                         ( burst, burst ) in
+                         h1.cmd( 'tc class show dev h1-eth0' ) )
+        # Beyond even high rates, bw is ignored
+        self.assertEqual( intf.tcCmds( bw=intf.bwHighMax + 1 )[ 0 ],
+                          [ 'qdisc del dev h1-eth0 root' ] )
+        net.stop()
+
+
+if __name__ == '__main__':
+    setLogLevel( 'warning' )
+    unittest.main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+
+"""Package: mininet
+   Test startup/teardown phase timing (mininet.timing)"""
+
+import unittest
+import sys
+import os
+import json
+import subprocess
+import tempfile
+import threading
+
+from mininet.net import Mininet
+from mininet.topo import Topo
+from mininet.log import setLogLevel
+from mininet.clean import cleanup
+from mininet.timing import phaseTimer
+
+
+class testPhaseTimer( unittest.TestCase ):
+    "Time the phases of building and stopping a small network"
+
+    @staticmethod
+    def tearDown():
+        "Clean up if necessary"
+        phaseTimer.disable()
+        phaseTimer.reset()
+        if sys.exc_info != ( None, None, None ):
+            cleanup()
+
+    def testPhases( self ):
+        "Phases should be counted, and Popen restored afterwards"
+        popenInit = subprocess.Popen.__init__
+        phaseTimer.enable()
+        net = Mininet( controller=None )
+        h1, h2 = net.addHost( 'h1' ), net.addHost( 'h2' )
+        net.addLink( h1, h2 )
+        net.start()
+        net.stop()
+        phaseTimer.disable()
+        self.assertEqual( subprocess.Popen.__init__, popenInit )
+        results = { r[ 'name' ]: r for r in phaseTimer.results() }
+        for name, calls in ( ( 'Mininet.addHost', 2 ),
+                             ( 'Mininet.addLink', 1 ),
+                             ( 'Mininet.build', 1 ),
+                             ( 'Mininet.stop', 1 ) ):
+            self.assertEqual( results[ name ][ 'calls' ], calls )
+        # Each host has a shell
+        self.assertTrue( results[ 'Mininet.addHost' ][ 'spawned' ] >= 2 )
+        self.assertTrue( results[ 'Mininet.start' ][ 'seconds' ] >=
+                         results[ 'Mininet.build' ][ 'seconds' ] )
+        self.assertTrue( 'Mininet.configHosts' in phaseTimer.format() )
+        path = tempfile.mktemp( suffix='.json' )
+        phaseTimer.writeJSON( path, topo='pair' )
+        with open( path ) as f:
+            report = json.load( f )
+        os.remove( path )
+        self.assertEqual( report[ 'topo' ], 'pair' )
+        self.assertEqual( len( report[ 'phases' ] ), len( results ) )
+
+    def testWorkers( self ):
+        "Phases run on worker threads should be timed too"
+        phaseTimer.enable()
+        topo = Topo()
+        hosts = [ topo.addHost( 'h%d' % i ) for i in range( 1, 9 ) ]
+        for src, dst in zip( hosts[ ::2 ], hosts[ 1::2 ] ):
+            topo.addLink( src, dst )
+        net = Mininet( topo=topo, controller=None, workers=4 )
+        net.stop()
+        phaseTimer.disable()
+        results = { r[ 'name' ]: r for r in phaseTimer.results() }
+        self.assertEqual( results[ 'Mininet.addLink' ][ 'calls' ], 4 )
+        self.assertTrue( results[ 'Mininet.addLink' ][ 'seconds' ] > 0 )
+        self.assertTrue( results[ 'Mininet.build' ][ 'spawned' ] >=
+                         results[ 'Mininet.addLink' ][ 'spawned' ] )
+
+    def testThreads( self ):
+        "Counts from many threads at once should all be recorded"
+        def count():
+            "Count many commands and subprocesses"
+            for _i in range( 20000 ):
+                phaseTimer.countCommands()
+                phaseTimer.countSpawned( 2 )
+
+        def phase():
+            "Count from several threads"
+            threads = [ threading.Thread( target=count ) for _i in range( 8 ) ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        phaseTimer.enable()
+        phaseTimer.run( 'threads', phase )
+        phaseTimer.disable()
+        result = phaseTimer.results()[ 0 ]
+        self.assertEqual( result[ 'commands' ], 8 * 20000 )
+        self.assertEqual( result[ 'spawned' ], 8 * 40000 )
+
+
+if __name__ == '__main__':
+    setLogLevel( 'warning' )
+    unittest.main()
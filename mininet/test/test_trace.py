@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+
+"""Package: mininet
+   Test trace-driven link emulation (mininet.trace)"""
+
+import unittest
+import sys
+import os
+import tempfile
+from time import sleep
+
+from mininet.net import Mininet
+from mininet.log import setLogLevel
+from mininet.clean import cleanup
+from mininet.trace import Trace, TraceLink, TraceScheduler
+
+
+def writeTrace( text, suffix ):
+    "Write a trace file and return its path"
+    path = tempfile.mktemp( suffix=suffix )
+    with open( path, 'w' ) as f:
+        f.write( text )
+    return path
+
+
+class testTraceFiles( unittest.TestCase ):
+    "Load traces in each format"
+
+    def testMahimahi( self ):
+        "Delivery opportunities should be binned into bandwidths"
+        # 10ms bins: 2, 2, 0 and then 1 opportunity
+        path = writeTrace( '1\n5\n12\n15\n\n35\n', '.down' )
+        trace = Trace.load( path, binMs=10 )
+        os.remove( path )
+        self.assertEqual( list( trace.times ), [ 0, .02, .03 ] )
+        self.assertEqual( list( trace.values[ 'bw' ] ), [ 2.4, .01, 1.2 ] )
+        self.assertEqual( trace.duration, .035 )
+
+    def testCSV( self ):
+        "Empty cells should leave parameters unchanged"
+        path = writeTrace( 'time,bw,delay\n0,10,5\n100,20,\n250,,7.5\n',
+                           '.csv' )
+        trace = Trace.load( path )
+        os.remove( path )
+        self.assertEqual( list( trace.times ), [ 0, .1, .25 ] )
+        self.assertEqual( trace.params( 1 ), { 'bw': 20 } )
+        self.assertEqual( trace.params( 2 ), { 'delay': '7.5ms' } )
+        self.assertEqual( trace.initial(), { 'bw': 10, 'delay': '5ms' } )
+
+
+class testTraceScheduler( unittest.TestCase ):
+    "Replay traces on links"
+
+    class Link( object ):
+        "Stand-in for a TCLink that records its updates"
+
+        def __init__( self ):
+            self.updates = []
+
+        def update( self, **params ):
+            "Record params"
+            self.updates.append( params )
+
+    @staticmethod
+    def tearDown():
+        "Clean up if necessary"
+        if sys.exc_info != ( None, None, None ):
+            cleanup()
+
+    def testMerge( self ):
+        "Overdue changes should be merged into one update"
+        link = self.Link()
+        trace = Trace( [ 0, 0, .01, .02 ], bw=[ 1, 2, 3, 4 ],
+                       loss=[ 1, float( 'nan' ), 2, float( 'nan' ) ] )
+        scheduler = TraceScheduler()
+        scheduler.add( link, trace )
+        scheduler.start()
+        sleep( .1 )
+        scheduler.stop()
+        self.assertEqual( link.updates[ 0 ], { 'bw': 2, 'loss': 1 } )
+        self.assertEqual( link.updates[ -1 ], { 'bw': 4 } )
+        # Changes that are due at once aren't missed
+        stats = scheduler.stats()
+        self.assertEqual( stats[ 'applied' ], 3 )
+        self.assertEqual( stats[ 'merged' ], 0 )
+        self.assertFalse( scheduler.running() )
+
+    def testMissed( self ):
+        "Changes we were too slow to apply should count as merged"
+        link = self.Link()
+        link.update = lambda **params: (
+            link.updates.append( params ), sleep( .035 ) )
+        trace = Trace( [ 0, .01, .02, .03 ], bw=[ 1, 2, 3, 4 ] )
+        scheduler = TraceScheduler()
+        scheduler.add( link, trace )
+        scheduler.start()
+        sleep( .1 )
+        scheduler.stop()
+        # The first update made us miss the next two changes
+        self.assertEqual( link.updates, [ { 'bw': 1 }, { 'bw': 4 } ] )
+        stats = scheduler.stats()
+        self.assertEqual( stats[ 'merged' ], 2 )
+        self.assertEqual( stats[ 'late' ], 1 )
+
+    def testLoop( self ):
+        "The end of a looping trace shouldn't count as merged"
+        link = self.Link()
+        # The last change and the next period's first are due together
+        trace = Trace( [ 0, .02, .04 ], bw=[ 1, 2, 3 ] )
+        scheduler = TraceScheduler( tolerance=.005 )
+        scheduler.add( link, trace, loop=True )
+        scheduler.start()
+        sleep( .15 )
+        scheduler.stop()
+        stats = scheduler.stats()
+        self.assertTrue( stats[ 'applied' ] >= 6 )
+        self.assertEqual( stats[ 'merged' ], 0 )
+        self.assertEqual( link.updates[ :3 ],
+                          [ { 'bw': 1 }, { 'bw': 2 }, { 'bw': 1 } ] )
+
+    def testTraceLink( self ):
+        "A TraceLink should follow its trace, starting from its first row"
+        path = writeTrace( 'time,bw\n0,10\n50,20\n100,30\n', '.csv' )
+        net = Mininet( controller=None, link=TraceLink )
+        h1, h2 = net.addHost( 'h1' ), net.addHost( 'h2' )
+        link = net.addLink( h1, h2, trace=path )
+        os.remove( path )
+        self.assertTrue( 'rate 10Mbit' in
+                         h1.cmd( 'tc class show dev h1-eth0' ) )
+        scheduler = net.startTraces()
+        sleep( .5 )
+        self.assertFalse( scheduler.running() )
+        self.assertEqual( scheduler.stats()[ 'applied' ], 3 )
+        self.assertTrue( 'rate 30Mbit' in
+                         h2.cmd( 'tc class show dev h2-eth0' ) )
+        self.assertEqual( link.intf1.tcApplied[ 0 ][ 'bw' ], 30 )
+        net.stop()
+
+
+if __name__ == '__main__':
+    setLogLevel( 'warning' )
+    unittest.main()
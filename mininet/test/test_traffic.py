@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+
+"""Package: mininet
+   Test traffic patterns and flows (mininet.traffic)"""
+
+import unittest
+import sys
+import time
+import signal
+import tempfile
+from subprocess import PIPE
+
+from mininet.net import Mininet
+from mininet.log import setLogLevel
+from mininet.clean import cleanup
+from mininet.traffic import makePairs, makeSchedule, FlowSizes
+
+
+class testPatterns( unittest.TestCase ):
+    "Check the pairs generated by traffic patterns"
+
+    hosts = [ 'h%d' % i for i in range( 8 ) ]
+
+    def testPermutation( self ):
+        "Each host should send once and receive once, never to itself"
+        pairs = makePairs( self.hosts, 'permutation', seed=1 )
+        self.assertEqual( sorted( src for src, _dst in pairs ), self.hosts )
+        self.assertEqual( sorted( dst for _src, dst in pairs ), self.hosts )
+        self.assertTrue( all( src != dst for src, dst in pairs ) )
+        self.assertEqual( pairs,
+                          makePairs( self.hosts, 'permutation', seed=1 ) )
+
+    def testOthers( self ):
+        "all, incast, stride and matrices should make the expected pairs"
+        self.assertEqual( len( makePairs( self.hosts, 'all' ) ), 8 * 7 )
+        pairs = makePairs( self.hosts, 'incast', dst='h3', fanin=5 )
+        self.assertEqual( len( set( pairs ) ), 5 )
+        self.assertTrue( all( dst == 'h3' != src for src, dst in pairs ) )
+        self.assertEqual( makePairs( self.hosts, 'stride', step=3 )[ 6 ],
+                          ( 'h6', 'h1' ) )
+        matrix = [ [ 0, 2, 0 ], [ 0, 0, 1 ], [ 0, 0, 0 ] ]
+        self.assertEqual( makePairs( self.hosts[ :3 ], matrix ),
+                          [ ( 'h0', 'h1' ), ( 'h0', 'h1' ),
+                            ( 'h1', 'h2' ) ] )
+
+    def testSchedule( self ):
+        "Schedules should be repeatable and follow the flow size CDF"
+        flows = makeSchedule( self.hosts, 10, rate=50, seed=3 )
+        self.assertEqual( flows, makeSchedule( self.hosts, 10, rate=50,
+                                               seed=3 ) )
+        # About 8 * 10 * 50 Poisson arrivals
+        self.assertTrue( 3600 < len( flows ) < 4400 )
+        self.assertTrue( all( flow.src != flow.dst for flow in flows ) )
+        sizes = sorted( flow.size for flow in flows )
+        # Median web search flow is about 53 packets
+        self.assertTrue( 40 * 1460 < sizes[ len( sizes ) / 2 ] < 70 * 1460 )
+        self.assertAlmostEqual( FlowSizes( [ ( 0, 0 ), ( 10, 1 ) ] ).mean(),
+                                5 )
+
+
+class testFlows( unittest.TestCase ):
+    "Run built-in flows over a pair of linked hosts"
+
+    @staticmethod
+    def tearDown():
+        "Clean up if necessary"
+        if sys.exc_info != ( None, None, None ):
+            cleanup()
+
+    def testBuiltin( self ):
+        "Both directions should report bytes at sender and receiver"
+        net = Mininet( controller=None )
+        h1, h2 = net.addHost( 'h1' ), net.addHost( 'h2' )
+        net.addLink( h1, h2 )
+        net.build()
+        results = net.trafficMatrix( 'all', tool='builtin', seconds=.5 )
+        net.stop()
+        self.assertEqual( [ ( r.src, r.dst ) for r in results ],
+                          [ ( h1, h2 ), ( h2, h1 ) ] )
+        for result in results:
+            self.assertTrue( result.bytes > 0 )
+            self.assertTrue( 0 < result.serverBytes <= result.bytes )
+
+    def testWorkload( self ):
+        "All flows of a light workload should complete"
+        net = Mininet( controller=None )
+        h1, h2 = net.addHost( 'h1' ), net.addHost( 'h2' )
+        net.addLink( h1, h2 )
+        net.build()
+        records = net.runWorkload( duration=1, rate=20, seed=1 )
+        net.stop()
+        self.assertTrue( records )
+        for record in records:
+            self.assertEqual( record.received, record.size )
+            self.assertTrue( record.fct > 0 )
+
+    def testInterleavedRequests( self ):
+        "Partial requests on different connections should not mix"
+        net = Mininet( controller=None )
+        h1, h2 = net.addHost( 'h1' ), net.addHost( 'h2' )
+        net.addLink( h1, h2 )
+        net.build()
+        log = tempfile.NamedTemporaryFile( prefix='mn-test-' )
+        server = h2.popen( [ sys.executable, '-m', 'mininet.traffic',
+                             'workload', '-p', '5003', '-l', log.name,
+                             '-s', repr( time.time() ) ], stdout=PIPE )
+        # With no schedule, the workload is done as soon as it starts
+        self.assertEqual( server.stdout.readline().strip(), 'done' )
+        # Send half of one request, all of another, then the rest
+        client = (
+            'import socket, struct, time\n'
+            'req = struct.Struct( "=IQ" )\n'
+            'a, b = socket.socket(), socket.socket()\n'
+            'a.connect( ( "%s", 5003 ) ); b.connect( ( "%s", 5003 ) )\n'
+            'first = req.pack( 1, 1000 )\n'
+            'a.sendall( first[ :6 ] ); time.sleep( .2 )\n'
+            'b.sendall( req.pack( 2, 3000 ) ); time.sleep( .2 )\n'
+            'a.sendall( first[ 6: ] )\n'
+            'for s in a, b:\n'
+            '    n = 0\n'
+            '    while True:\n'
+            '        data = s.recv( 65536 )\n'
+            '        if not data: break\n'
+            '        n += len( data )\n'
+            '    print n\n' % ( h2.IP(), h2.IP() ) )
+        script = tempfile.NamedTemporaryFile( prefix='mn-test-',
+                                              suffix='.py' )
+        script.write( client )
+        script.flush()
+        output = h1.cmd( sys.executable, script.name )
+        server.send_signal( signal.SIGINT )
+        server.wait()
+        net.stop()
+        self.assertEqual( output.split(), [ '1000', '3000' ] )
+
+
+if __name__ == '__main__':
+    setLogLevel( 'warning' )
+    unittest.main()
@@ -0,0 +1,185 @@
+"""
+timing.py: phase timing for Mininet startup and teardown
+
+When a large topology takes minutes to start, we want to know which
+phase the time goes to, and how much of it is spent forking
+processes. PhaseTimer records, for each named phase (e.g.
+Mininet.build or OVSSwitch.batchStartup):
+
+- calls: how many times the phase was entered
+- seconds: total wall clock time spent in it
+- spawned: subprocesses (Popen or spawn()) started in it
+- commands: commands sent to node shells in it
+
+Phases nest (Mininet.start includes OVSSwitch.batchStartup), and the
+numbers for a phase include those of any phases inside it.
+
+Methods are marked as phases with the @timed() decorator. Timing is
+off by default, and costs a single test per call until enable() is
+called - which is what mn --profile does.
+
+Phases are timed in any thread (e.g. Mininet.addLink, which runs on
+Mininet's worker pool), each thread keeping its own stack of phases;
+the phase table and counts are guarded by a lock, so that concurrent
+updates aren't lost. A phase in another thread only counts its own
+thread's subprocesses and commands, while phases in the thread that
+called enable() count those of every thread, so that (say)
+Mininet.build includes the work of its workers. Seconds are summed
+over threads, so a phase run on several workers at once may add up
+to more than the wall clock time of the phase that started them.
+"""
+
+import json
+import threading
+import subprocess
+from collections import OrderedDict
+from functools import wraps
+from time import time
+
+
+class PhaseTimer( object ):
+    "Record time, calls, subprocesses and commands per phase"
+
+    counters = ( 'calls', 'seconds', 'spawned', 'commands' )
+
+    def __init__( self ):
+        self.enabled = False
+        self.popenInit = None  # original Popen.__init__ when enabled
+        self.mainThread = None  # thread that called enable()
+        self.lock = threading.Lock()  # for phases and counts
+        self.reset()
+
+    def reset( self ):
+        "Forget all phases"
+        self.phases = OrderedDict()  # name: [ calls, seconds, ... ]
+        self.spawned, self.commands = 0, 0
+        # Per thread: stack of phases, and spawned and commands counts
+        self.local = threading.local()
+
+    def thread( self ):
+        "Return the current thread's phase stack and counts"
+        local = self.local
+        if not hasattr( local, 'stack' ):
+            local.stack = []
+            local.spawned, local.commands = 0, 0
+        return local
+
+    def enable( self ):
+        "Start timing phases and counting subprocesses"
+        if self.enabled:
+            return
+        self.enabled = True
+        self.mainThread = threading.current_thread()
+        # Count every Popen, however its module imported it
+        self.popenInit = popenInit = subprocess.Popen.__init__
+
+        @wraps( popenInit )
+        def countingInit( popen, *args, **kwargs ):
+            "Count subprocesses that we spawn"
+            self.countSpawned()
+            return popenInit( popen, *args, **kwargs )
+
+        subprocess.Popen.__init__ = countingInit
+
+    def disable( self ):
+        "Stop timing phases"
+        if not self.enabled:
+            return
+        self.enabled = False
+        subprocess.Popen.__init__ = self.popenInit
+        self.popenInit = None
+
+    def countSpawned( self, count=1 ):
+        "Count processes started without Popen (e.g. by spawn())"
+        if self.enabled:
+            local = self.thread()
+            with self.lock:
+                self.spawned += count
+                local.spawned += count
+
+    def countCommands( self, count=1 ):
+        "Count commands sent to a node's shell"
+        if self.enabled:
+            local = self.thread()
+            with self.lock:
+                self.commands += count
+                local.commands += count
+
+    def counts( self ):
+        """Return the time and the spawned and commands counts: of all
+           threads in the thread that called enable(), else of the
+           current thread"""
+        counts = self
+        if threading.current_thread() is not self.mainThread:
+            counts = self.thread()
+        with self.lock:
+            return time(), counts.spawned, counts.commands
+
+    def run( self, name, fn, *args, **kwargs ):
+        "Call fn( *args, **kwargs ) as phase name"
+        stack = self.thread().stack
+        if not self.enabled or name in stack:
+            return fn( *args, **kwargs )
+        with self.lock:
+            totals = self.phases.setdefault( name, [ 0, 0, 0, 0 ] )
+        stack.append( name )
+        start = self.counts()
+        try:
+            return fn( *args, **kwargs )
+        finally:
+            stack.pop()
+            end = self.counts()
+            with self.lock:
+                totals[ 0 ] += 1
+                for i, ( now, then ) in enumerate( zip( end, start ) ):
+                    totals[ i + 1 ] += now - then
+
+    def results( self ):
+        """Return phases in the order they were first entered
+           returns: list of dicts of name and counters"""
+        results = []
+        with self.lock:
+            for name, totals in self.phases.iteritems():
+                result = dict( zip( self.counters, totals ) )
+                result[ 'name' ] = name
+                results.append( result )
+        return results
+
+    def format( self ):
+        "Return a table of phases as a string"
+        width = max( [ len( name ) for name in self.phases ] + [ 5 ] )
+        lines = [ '%-*s %8s %10s %8s %9s' % ( width, 'phase', 'calls',
+                                              'seconds', 'spawned',
+                                              'commands' ) ]
+        for result in self.results():
+            lines.append( '%-*s %8d %10.3f %8d %9d' % (
+                width, result[ 'name' ], result[ 'calls' ],
+                result[ 'seconds' ], result[ 'spawned' ],
+                result[ 'commands' ] ) )
+        return '\n'.join( lines ) + '\n'
+
+    def writeJSON( self, path, **extra ):
+        """Write phases to a JSON file
+           extra: additional top-level items (e.g. topology)"""
+        report = dict( extra, phases=self.results() )
+        with open( path, 'w' ) as f:
+            json.dump( report, f, indent=2 )
+            f.write( '\n' )
+
+
+# The timer that @timed phases report to
+phaseTimer = PhaseTimer()
+
+def timed( name ):
+    """Decorator: time calls to a function as phase name
+       name: phase name, e.g. 'Mininet.build'"""
+    def decorator( fn ):
+        "Wrap fn"
+        @wraps( fn )
+        def wrapper( *args, **kwargs ):
+            "Run fn as a phase"
+            if not phaseTimer.enabled:
+                return fn( *args, **kwargs )
+            return phaseTimer.run( name, fn, *args, **kwargs )
+        return wrapper
+    return decorator
@@ -0,0 +1,303 @@
+"""
+trace.py: trace-driven link emulation for Mininet
+
+To emulate a cellular or WAN path, we replay a recorded trace of its
+bandwidth, delay and loss on a TCLink. A Python loop that calls
+config() and then sleeps drifts further behind with every change,
+since each change takes time and each sleep is relative. Instead:
+
+- Trace loads a trace into compact arrays: a time for each change,
+  and for each parameter (bw, delay, jitter, loss) its new value at
+  that time, or NaN if it doesn't change.
+
+- TraceScheduler applies the traces of any number of links from a
+  single thread. Changes are due at absolute times measured from
+  start(), so time spent applying them doesn't accumulate as drift.
+  Changes for a link that are already overdue when we get to them
+  are merged into one update(), so a slow moment doesn't leave us
+  permanently behind. Changes that are due together are applied
+  together, with TCIntf.batchUpdate(), which costs one round trip to
+  each node's tc process. We count changes that were applied late (by
+  more than tolerance) or missed (merged because we were late for the
+  next change too), and the worst and mean lateness.
+
+- TraceLink is a TCLink that is configured from the start of its
+  trace, and which Mininet.startTraces() will replay.
+
+Changes are applied with TCIntf.update(), which changes qdiscs in
+place. A trace should therefore keep the same set of parameters
+throughout, since adding or removing a qdisc (e.g. netem, for delay)
+means rebuilding the qdiscs of the link.
+
+Trace formats:
+
+Mahimahi: one line per packet delivery opportunity, giving its time in
+milliseconds. We count opportunities in bins of binMs to give each
+bin's bandwidth (with packets of mtu bytes). Mahimahi traces repeat,
+with a period of the last timestamp.
+
+CSV: a header line naming the columns, which are time (milliseconds)
+and any of bw (Mbit/s), delay (ms), jitter (ms) and loss (percent);
+an empty cell leaves that parameter unchanged. A trace that loops
+starts again at its last timestamp.
+"""
+
+import csv
+import heapq
+import threading
+from time import time
+from array import array
+
+from mininet.log import warn, debug
+from mininet.link import Link, TCLink, TCIntf
+
+
+NaN = float( 'nan' )
+
+
+class Trace( object ):
+    "A trace of link parameter changes, kept in arrays"
+
+    fields = ( 'bw', 'delay', 'jitter', 'loss' )
+
+    def __init__( self, times=(), duration=None, **values ):
+        """times: time of each change, in seconds from the start
+           duration: period of the trace, if it loops (default: last
+             time)
+           values: field=values for each change (NaN: no change)"""
+        self.times = array( 'd', times )
+        self.values = {}
+        for field, column in values.iteritems():
+            if field not in self.fields:
+                raise Exception( 'Trace: unknown field %s' % field )
+            if len( column ) != len( self.times ):
+                raise Exception( 'Trace: %s has %d values for %d times' %
+                                 ( field, len( column ), len( self.times ) ) )
+            self.values[ field ] = array( 'd', column )
+        self.duration = ( duration if duration is not None
+                          else self.times[ -1 ] if self.times else 0 )
+
+    def __len__( self ):
+        return len( self.times )
+
+    def params( self, i ):
+        """Return the parameters that change i changes
+           returns: dict for TCIntf.update()"""
+        params = {}
+        for field, column in self.values.iteritems():
+            value = column[ i ]
+            if value != value:  # NaN
+                continue
+            if field in ( 'delay', 'jitter' ):
+                params[ field ] = '%gms' % value
+            else:
+                params[ field ] = value
+        return params
+
+    def initial( self ):
+        """Return the first value of each parameter, for configuring
+           a link before we start to replay its trace"""
+        params = {}
+        for i in range( len( self ) - 1, -1, -1 ):
+            params.update( self.params( i ) )
+        return params
+
+    @classmethod
+    def fromMahimahi( cls, path, binMs=10, mtu=1500, minBw=.01 ):
+        """Load a Mahimahi packet delivery trace
+           path: trace file
+           binMs: milliseconds per bandwidth change
+           mtu: bytes delivered per opportunity
+           minBw: bandwidth (Mbit/s) for bins with no opportunities,
+             since tc can't set a rate of zero"""
+        counts = array( 'l' )
+        last = 0
+        with open( path ) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                last = int( line )
+                b = last // binMs
+                if b >= len( counts ):
+                    counts.extend( [ 0 ] * ( b + 1 - len( counts ) ) )
+                counts[ b ] += 1
+        times, bws = array( 'd' ), array( 'd' )
+        scale = mtu * 8.0 / ( binMs * 1000 )
+        for b, count in enumerate( counts ):
+            bw = max( count * scale, minBw )
+            # Only keep changes
+            if not bws or bw != bws[ -1 ]:
+                times.append( b * binMs / 1000.0 )
+                bws.append( bw )
+        return cls( times, duration=last / 1000.0, bw=bws )
+
+    @classmethod
+    def fromCSV( cls, path ):
+        """Load a CSV trace with columns time (ms) and any of bw, delay,
+           jitter and loss
+           path: trace file"""
+        with open( path ) as f:
+            reader = csv.reader( f )
+            header = [ name.strip() for name in next( reader ) ]
+            if 'time' not in header:
+                raise Exception( 'Trace: %s has no time column' % path )
+            columns = { name: array( 'd' ) for name in header }
+            for row in reader:
+                if not row:
+                    continue
+                for name, cell in zip( header, row ):
+                    cell = cell.strip()
+                    columns[ name ].append( float( cell ) if cell else NaN )
+        times = array( 'd', ( t / 1000.0 for t in columns.pop( 'time' ) ) )
+        return cls( times, **columns )
+
+    @classmethod
+    def load( cls, path, **kwargs ):
+        """Load a trace, in CSV format if path ends with .csv, or else
+           Mahimahi format
+           path: trace file
+           kwargs: arguments for fromMahimahi()"""
+        if path.endswith( '.csv' ):
+            return cls.fromCSV( path )
+        return cls.fromMahimahi( path, **kwargs )
+
+
+class TraceScheduler( object ):
+    "Apply the traces of many links from one thread"
+
+    def __init__( self, tolerance=.001 ):
+        "tolerance: seconds late a change may be without counting as late"
+        self.tolerance = tolerance
+        self.traces = []  # ( link, trace, loop )
+        self.applied = 0  # updates applied
+        self.late = 0  # updates applied more than tolerance late
+        self.merged = 0  # changes missed, i.e. merged into an update
+                         # that was itself more than tolerance late
+        self.maxLate, self.totalLate = 0, 0
+        self.thread, self.stopped = None, threading.Event()
+
+    def add( self, link, trace, loop=False ):
+        """Replay a trace on a link when we start
+           link: TCLink or TCIntf (anything with update())
+           trace: Trace
+           loop: repeat the trace until we stop?"""
+        if len( trace ):
+            self.traces.append( ( link, trace, loop ) )
+
+    def _run( self ):
+        "Internal method: apply changes as they become due"
+        start = time()
+        # ( due, trace number, change number, period )
+        queue = [ ( start + trace.times[ 0 ], n, 0, 0 )
+                  for n, ( _link, trace, _loop )
+                  in enumerate( self.traces ) ]
+        heapq.heapify( queue )
+        pending = {}  # trace number: merged params
+        while queue and not self.stopped.is_set():
+            now = time()
+            if queue[ 0 ][ 0 ] > now:
+                self.stopped.wait( queue[ 0 ][ 0 ] - now )
+                continue
+            # Apply everything that is due together
+            updates = []
+            while queue and queue[ 0 ][ 0 ] <= now:
+                due, n, i, period = heapq.heappop( queue )
+                link, trace, loop = self.traces[ n ]
+                params = pending.pop( n, {} )
+                params.update( trace.params( i ) )
+                i += 1
+                if i == len( trace ) and loop and trace.duration > 0:
+                    i, period = 0, period + 1
+                if i < len( trace ):
+                    nextDue = ( start + period * trace.duration +
+                                trace.times[ i ] )
+                    heapq.heappush( queue, ( nextDue, n, i, period ) )
+                    if nextDue <= now:
+                        # Already due: apply this with the next change,
+                        # which only counts as a miss if we're late for
+                        # that too (rather than both being due at once,
+                        # e.g. the end and start of a looping trace)
+                        pending[ n ] = params
+                        if nextDue < now - self.tolerance:
+                            self.merged += 1
+                        continue
+                late = now - due
+                if late > self.tolerance:
+                    self.late += 1
+                self.maxLate = max( self.maxLate, late )
+                self.totalLate += late
+                self.applied += 1
+                updates.append( ( link, params ) )
+            self.apply( updates )
+
+    @staticmethod
+    def apply( updates ):
+        """Apply changes to links, with one TCIntf.batchUpdate() for
+           all of their TCIntfs
+           updates: list of ( link, params )"""
+        intfs, paramsList = [], []
+        for link, params in updates:
+            debug( '*** trace %s: %s\n' % ( link, params ) )
+            if isinstance( link, TCIntf ):
+                intfs.append( link )
+                paramsList.append( params )
+            elif isinstance( link, Link ):
+                intfs += [ link.intf1, link.intf2 ]
+                paramsList += [ params, params ]
+            else:
+                link.update( **params )
+        if intfs:
+            TCIntf.batchUpdate( intfs, paramsList )
+
+    def start( self ):
+        "Start replaying traces"
+        if self.thread:
+            return
+        self.stopped.clear()
+        self.thread = threading.Thread( target=self._run,
+                                        name=self.__class__.__name__ )
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop( self ):
+        "Stop replaying traces"
+        if self.thread:
+            self.stopped.set()
+            self.thread.join()
+            self.thread = None
+        if self.late or self.merged:
+            warn( '*** TraceScheduler: %d of %d updates late (max %.1fms),'
+                  ' %d changes merged\n' % ( self.late, self.applied,
+                                             self.maxLate * 1000,
+                                             self.merged ) )
+
+    def running( self ):
+        "Are we still replaying a trace?"
+        return self.thread is not None and self.thread.is_alive()
+
+    def stats( self ):
+        """Return how well we kept to the traces' times
+           returns: dict of applied, late, merged, maxLate, meanLate
+             (seconds)"""
+        return dict( applied=self.applied, late=self.late,
+                     merged=self.merged, maxLate=self.maxLate,
+                     meanLate=( self.totalLate / self.applied
+                                if self.applied else 0 ) )
+
+
+class TraceLink( TCLink ):
+    "TCLink whose parameters follow a trace"
+
+    def __init__( self, node1, node2, trace=None, loop=False, binMs=10,
+                  **params ):
+        """trace: Trace, or trace file (see Trace.load())
+           loop: repeat the trace until stopped?
+           binMs: milliseconds per change for Mahimahi traces
+           other arguments are as for TCLink"""
+        if isinstance( trace, basestring ):
+            trace = Trace.load( trace, binMs=binMs )
+        self.trace, self.loop = trace, loop
+        if trace:
+            params = dict( trace.initial(), **params )
+        TCLink.__init__( self, node1, node2, **params )
@@ -0,0 +1,729 @@
+"""
+traffic.py: traffic matrices for Mininet
+
+Mininet.iperf() measures one pair of hosts at a time, kills every
+iperf on the server, and waits for each test to finish. runFlows()
+starts a whole traffic matrix at once instead: one server per
+destination, plus one client per flow, launched through popen() at
+staggered times so that thousands of connections don't all start in
+the same instant. Per-flow results are collected from iperf's CSV
+output (-y C) into a table of FlowResult tuples.
+
+Patterns (see PATTERNS):
+
+allToAll: every host sends to every other host
+permutation: every host sends to one random host, and receives from one
+incast: many hosts send to one
+stride: host i sends to host (i + stride) mod n
+a user-supplied matrix (see matrixPairs()) or list of (src, dst) pairs
+
+Flows can use iperf, or the small built-in TCP sender and receiver
+in this module (tool='builtin'), which print the same CSV format:
+
+python -m mininet.traffic server -p port
+python -m mininet.traffic client -c serverIP -p port -t seconds
+
+For more realistic experiments, makeSchedule() and runSchedule()
+generate flows with sizes drawn from datacenter flow size distributions
+(web search, data mining) and Poisson arrivals, and measure each
+flow's completion time, using one event-driven process per host.
+"""
+
+import os
+import sys
+import time
+import errno
+import bisect
+import random
+import select
+import shutil
+import signal
+import socket
+import struct
+import tempfile
+from collections import namedtuple
+from optparse import OptionParser
+from subprocess import PIPE
+
+from mininet.log import debug, error
+
+
+# Traffic patterns: functions of ( hosts, **params ) -> [ ( src, dst ) ]
+
+def allToAll( hosts ):
+    "Every host sends to every other host"
+    return [ ( src, dst ) for src in hosts for dst in hosts if src != dst ]
+
+def permutation( hosts, seed=None ):
+    """Every host sends to one other host and receives from one
+       seed: random seed, for repeatable experiments"""
+    if len( hosts ) < 2:
+        return []
+    rand = random.Random( seed )
+    # A random cyclic order is a permutation without fixed points
+    order = list( hosts )
+    rand.shuffle( order )
+    return [ ( order[ i ], order[ ( i + 1 ) % len( order ) ] )
+             for i in range( len( order ) ) ]
+
+def incast( hosts, dst=None, fanin=None, seed=None ):
+    """Many hosts send to one
+       dst: receiver (first host)
+       fanin: number of senders (all other hosts)
+       seed: random seed for choosing senders"""
+    dst = dst or hosts[ 0 ]
+    senders = [ host for host in hosts if host != dst ]
+    if fanin is not None and fanin < len( senders ):
+        senders = random.Random( seed ).sample( senders, fanin )
+    return [ ( src, dst ) for src in senders ]
+
+def stride( hosts, step=1 ):
+    """Host i sends to host (i + step) mod n
+       step: stride"""
+    count = len( hosts )
+    if not count or step % count == 0:
+        return []
+    return [ ( hosts[ i ], hosts[ ( i + step ) % count ] )
+             for i in range( count ) ]
+
+def matrixPairs( hosts, matrix ):
+    """Return ( src, dst ) for each nonzero entry of a traffic matrix
+       matrix: n x n list of lists or numpy array;
+         matrix[ i ][ j ] is flows from hosts[ i ] to hosts[ j ]"""
+    pairs = []
+    for i, row in enumerate( matrix ):
+        for j, flows in enumerate( row ):
+            if i != j:
+                pairs += [ ( hosts[ i ], hosts[ j ] ) ] * int( flows )
+    return pairs
+
+PATTERNS = { 'all': allToAll, 'permutation': permutation,
+             'incast': incast, 'stride': stride }
+
+def makePairs( hosts, pattern='permutation', **params ):
+    """Return ( src, dst ) pairs for a traffic pattern
+       hosts: list of hosts
+       pattern: name in PATTERNS, traffic matrix, or list of pairs
+       params: parameters for pattern function"""
+    if isinstance( pattern, basestring ):
+        if pattern not in PATTERNS:
+            raise Exception( 'Unknown traffic pattern: %s (known: %s)' %
+                             ( pattern, ' '.join( sorted( PATTERNS ) ) ) )
+        return PATTERNS[ pattern ]( hosts, **params )
+    pattern = list( pattern )
+    if pattern and isinstance( pattern[ 0 ], tuple ):
+        return pattern
+    return matrixPairs( hosts, pattern )
+
+
+# Results
+
+class FlowResult( namedtuple( 'FlowResult', 'src dst port start seconds '
+                               'bytes bps serverBytes serverBps' ) ):
+    """Result of one flow: sender's bytes and bits/s, and the
+       receiver's (None if unavailable), as measured by the tool;
+       start is relative to the first flow"""
+    __slots__ = ()
+
+def parseCSV( line ):
+    """Parse an iperf -y C report line
+       returns: ( localIP, localPort, remoteIP, remotePort, seconds,
+                  bytes, bps ), or None"""
+    fields = line.strip().split( ',' )
+    if len( fields ) < 9:
+        return None
+    try:
+        start, end = fields[ 6 ].split( '-' )
+        return ( fields[ 1 ], int( fields[ 2 ] ), fields[ 3 ],
+                 int( fields[ 4 ] ), float( end ) - float( start ),
+                 int( fields[ 7 ] ), int( fields[ 8 ] ) )
+    except ValueError:
+        return None
+
+def formatFlows( results ):
+    "Return a table of FlowResults as a string"
+    lines = [ '%-8s %-8s %8s %8s %14s %14s' %
+              ( 'src', 'dst', 'start', 'seconds', 'sent bps', 'recv bps' ) ]
+    for r in results:
+        lines.append( '%-8s %-8s %8.3f %8.3f %14s %14s' % (
+            r.src, r.dst, r.start, r.seconds or 0, r.bps,
+            r.serverBps if r.serverBps is not None else '-' ) )
+    return '\n'.join( lines ) + '\n'
+
+
+# Running flows
+
+def listening( pid, port ):
+    "Is process pid's network namespace listening on TCP port?"
+    try:
+        with open( '/proc/%d/net/tcp' % pid ) as f:
+            lines = f.readlines()[ 1: ]
+    except IOError:
+        return False
+    # local_address is ip:port in hex, and state 0A is LISTEN
+    for line in lines:
+        fields = line.split()
+        if ( int( fields[ 1 ].split( ':' )[ 1 ], 16 ) == port and
+             fields[ 3 ] == '0A' ):
+            return True
+    return False
+
+def toolCmds( tool, port, seconds, l4Type='TCP', udpBw='10M' ):
+    """Return server command and client command prefix for a tool
+       tool: 'iperf' or 'builtin'"""
+    if tool == 'builtin':
+        if l4Type != 'TCP':
+            raise Exception( 'builtin flows are TCP only' )
+        prog = [ sys.executable, '-m', 'mininet.traffic' ]
+        return ( prog + [ 'server', '-p', str( port ) ],
+                 prog + [ 'client', '-p', str( port ),
+                          '-t', str( seconds ), '-c' ] )
+    elif tool != 'iperf':
+        raise Exception( 'Unknown traffic tool: %s' % tool )
+    args = [ 'iperf', '-y', 'C', '-p', str( port ) ]
+    if l4Type == 'UDP':
+        return ( args + [ '-u', '-s' ],
+                 args + [ '-u', '-b', udpBw, '-t', str( seconds ), '-c' ] )
+    elif l4Type != 'TCP':
+        raise Exception( 'Unexpected l4 type: %s' % l4Type )
+    return args + [ '-s' ], args + [ '-t', str( seconds ), '-c' ]
+
+def runFlows( pairs, tool='iperf', seconds=5, port=5001, stagger=.001,
+              l4Type='TCP', udpBw='10M', timeout=None ):
+    """Run one flow for each ( src, dst ) pair, all at once
+       pairs: list of ( src, dst ) hosts (see makePairs())
+       tool: 'iperf' or 'builtin'
+       seconds: duration of each flow
+       port: server port
+       stagger: seconds between starting successive flows
+       l4Type: 'TCP' or 'UDP' (iperf only)
+       udpBw: bandwidth target for UDP flows
+       timeout: seconds to wait for servers to start (5)
+       returns: list of FlowResult, in the order of pairs"""
+    serverCmd, clientCmd = toolCmds( tool, port, seconds, l4Type, udpBw )
+    servers = {}
+    try:
+        for _src, dst in pairs:
+            if dst not in servers:
+                servers[ dst ] = dst.popen( serverCmd, stdout=PIPE )
+        # Wait for servers to listen, without any processes
+        end = time.time() + ( timeout or 5 )
+        waiting = dict( servers ) if l4Type == 'TCP' else {}
+        while waiting and time.time() < end:
+            for dst, server in waiting.items():
+                if listening( server.pid, port ):
+                    del waiting[ dst ]
+            if waiting:
+                time.sleep( .01 )
+        for dst in waiting:
+            error( '*** %s: server not listening on port %d\n' %
+                   ( dst, port ) )
+        # Start clients at staggered times, without waiting for them
+        clients, start = [], time.time()
+        for i, ( src, dst ) in enumerate( pairs ):
+            delay = start + i * stagger - time.time()
+            if delay > 0:
+                time.sleep( delay )
+            clients.append( ( time.time() - start,
+                              src.popen( clientCmd + [ dst.IP() ],
+                                         stdout=PIPE ) ) )
+        # Clients exit on their own; their output is small enough
+        # that reading them one at a time can't block any of them
+        reports = [ ( t, client.communicate()[ 0 ] )
+                    for t, client in clients ]
+        serverReports = collectReports( servers, len( pairs ) )
+    finally:
+        for server in servers.itervalues():
+            if server.poll() is None:
+                server.kill()
+            server.wait()
+    results = []
+    for ( src, dst ), ( t, report ) in zip( pairs, reports ):
+        debug( '*** %s -> %s: %s\n' % ( src, dst, report ) )
+        lines = [ parseCSV( line ) for line in report.splitlines() ]
+        lines = [ line for line in lines if line ]
+        if not lines:
+            error( '*** %s -> %s: no report: %s\n' % ( src, dst, report ) )
+            results.append( FlowResult( src, dst, port, t, None, 0, 0,
+                                        None, None ) )
+            continue
+        local = lines[ 0 ]
+        # UDP clients also print the server's report
+        remote = ( lines[ 1 ] if len( lines ) > 1 else
+                   serverReports.get( ( local[ 0 ], local[ 1 ] ) ) )
+        results.append( FlowResult(
+            src, dst, port, t, local[ 4 ], local[ 5 ], local[ 6 ],
+            remote[ 5 ] if remote else None,
+            remote[ 6 ] if remote else None ) )
+    return results
+
+def collectReports( servers, expected, timeout=2 ):
+    """Read reports from servers, stopping them once they have all
+       arrived (or after timeout seconds)
+       servers: dict of host -> server Popen
+       expected: number of reports we're waiting for
+       timeout: seconds to wait for the last reports
+       returns: { ( clientIP, clientPort ): report }"""
+    reports, buffers, fds = {}, {}, {}
+    poller = select.poll()
+    for server in servers.itervalues():
+        fd = server.stdout.fileno()
+        fds[ fd ], buffers[ fd ] = server, ''
+        poller.register( fd, select.POLLIN )
+    interrupted = False
+    end = time.time() + timeout
+    while fds:
+        if not interrupted and ( len( reports ) >= expected or
+                                 time.time() > end ):
+            # iperf (and our server) exit cleanly on SIGINT,
+            # reporting on any connections which are still open
+            for server in fds.itervalues():
+                if server.poll() is None:
+                    server.send_signal( signal.SIGINT )
+            interrupted, end = True, time.time() + timeout
+        elif interrupted and time.time() > end:
+            break
+        for fd, _event in poller.poll( 100 ):
+            data = os.read( fd, 65536 )
+            if not data:
+                poller.unregister( fd )
+                del fds[ fd ]
+                continue
+            lines = ( buffers[ fd ] + data ).split( '\n' )
+            buffers[ fd ] = lines.pop()
+            for line in lines:
+                report = parseCSV( line )
+                if report:
+                    # Server reports are from the server's point of view
+                    reports[ report[ 2 ], report[ 3 ] ] = report
+    return reports
+
+
+# Built-in flow tool, printing iperf -y C style reports
+
+def report( local, remote, seconds, count ):
+    "Print an iperf -y C style report line"
+    print '%s,%s,%d,%s,%d,0,0.0-%.1f,%d,%d' % (
+        time.strftime( '%Y%m%d%H%M%S' ), local[ 0 ], local[ 1 ],
+        remote[ 0 ], remote[ 1 ], seconds, count,
+        8 * count / seconds if seconds else 0 )
+    sys.stdout.flush()
+
+def server( port ):
+    "Receive and discard data from any number of clients"
+    # We may have inherited SIG_IGN; see collectReports()
+    signal.signal( signal.SIGINT, signal.default_int_handler )
+    listener = socket.socket( socket.AF_INET, socket.SOCK_STREAM )
+    listener.setsockopt( socket.SOL_SOCKET, socket.SO_REUSEADDR, 1 )
+    listener.bind( ( '', port ) )
+    listener.listen( 1024 )
+    poller = select.poll()
+    poller.register( listener.fileno(), select.POLLIN )
+    conns = {}  # fd -> [ socket, start time, bytes ]
+    buf = bytearray( 1 << 18 )
+
+    def close( fd ):
+        "Report on and close connection fd"
+        sock, start, count = conns.pop( fd )
+        poller.unregister( fd )
+        report( sock.getsockname(), sock.getpeername(),
+                time.time() - start, count )
+        sock.close()
+
+    try:
+        while True:
+            for fd, _event in poller.poll():
+                if fd == listener.fileno():
+                    sock, _addr = listener.accept()
+                    conns[ sock.fileno() ] = [ sock, time.time(), 0 ]
+                    poller.register( sock.fileno(), select.POLLIN )
+                    continue
+                conn = conns[ fd ]
+                n = conn[ 0 ].recv_into( buf )
+                if n:
+                    conn[ 2 ] += n
+                else:
+                    close( fd )
+    except KeyboardInterrupt:
+        # Count whatever is left, and report on unfinished connections
+        for fd, conn in conns.items():
+            conn[ 0 ].setblocking( False )
+            try:
+                while True:
+                    n = conn[ 0 ].recv_into( buf )
+                    if not n:
+                        break
+                    conn[ 2 ] += n
+            except socket.error as e:
+                if e.errno != errno.EAGAIN:
+                    raise
+            close( fd )
+
+def client( host, port, seconds ):
+    "Send as much data as we can to host:port for seconds"
+    sock = socket.create_connection( ( host, port ) )
+    data = bytearray( 1 << 17 )
+    count, start = 0, time.time()
+    end = start + seconds
+    while time.time() < end:
+        count += sock.send( data )
+    report( sock.getsockname(), sock.getpeername(),
+            time.time() - start, count )
+    sock.close()
+
+# Workloads: flows with realistic sizes and Poisson arrivals
+#
+# makeSchedule() draws every flow (start time, src, dst, size) from a
+# seeded random generator, so experiments are repeatable. Each host
+# runs one workload process (python -m mininet.traffic workload) which
+# serves data to other hosts and, at the scheduled times, requests
+# flows from them; a flow from src to dst is dst fetching size bytes
+# from src. Every fetch is logged to a small binary file, and
+# mergeLogs() joins the logs with the schedule.
+
+# Flow size CDFs: ( flow size in bytes, cumulative probability ),
+# from the web search (DCTCP) and data mining (VL2) workloads
+MSS = 1460
+WEBSEARCH = [ ( n * MSS, p ) for n, p in (
+    ( 6, 0 ), ( 6, .15 ), ( 13, .2 ), ( 19, .3 ), ( 33, .4 ), ( 53, .53 ),
+    ( 133, .6 ), ( 667, .7 ), ( 1333, .8 ), ( 3333, .9 ), ( 6667, .97 ),
+    ( 20000, 1 ) ) ]
+DATAMINING = [ ( n * MSS, p ) for n, p in (
+    ( 1, 0 ), ( 1, .5 ), ( 2, .6 ), ( 3, .7 ), ( 7, .8 ), ( 267, .9 ),
+    ( 2107, .95 ), ( 66667, .99 ), ( 666667, 1 ) ) ]
+CDFS = { 'websearch': WEBSEARCH, 'datamining': DATAMINING }
+
+
+class FlowSizes( object ):
+    "Flow size distribution given by a piecewise linear CDF"
+
+    def __init__( self, cdf ):
+        """cdf: name in CDFS or list of ( size, cumulative probability )
+           with non-decreasing sizes and probabilities, ending at 1"""
+        if isinstance( cdf, basestring ):
+            cdf = CDFS[ cdf ]
+        self.cdf = cdf
+        self.probs = [ p for _size, p in cdf ]
+
+    def sample( self, rand ):
+        "Return a random flow size (at least 1 byte)"
+        p = rand.random()
+        i = max( bisect.bisect_left( self.probs, p ), 1 )
+        ( size0, p0 ), ( size1, p1 ) = self.cdf[ i - 1 ], self.cdf[ i ]
+        if p1 == p0:
+            return max( int( size1 ), 1 )
+        return max( int( size0 + ( size1 - size0 ) * ( p - p0 ) /
+                         ( p1 - p0 ) ), 1 )
+
+    def mean( self ):
+        "Return the mean flow size"
+        return sum( ( p1 - p0 ) * ( size0 + size1 ) / 2.0
+                    for ( size0, p0 ), ( size1, p1 )
+                    in zip( self.cdf, self.cdf[ 1: ] ) )
+
+
+# Binary record formats
+SCHEDULE = struct.Struct( '=Id4sQ' )  # flow id, start offset, src IP, size
+LOG = struct.Struct( '=IddQ' )        # flow id, start, finish, bytes
+REQUEST = struct.Struct( '=IQ' )      # flow id, size
+
+Flow = namedtuple( 'Flow', 'flowId start src dst size' )
+
+class FlowRecord( namedtuple( 'FlowRecord', 'flowId src dst size start '
+                                           'fct received' ) ):
+    """Merged result of a scheduled flow: start is seconds since the
+       start of the workload, and fct is the flow completion time in
+       seconds, or None if the flow didn't complete"""
+    __slots__ = ()
+
+
+def makeSchedule( hosts, duration, rate=None, load=None, bw=None,
+                  cdf='websearch', seed=0 ):
+    """Return a random workload: flows with sizes drawn from cdf and
+       Poisson arrivals at each host, to uniformly chosen other hosts
+       hosts: list of hosts
+       duration: seconds of flow arrivals
+       rate: new flows/second per source host, or
+       load, bw: fraction of each host's link bandwidth (Mb/s) to use
+       cdf: flow size CDF (see FlowSizes)
+       seed: random seed
+       returns: list of Flow, in order of start time"""
+    sizes = FlowSizes( cdf )
+    if rate is None:
+        if load is None or bw is None:
+            raise Exception( 'makeSchedule: need rate, or load and bw' )
+        rate = load * bw * 1e6 / ( 8 * sizes.mean() )
+    rand = random.Random( seed )
+    flows = []
+    if len( hosts ) < 2:
+        return flows
+    for src in hosts:
+        others = [ host for host in hosts if host != src ]
+        t = rand.expovariate( rate )
+        while t < duration:
+            flows.append( ( t, src, rand.choice( others ),
+                            sizes.sample( rand ) ) )
+            t += rand.expovariate( rate )
+    flows.sort( key=lambda flow: flow[ 0 ] )
+    return [ Flow( i, t, src, dst, size )
+             for i, ( t, src, dst, size ) in enumerate( flows ) ]
+
+def writeSchedules( flows, directory ):
+    """Write each destination's flows to directory/<host>.sched
+       returns: { host: schedule file }"""
+    records = {}
+    for flow in flows:
+        records.setdefault( flow.dst, [] ).append(
+            SCHEDULE.pack( flow.flowId, flow.start,
+                           socket.inet_aton( flow.src.IP() ), flow.size ) )
+    paths = {}
+    for host, recs in records.iteritems():
+        paths[ host ] = os.path.join( directory, '%s.sched' % host )
+        with open( paths[ host ], 'wb' ) as f:
+            f.write( ''.join( recs ) )
+    return paths
+
+def readRecords( path, fmt ):
+    "Read a file of fixed-size binary records"
+    with open( path, 'rb' ) as f:
+        data = f.read()
+    return [ fmt.unpack_from( data, offset )
+             for offset in range( 0, len( data ) - fmt.size + 1,
+                                  fmt.size ) ]
+
+def mergeLogs( flows, logPaths, start ):
+    """Join workload logs with the schedule
+       flows: list of Flow from makeSchedule()
+       logPaths: list of log files
+       start: workload start time (time.time())
+       returns: list of FlowRecord, in flow id order"""
+    logged = {}
+    for path in logPaths:
+        if os.path.exists( path ):
+            for flowId, began, finish, received in readRecords( path, LOG ):
+                logged[ flowId ] = began, finish, received
+    records = []
+    for flow in flows:
+        began, finish, received = logged.get( flow.flowId,
+                                              ( None, 0, 0 ) )
+        records.append( FlowRecord(
+            flow.flowId, flow.src, flow.dst, flow.size,
+            began - start if began else flow.start,
+            finish - began if finish else None, received ) )
+    return records
+
+def runSchedule( flows, port=5002, directory=None, timeout=10 ):
+    """Run a workload schedule on its hosts
+       flows: list of Flow from makeSchedule()
+       port: port for workload servers
+       directory: directory for schedules and logs (temporary)
+       timeout: seconds to wait for flows after the last one starts
+       returns: list of FlowRecord"""
+    hosts = sorted( set( flow.src for flow in flows ) |
+                    set( flow.dst for flow in flows ), key=str )
+    tmpdir = directory or tempfile.mkdtemp( prefix='mn-workload-' )
+    schedules = writeSchedules( flows, tmpdir )
+    procs, logs = {}, []
+    # Give every process time to start before the first flow
+    start = time.time() + 1 + .01 * len( hosts )
+    try:
+        for host in hosts:
+            log = os.path.join( tmpdir, '%s.log' % host )
+            logs.append( log )
+            cmd = [ sys.executable, '-m', 'mininet.traffic', 'workload',
+                    '-p', str( port ), '-l', log, '-s', repr( start ) ]
+            if host in schedules:
+                cmd += [ '-f', schedules[ host ] ]
+            procs[ host ] = host.popen( cmd, stdout=PIPE )
+        # Each process says 'done' when it has fetched all its flows
+        end = start + ( flows[ -1 ].start if flows else 0 ) + timeout
+        waiting = dict( ( proc.stdout.fileno(), proc )
+                        for proc in procs.itervalues() )
+        while waiting and time.time() < end:
+            readable, _w, _x = select.select(
+                waiting.keys(), [], [], max( end - time.time(), 0 ) )
+            for fd in readable:
+                if waiting[ fd ].stdout.readline().strip() in ( 'done', '' ):
+                    del waiting[ fd ]
+        for host, proc in procs.iteritems():
+            if proc.poll() is None:
+                proc.send_signal( signal.SIGINT )
+        for host, proc in procs.iteritems():
+            proc.wait()
+        records = mergeLogs( flows, logs, start )
+    finally:
+        for proc in procs.itervalues():
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+        if directory is None:
+            shutil.rmtree( tmpdir, ignore_errors=True )
+    return records
+
+def percentile( values, pct ):
+    "Return the pct percentile of a list of values"
+    values = sorted( values )
+    if not values:
+        return None
+    return values[ min( int( len( values ) * pct / 100.0 ),
+                        len( values ) - 1 ) ]
+
+def formatRecords( records, small=100000 ):
+    "Return a summary of FlowRecords' completion times as a string"
+    done = [ r for r in records if r.fct is not None ]
+    lines = [ '%d/%d flows completed' % ( len( done ), len( records ) ) ]
+    for name, group in ( ( 'all', done ),
+                         ( '< %d bytes' % small,
+                           [ r for r in done if r.size < small ] ),
+                         ( '>= %d bytes' % small,
+                           [ r for r in done if r.size >= small ] ) ):
+        if group:
+            fcts = [ r.fct * 1000 for r in group ]
+            lines.append( 'FCT (ms) %s: mean %.3f p50 %.3f p99 %.3f' % (
+                name, sum( fcts ) / len( fcts ), percentile( fcts, 50 ),
+                percentile( fcts, 99 ) ) )
+    return '\n'.join( lines ) + '\n'
+
+
+def workload( port, logPath, start, schedulePath=None ):
+    """Serve flows to other hosts, and fetch our scheduled flows, using
+       one non-blocking event loop
+       port: port to serve on and fetch from
+       logPath: file for LOG records of our fetches
+       start: workload start time (time.time())
+       schedulePath: file of SCHEDULE records, if any"""
+    signal.signal( signal.SIGINT, signal.default_int_handler )
+    schedule = readRecords( schedulePath, SCHEDULE ) if schedulePath else []
+    log = open( logPath, 'wb' )
+    listener = socket.socket( socket.AF_INET, socket.SOCK_STREAM )
+    listener.setsockopt( socket.SOL_SOCKET, socket.SO_REUSEADDR, 1 )
+    listener.bind( ( '', port ) )
+    listener.listen( 4096 )
+    listener.setblocking( False )
+    epoll = select.epoll()
+    epoll.register( listener.fileno(), select.EPOLLIN )
+    data = memoryview( bytearray( 1 << 18 ) )
+    # Scratch buffer for the flows we fetch, whose data we discard
+    scratch = bytearray( 1 << 18 )
+    # fd -> [ socket, is fetch, flow id, size, bytes so far, start,
+    #         request buffer (for flows we serve) ]
+    conns = {}
+    fetches = 0
+    nextFlow, done = 0, False
+
+    def close( fd, finish=0 ):
+        "Close connection fd, logging it if it is one of our fetches"
+        sock, fetch, flowId, _size, count, began, _req = conns.pop( fd )
+        if fetch:
+            log.write( LOG.pack( flowId, began, finish, count ) )
+        epoll.unregister( fd )
+        sock.close()
+
+    try:
+        while True:
+            now = time.time()
+            # Start any flows which are due
+            while ( nextFlow < len( schedule ) and
+                    start + schedule[ nextFlow ][ 1 ] <= now ):
+                flowId, _offset, src, size = schedule[ nextFlow ]
+                nextFlow += 1
+                sock = socket.socket( socket.AF_INET, socket.SOCK_STREAM )
+                sock.setblocking( False )
+                sock.connect_ex( ( socket.inet_ntoa( src ), port ) )
+                conns[ sock.fileno() ] = [ sock, True, flowId, size, 0, now,
+                                           None ]
+                epoll.register( sock.fileno(), select.EPOLLOUT )
+                fetches += 1
+            if not done and nextFlow == len( schedule ) and not fetches:
+                print 'done'
+                sys.stdout.flush()
+                done = True
+            wait = 1
+            if nextFlow < len( schedule ):
+                wait = min( start + schedule[ nextFlow ][ 1 ] - now, 1 )
+            for fd, event in epoll.poll( max( wait, 0 ) ):
+                if fd == listener.fileno():
+                    while True:
+                        try:
+                            sock, _addr = listener.accept()
+                        except socket.error as e:
+                            if e.errno == errno.EAGAIN:
+                                break
+                            raise
+                        sock.setblocking( False )
+                        conns[ sock.fileno() ] = [
+                            sock, False, 0, 0, 0, now,
+                            memoryview( bytearray( REQUEST.size ) ) ]
+                        epoll.register( sock.fileno(), select.EPOLLIN )
+                    continue
+                conn = conns[ fd ]
+                sock, fetch, flowId, size, count, _began, request = conn
+                if fetch and event & select.EPOLLOUT:
+                    # Connected (or failed): send our request
+                    if sock.getsockopt( socket.SOL_SOCKET, socket.SO_ERROR ):
+                        close( fd )
+                        fetches -= 1
+                        continue
+                    sock.send( REQUEST.pack( flowId, size ) )
+                    epoll.modify( fd, select.EPOLLIN )
+                elif fetch:
+                    try:
+                        n = sock.recv_into( scratch )
+                    except socket.error:
+                        n = 0
+                    conn[ 4 ] += n
+                    if not n or conn[ 4 ] >= size:
+                        close( fd, time.time() if n else 0 )
+                        fetches -= 1
+                elif event & select.EPOLLIN:
+                    # Read a request, then send the flow
+                    n = sock.recv_into( request[ count: ],
+                                        REQUEST.size - count )
+                    if not n:
+                        close( fd )
+                        continue
+                    conn[ 4 ] = count = count + n
+                    if count == REQUEST.size:
+                        conn[ 2 ], conn[ 3 ] = REQUEST.unpack_from( request )
+                        epoll.modify( fd, select.EPOLLOUT )
+                else:
+                    # Send as much of the flow as we can
+                    try:
+                        conn[ 3 ] -= sock.send( data[ :conn[ 3 ] ] )
+                    except socket.error as e:
+                        if e.errno != errno.EAGAIN:
+                            close( fd )
+                        continue
+                    if not conn[ 3 ]:
+                        close( fd )
+    except KeyboardInterrupt:
+        # Log unfinished fetches
+        for fd in [ fd for fd, conn in conns.iteritems() if conn[ 1 ] ]:
+            close( fd )
+    log.close()
+
+def main():
+    "Run the built-in server, client or workload"
+    parser = OptionParser( usage='%prog server|client|workload [options]' )
+    parser.add_option( '-p', '--port', type='int', default=5001,
+                       help='server port' )
+    parser.add_option( '-c', '--connect', help='server to send to' )
+    parser.add_option( '-t', '--time', type='float', default=5,
+                       help='seconds to send for' )
+    parser.add_option( '-l', '--log', help='workload log file' )
+    parser.add_option( '-f', '--flows', help='workload schedule file' )
+    parser.add_option( '-s', '--start', type='float',
+                       help='workload start time' )
+    opts, args = parser.parse_args()
+    if args == [ 'server' ]:
+        server( opts.port )
+    elif args == [ 'client' ] and opts.connect:
+        client( opts.connect, opts.port, opts.time )
+    elif args == [ 'workload' ] and opts.log and opts.start:
+        workload( opts.port, opts.log, opts.start, opts.flows )
+    else:
+        parser.error( 'expected server, client -c server, '
+                      'or workload -l log -s start [-f schedule]' )
+
+if __name__ == '__main__':
+    main()
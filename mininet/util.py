@@ -10,7 +10,11 @@
 from fcntl import fcntl, F_GETFL, F_SETFL
 from os import O_NONBLOCK
 import os
+import gzip
 from functools import partial
+from tempfile import TemporaryFile
+from io import FileIO
+from threading import Lock
 
 # Command execution support
 
@@ -158,7 +162,7 @@ def isShellBuiltin( cmd ):
 # explicitly moved.
 
 def makeIntfPair( intf1, intf2, addr1=None, addr2=None, node1=None, node2=None,
-                  deleteIntfs=True, runCmd=None ):
+                  deleteIntfs=True, runCmd=None, premade=None ):
     """Make a veth pair connnecting new interfaces intf1 and intf2
        intf1: name for interface 1
        intf2: name for interface 2
@@ -168,7 +172,12 @@ def makeIntfPair( intf1, intf2, addr1=None, addr2=None, node1=None, node2=None,
        node2: home node for interface 2 (optional)
        deleteIntfs: delete intfs before creating them
        runCmd: function to run shell commands (quietRun)
+       premade: set of pairs already created by makeIntfPairs(); if
+         ( intf1, intf2 ) is in it, we remove it and do nothing
        raises Exception on failure"""
+    if premade and ( intf1, intf2 ) in premade:
+        premade.remove( ( intf1, intf2 ) )
+        return
     if not runCmd:
         runCmd = quietRun if not node1 else node1.cmd
         runCmd2 = quietRun if not node2 else node2.cmd
@@ -177,7 +186,7 @@ def makeIntfPair( intf1, intf2, addr1=None, addr2=None, node1=None, node2=None,
         runCmd( 'ip link del ' + intf1 )
         runCmd2( 'ip link del ' + intf2 )
     # Create new pair
-    netns = 1 if not node2 else node2.pid
+    netns = 1 if not node2 else node2.netns()
     if addr1 is None and addr2 is None:
         cmdOutput = runCmd( 'ip link add name %s '
                             'type veth peer name %s '
@@ -193,6 +202,147 @@ def makeIntfPair( intf1, intf2, addr1=None, addr2=None, node1=None, node2=None,
         raise Exception( "Error creating interface pair (%s,%s): %s " %
                          ( intf1, intf2, cmdOutput ) )
 
+def makeIntfPairs( pairs, premade ):
+    """Make many veth pairs at once, each end created directly in its
+       node's namespace, using a single ip -batch process. Pass premade
+       to makeIntfPair() so that it doesn't create these pairs again.
+       pairs: list of ( intf1, intf2, addr1, addr2, node1, node2 )
+       premade: set to which we add ( intf1, intf2 ) for each pair
+         we create
+       returns: list of pairs which could not be created"""
+    cmds = []
+    for intf1, intf2, addr1, addr2, node1, node2 in pairs:
+        ends = []
+        for intf, addr, node in ( ( intf1, addr1, node1 ),
+                                  ( intf2, addr2, node2 ) ):
+            end = 'name %s' % intf
+            if addr:
+                end += ' address %s' % addr
+            ends.append( end + ' netns %s' % ( node.netns() if node else 1 ) )
+        cmds.append( 'link add %s type veth peer %s' % tuple( ends ) )
+    if not cmds:
+        return []
+    # -force: keep going after errors, which we report by line number
+    popen = Popen( [ 'ip', '-force', '-batch', '-' ], stdin=PIPE,
+                   stdout=PIPE, stderr=STDOUT )
+    output, _err = popen.communicate( '\n'.join( cmds ) + '\n' )
+    failed = set( int( line ) - 1 for line in
+                  re.findall( r'Command failed -:(\d+)', output ) )
+    for i, pair in enumerate( pairs ):
+        if i not in failed:
+            premade.add( ( pair[ 0 ], pair[ 1 ] ) )
+    if failed:
+        debug( '*** makeIntfPairs: %d pairs failed:\n%s' %
+               ( len( failed ), output ) )
+    return [ pairs[ i ] for i in sorted( failed ) ]
+
+def tcBatches( batches ):
+    """Run many tc commands with one tc -batch process per node, all
+       running concurrently
+       batches: list of ( node or None for ours, list of tc commands
+         without the leading 'tc' )
+       returns: list of outputs (error messages) for each batch, one
+         per command"""
+    argv = [ 'tc', '-force', '-batch', '-' ]
+    procs = []
+    for node, cmds in batches:
+        if not cmds:
+            procs.append( None )
+            continue
+        # Output goes to a file, so that no tc can block on a full
+        # pipe while we're feeding the others
+        out = TemporaryFile()
+        params = dict( stdin=PIPE, stdout=out, stderr=STDOUT )
+        popen = ( node.popen( argv, **params ) if node
+                  else Popen( argv, **params ) )
+        popen.stdin.write( '\n'.join( cmds ) + '\n' )
+        popen.stdin.close()
+        procs.append( ( popen, out ) )
+    results = []
+    for ( _node, cmds ), proc in zip( batches, procs ):
+        outputs = [ '' ] * len( cmds )
+        results.append( outputs )
+        if not proc:
+            continue
+        popen, out = proc
+        popen.wait()
+        out.seek( 0 )
+        # With -force, tc reports each failure after its error message
+        lines = []
+        for line in out:
+            failed = re.match( r'Command failed -:(\d+)', line )
+            if failed:
+                index = int( failed.group( 1 ) ) - 1
+                if 0 <= index < len( cmds ):
+                    outputs[ index ] = ''.join( lines )
+                lines = []
+            else:
+                lines.append( line )
+        out.close()
+    return results
+
+def tcBatch( cmds, node=None ):
+    """Run many tc commands with a single tc -batch process
+       cmds: list of tc commands, without the leading 'tc'
+       node: node whose namespace to run in (default: ours)
+       returns: list of outputs (error messages), one per command"""
+    return tcBatches( [ ( node, cmds ) ] )[ 0 ]
+
+class TcShell( object ):
+    """A tc -batch process that we keep running, so that frequent
+       changes (e.g. TCIntf.update()) cost a pipe round trip rather
+       than a fork and exec"""
+
+    # An unknown object: tc reports it as failed once it has finished
+    # everything before it, which tells us we have all of the output
+    sync = 'mininet-sync'
+
+    def __init__( self, node=None ):
+        """node: node whose namespace to run in (default: ours)"""
+        argv = [ 'tc', '-force', '-batch', '-' ]
+        params = dict( stdin=PIPE, stdout=PIPE, stderr=STDOUT )
+        self.popen = ( node.popen( argv, **params ) if node
+                       else Popen( argv, **params ) )
+        self.lines = 0  # lines that tc has read so far
+        # We may be shared by threads (e.g. a TraceScheduler)
+        self.lock = Lock()
+
+    def run( self, cmds ):
+        """Run tc commands and wait for them to finish. Only errors
+           are reported, since tc may buffer its standard output.
+           cmds: list of tc commands, without the leading 'tc'
+           returns: list of outputs (error messages), one per command"""
+        with self.lock:
+            return self._run( cmds )
+
+    def _run( self, cmds ):
+        "Internal method: run tc commands"
+        first = self.lines + 1
+        self.popen.stdin.write( '\n'.join( cmds + [ self.sync ] ) + '\n' )
+        self.popen.stdin.flush()
+        self.lines += len( cmds ) + 1
+        outputs, lines = [ '' ] * len( cmds ), []
+        while True:
+            line = self.popen.stdout.readline()
+            if not line:
+                raise Exception( 'TcShell: tc exited unexpectedly' )
+            failed = re.match( r'Command failed -:(\d+)', line )
+            if not failed:
+                lines.append( line )
+                continue
+            lineno = int( failed.group( 1 ) )
+            if lineno == self.lines:
+                return outputs
+            if first <= lineno < self.lines:
+                outputs[ lineno - first ] = ''.join( lines )
+            lines = []
+
+    def close( self ):
+        "Stop our tc process"
+        if self.popen.poll() is None:
+            self.popen.stdin.close()
+            self.popen.wait()
+
 def retry( retries, delaySecs, fn, *args, **keywords ):
     """Try something several times before giving up.
        n: number of times to retry
@@ -213,7 +363,7 @@ def moveIntfNoRetry( intf, dstNode, printError=False ):
         dstNode: destination Node
         printError: if true, print error"""
     intf = str( intf )
-    cmd = 'ip link set %s netns %s' % ( intf, dstNode.pid )
+    cmd = 'ip link set %s netns %s' % ( intf, dstNode.netns() )
     cmdOutput = quietRun( cmd )
     # If ip link set does not produce any output, then we can assume
     # that the link has been moved successfully.
@@ -402,6 +552,80 @@ def pmonitor(popens, timeoutms=500, readline=True,
         else:
             yield None, ''
 
+# Output buffering support
+
+class RingBuffer( object ):
+    """Fixed-size byte ring buffer which reads directly into its storage,
+       so buffered output is never re-concatenated or re-sliced"""
+
+    def __init__( self, size=4096 ):
+        "size: capacity in bytes; we never buffer more than this"
+        self.buf = bytearray( size )
+        self.start = 0  # offset of first buffered byte
+        self.count = 0  # number of buffered bytes
+        self.fio = None  # FileIO wrapper for fill()
+
+    def __len__( self ):
+        return self.count
+
+    def clear( self ):
+        "Discard buffered data"
+        self.start = self.count = 0
+
+    def fill( self, fd, maxbytes ):
+        """Read (blocking) up to maxbytes from fd into free space; if
+           the buffer is full, read nothing
+           fd: file descriptor
+           maxbytes: maximum number of bytes to read
+           returns: number of bytes read"""
+        size = len( self.buf )
+        end = ( self.start + self.count ) % size
+        # Read only into the contiguous free region after end
+        n = min( maxbytes, size - self.count, size - end )
+        if n <= 0:
+            return 0
+        if self.fio is None or self.fio.fileno() != fd:
+            self.fio = FileIO( fd, 'r', closefd=False )
+        got = self.fio.readinto( memoryview( self.buf )[ end: end + n ] )
+        self.count += got or 0
+        return got or 0
+
+    def read( self, maxbytes ):
+        """Remove and return up to maxbytes of buffered data
+           maxbytes: maximum number of bytes to return
+           returns: string"""
+        n = min( maxbytes, self.count )
+        size = len( self.buf )
+        end = self.start + n
+        if end <= size:
+            data = str( self.buf[ self.start: end ] )
+        else:
+            data = str( self.buf[ self.start: ] + self.buf[ :end - size ] )
+        self.count -= n
+        self.start = end % size if self.count else 0
+        return data
+
+    def find( self, char, offset=0 ):
+        """Find a character in buffered data
+           char: character to search for
+           offset: offset in buffered data to start searching at
+           returns: offset of char, or -1 if not found"""
+        size = len( self.buf )
+        first, end = self.start + offset, self.start + self.count
+        if first < size:
+            pos = self.buf.find( char, first, min( end, size ) )
+            if pos >= 0:
+                return pos - self.start
+        if end > size:
+            pos = self.buf.find( char, max( first - size, 0 ), end - size )
+            if pos >= 0:
+                return pos + size - self.start
+        return -1
+
+    def full( self ):
+        "Is the buffer full?"
+        return self.count == len( self.buf )
+
 # Other stuff we use
 def sysctlTestAndSet( name, limit ):
     "Helper function to set sysctl limits"
@@ -490,6 +714,25 @@ def numCores():
         return 0
     return numCores.ncores
 
+def kernelHz( default=250 ):
+    """Return the kernel's timer frequency (CONFIG_HZ), from its
+       config if we can find it
+       default: frequency to assume if we can't"""
+    if hasattr( kernelHz, 'hz' ):
+        return kernelHz.hz
+    kernelHz.hz = default
+    for path in ( '/boot/config-%s' % os.uname()[ 2 ], '/proc/config.gz' ):
+        try:
+            with ( gzip.open( path ) if path.endswith( '.gz' )
+                   else open( path ) ) as f:
+                for line in f:
+                    if line.startswith( 'CONFIG_HZ=' ):
+                        kernelHz.hz = int( line.split( '=' )[ 1 ] )
+                        return kernelHz.hz
+        except IOError:
+            continue
+    return kernelHz.hz
+
 def irange(start, end):
     """Inclusive range from start to end (vs. Python insanity.)
        irange(1,5) -> 1, 2, 3, 4, 5"""